@@ -44,12 +44,20 @@ except ImportError:
     # If the web module is missing (e.g., bot-only mode), just log it
     logger.warning("Web module not found, running in bot-only mode")
 
+from database.maintenance import SchemaError, ensure_indexes
+
 with app.app_context():
     # Import models to ensure tables are created
     try:
         import models
         logger.info("Database models imported successfully")
         db.create_all()
+        # create_all skips existing tables, so indexes declared later are added here
+        ensure_indexes(db)
         logger.info("Database tables verified/created successfully")
+    except SchemaError as e:
+        # Running without the unique word index would let duplicate words back in
+        logger.critical(str(e))
+        raise
     except Exception as e:
         logger.error(f"Critical error during database initialization: {e}")
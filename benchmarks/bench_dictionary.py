@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare startup time and memory of the JSON dictionary loader against the
+compiled memory-mapped format (utils/compact_dict.py).
+
+Each measurement runs in a fresh interpreter so RSS numbers are not skewed
+by earlier runs.
+
+Usage:
+    python benchmarks/bench_dictionary.py [sizes...]   # default: 1000 100000 1000000
+"""
+import os
+import sys
+import json
+import random
+import string
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from utils.compact_dict import compile_dictionary
+
+LOAD_SCRIPT = r'''
+import sys, time, json, random
+sys.path.append({root!r})
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+from utils.compact_dict import CompactDictionary
+before = rss_kb()
+started = time.perf_counter()
+if {mode!r} == 'json':
+    with open({path!r}, encoding='utf-8') as f:
+        dictionary = json.load(f)
+else:
+    dictionary = CompactDictionary({path!r})
+load_ms = (time.perf_counter() - started) * 1000
+
+keys = {sample!r}
+started = time.perf_counter()
+for key in keys:
+    dictionary.get(key)
+lookup_us = (time.perf_counter() - started) * 1e6 / len(keys)
+print(load_ms, rss_kb() - before, lookup_us)
+'''
+
+
+def random_word(rng):
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 14)))
+
+
+def make_dictionary(size, rng):
+    russian = 'абвгдежзийклмнопрстуфхцчшщэюя'
+    dictionary = {}
+    while len(dictionary) < size:
+        variants = [''.join(rng.choices(russian, k=rng.randint(4, 12))) for _ in range(rng.randint(1, 3))]
+        dictionary[random_word(rng)] = ", ".join(variants)
+    return dictionary
+
+
+def measure(mode, path, sample):
+    script = LOAD_SCRIPT.format(root=ROOT, mode=mode, path=path, sample=sample)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    load_ms, rss_kb, lookup_us = output.split()
+    return float(load_ms), int(rss_kb), float(lookup_us)
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or [1000, 100000, 1000000]
+    rng = random.Random(42)
+
+    print(f"{'entries':>10} {'format':>8} {'file MB':>8} {'load ms':>10} {'RSS +MB':>8} {'lookup us':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            dictionary = make_dictionary(size, rng)
+            json_path = os.path.join(tmp, f'dict_{size}.json')
+            compact_path = os.path.join(tmp, f'dict_{size}.vbdict')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(dictionary, f, ensure_ascii=False)
+            compile_dictionary(dictionary, compact_path)
+            sample = rng.sample(list(dictionary), min(1000, size))
+            del dictionary
+
+            for mode, path in (('json', json_path), ('compact', compact_path)):
+                load_ms, rss_kb, lookup_us = measure(mode, path, sample)
+                file_mb = os.path.getsize(path) / 1e6
+                print(f"{size:>10} {mode:>8} {file_mb:>8.1f} {load_ms:>10.1f} {rss_kb / 1024:>8.1f} {lookup_us:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
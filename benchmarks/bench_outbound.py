@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Outbound sends against a fake Bot API that enforces Telegram-like limits
+(4 sends in any second per chat, 30 in total, 429 with retry_after
+above that) and can inject random 429s.
+
+"direct" calls bot.send_message from a thread pool, as the handlers used to:
+every 429 is a lost message. "queue" goes through bot.outbound.OutboundQueue
+with interactive replies (a few chats, several messages each) competing with
+background sends (one message to many chats, as a broadcast would).
+
+Usage:
+    python benchmarks/bench_outbound.py [--chats N] [--replies N] [--background N] [--inject-429 F]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import telebot
+from telebot.apihelper import ApiTelegramException
+
+from bot.outbound import BACKGROUND, INTERACTIVE, OutboundQueue
+from fake_telegram import FakeBotAPI
+
+
+def workload(args):
+    """(chat id, text, priority) in submission order: replies interleaved with the broadcast"""
+    replies = [(1000 + c, f'reply {n}', INTERACTIVE) for n in range(args.replies) for c in range(args.chats)]
+    background = [(100000 + c, 'word of the day', BACKGROUND) for c in range(args.background)]
+    sends = []
+    while replies or background:
+        if background:
+            sends.append(background.pop(0))
+        if replies and len(sends) % 4 == 0:
+            sends.append(replies.pop(0))
+    return sends
+
+
+def run_direct(bot, sends):
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+    lost = 0
+
+    def send(chat_id, text, priority):
+        started = time.perf_counter()
+        bot.send_message(chat_id, text)
+        latencies[priority].append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        for future in [pool.submit(send, *s) for s in sends]:
+            try:
+                future.result()
+            except ApiTelegramException:
+                lost += 1
+    return latencies, lost
+
+
+def run_queue(bot, sends):
+    outbound = OutboundQueue(bot, workers=8, global_rate=30, chat_rate=1, chat_burst=3)
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+    lost = 0
+    lock = threading.Lock()
+
+    def done(priority, started):
+        def callback(future):
+            with lock:
+                latencies[priority].append(time.perf_counter() - started)
+        return callback
+
+    futures = []
+    for chat_id, text, priority in sends:
+        future = outbound.submit('send_message', chat_id, (chat_id, text), priority=priority)
+        future.add_done_callback(done(priority, time.perf_counter()))
+        futures.append(future)
+    for future in futures:
+        try:
+            future.result()
+        except ApiTelegramException:
+            lost += 1
+    outbound.shutdown()
+    return latencies, lost
+
+
+def report(name, elapsed, latencies, lost, api):
+    def pct(values, p):
+        values = sorted(values)
+        return values[max(0, int(len(values) * p) - 1)] * 1000 if values else 0.0
+
+    total = len(latencies[INTERACTIVE]) + len(latencies[BACKGROUND])
+    print(f"{name:>6} | {total:>9} | {lost:>4} | {api.too_many_requests:>4} | {elapsed:>6.1f} s | "
+          f"{statistics.median(latencies[INTERACTIVE] or [0]) * 1000:>7.0f} / {pct(latencies[INTERACTIVE], 0.99):>6.0f} ms | "
+          f"{statistics.median(latencies[BACKGROUND] or [0]) * 1000:>7.0f} / {pct(latencies[BACKGROUND], 0.99):>6.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--chats', type=int, default=10, help='chats receiving interactive replies')
+    parser.add_argument('--replies', type=int, default=5, help='replies per interactive chat')
+    parser.add_argument('--background', type=int, default=200, help='chats receiving one background send')
+    parser.add_argument('--inject-429', type=float, default=0.02, help='fraction of sends answered with 429')
+    parser.add_argument('--port', type=int, default=8082)
+    args = parser.parse_args()
+
+    telebot.apihelper.API_URL = f'http://127.0.0.1:{args.port}/bot{{0}}/{{1}}'
+    bot = telebot.TeleBot('123456:BENCH', threaded=False)
+    sends = workload(args)
+    print(f"{len(sends)} sends, fake limits: 4/s per chat, 30/s total, {args.inject_429:.0%} random 429s\n")
+    print(f"{'mode':>6} | {'delivered':>9} | {'lost':>4} | {'429s':>4} | {'time':>8} | "
+          f"{'interactive p50/p99':>19} | {'background p50/p99':>18}")
+    print('-' * 88)
+    for name, run in (('direct', run_direct), ('queue', run_queue)):
+        api = FakeBotAPI(args.port, chat_limit=4, global_limit=30, inject_429=args.inject_429, latency=0.02)
+        threading.Thread(target=api.serve_forever, daemon=True).start()
+        started = time.perf_counter()
+        latencies, lost = run(bot, sends)
+        report(name, time.perf_counter() - started, latencies, lost, api)
+        api.shutdown()
+        api.server_close()
+        time.sleep(1.0)  # let the fake's per-second windows clear
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compare the memory held by one running quiz before and after the compact
+QuizState (bot/quiz_state.py).
+
+"Before" is what QuizManager used to keep per chat: the QuizSession and a
+list of Word ORM objects (with their SQLAlchemy instance state). "After" is
+a QuizState with word ids in an array and tuples of texts. Measured with
+tracemalloc for several vocabulary sizes of an "all words" quiz; the word
+strings themselves are created beforehand and shared, so only the per-quiz
+overhead is counted. The checkpoint columns are the deck written once when
+the quiz starts and the progress written after every question.
+
+Usage:
+    python benchmarks/bench_quiz_memory.py [vocabulary sizes...]   # default: 20 1000 10000 50000
+"""
+import os
+import sys
+import json
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app
+from models import Word, QuizSession
+from bot.quiz_state import QuizState
+
+
+def make_rows(size):
+    return [(i + 1, f'word{i}', f'перевод{i}, слово{i}') for i in range(size)]
+
+
+def orm_quiz(rows):
+    session = QuizSession(id=1, user_id=1, quiz_type='all', total_questions=20, score=0, completed=False)
+    words = [Word(id=i, user_id=1, english_word=e, translation=t, date_added=datetime.utcnow())
+             for i, e, t in rows]
+    return {'session': session, 'words': words, 'current_question': 0, 'used_words': []}
+
+
+def compact_quiz(rows):
+    return QuizState(1, 1, 1, 'all', 20, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    quiz = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, quiz
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [20, 1000, 10000, 50000]
+    print(f"{'words':>7} | {'ORM objects':>12} | {'QuizState':>10} | {'deck':>8} | {'progress':>8} | {'ratio':>6}")
+    print('-' * 67)
+    with app.app_context():
+        # Warm up SQLAlchemy's lazy mapper setup so it is not billed to the first quiz
+        orm_quiz(make_rows(2))
+        for size in sizes:
+            rows = make_rows(size)
+            orm_bytes, _ = measure(orm_quiz, rows)
+            state_bytes, state = measure(compact_quiz, rows)
+            for _ in range(state.total_questions):
+                state.correct_position = state.next_word()
+                state.record_review(5)
+            deck = len(json.dumps(state.deck_dict(), ensure_ascii=False).encode('utf-8'))
+            progress = len(json.dumps(state.progress_dict(), ensure_ascii=False).encode('utf-8'))
+            print(f"{size:>7} | {orm_bytes / 1024:>9.0f} KB | {state_bytes / 1024:>7.0f} KB | "
+                  f"{deck / 1024:>5.0f} KB | {progress:>6} B | {orm_bytes / state_bytes:>5.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for quiz question generation: time to pick the next word and
+its three distractors, for vocabularies from 20 to 50,000 words.
+
+"list scan" is the old approach (rebuild the unused and other-word lists
+with comprehensions on every question); "deck" is QuizState.next_word() plus
+QuizState.distractors(). The deck cost should stay flat as words grow.
+
+Usage:
+    python benchmarks/bench_quiz_sampling.py [vocabulary sizes...]   # default: 20 1000 10000 50000
+"""
+import os
+import sys
+import time
+import random
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from bot.quiz_state import QuizState
+
+QUESTIONS = 20
+
+
+def list_scan(words, used_word_ids):
+    unused_words = [w for w in words if w.id not in used_word_ids]
+    if not unused_words:
+        unused_words = words
+        used_word_ids.clear()
+    correct_word = random.choice(unused_words)
+    used_word_ids.append(correct_word.id)
+    other_words = [w for w in words if w.id != correct_word.id]
+    return correct_word, random.sample(other_words, 3)
+
+
+def time_per_question(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [20, 1000, 10000, 50000]
+    print(f"{'words':>7} | {'list scan':>12} | {'deck':>10}")
+    print('-' * 37)
+    for size in sizes:
+        words = [SimpleNamespace(id=i, english_word=f'word{i}', translation=f'слово{i}') for i in range(size)]
+        state = QuizState.from_words(1, 1, 1, 'all', QUESTIONS, words)
+
+        used = []
+        repeat = max(20, min(2000, 2_000_000 // size))
+        old_us = time_per_question(lambda: list_scan(words, used), repeat)
+
+        def deck():
+            position = state.next_word()
+            state.distractors(position, 3)
+
+        new_us = time_per_question(deck, 20000)
+        print(f"{size:>7} | {old_us:>9.1f} us | {new_us:>7.2f} us")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Start-quiz latency of the 'random' quiz type against vocabulary size.
+
+"load all" is the old approach (hydrate every Word of the user, then
+random.sample 20); "in database" is database.sampling.sample_words, which
+returns only 20 rows and 3 columns. Other users' words are interleaved so
+the user's ids are not contiguous, as in a real table.
+
+Runs against a temporary SQLite file by default; set DATABASE_URL to
+measure PostgreSQL.
+
+Usage:
+    python benchmarks/bench_quiz_start.py [vocabulary sizes...]   # default: 100 1000 10000 50000
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from app import app, db
+from models import User, Word
+from database.sampling import sample_words
+
+RUNS = 20
+
+
+def load_all(user_id):
+    all_words = Word.query.filter_by(user_id=user_id).all()
+    return random.sample(all_words, min(len(all_words), 20))
+
+
+def create_user(size):
+    user = User(telegram_id=f'bench-{size}-{random.random()}', username='bench')
+    other = User(telegram_id=f'other-{size}-{random.random()}', username='other')
+    db.session.add_all([user, other])
+    db.session.commit()
+    rows = []
+    for i in range(size):
+        rows.append({'user_id': user.id, 'english_word': f'word{i}', 'translation': f'слово{i}'})
+        rows.append({'user_id': other.id, 'english_word': f'other{i}', 'translation': f'другое{i}'})
+    db.session.execute(Word.__table__.insert(), rows)
+    db.session.commit()
+    return user.id
+
+
+def median_ms(fn, user_id):
+    times = []
+    for _ in range(RUNS):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn(user_id)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000, 50000]
+    with app.app_context():
+        print(f"database: {db.engine.dialect.name}, median of {RUNS} runs\n")
+        print(f"{'words':>7} | {'load all':>10} | {'in database':>11}")
+        print('-' * 36)
+        for size in sizes:
+            user_id = create_user(size)
+            old_ms = median_ms(load_all, user_id)
+            new_ms = median_ms(lambda uid: sample_words(uid, 20), user_id)
+            print(f"{size:>7} | {old_ms:>7.2f} ms | {new_ms:>8.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram for webhook mode: POSTs synthetic updates to the webhook
+endpoint and answers the bot's Bot API calls, then reports updates/second.
+
+By default everything runs in this process: a fake Bot API server, the Flask
+app in webhook mode (one worker, threaded) on a temporary SQLite file, and
+the update sender. With --url the updates go to an app you started yourself,
+e.g. to measure gunicorn (webhook mode runs in one worker, scale its threads):
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_MODE=webhook WEBHOOK_SECRET=bench \\
+        TELEGRAM_BOT_TOKEN=123456:BENCH TRANSLATION_OFFLINE=1 OUTBOUND_GLOBAL_RATE=100000 OUTBOUND_CHAT_RATE=100000 \\
+        gunicorn -w 1 --threads 32 -b :5000 app:app
+    python benchmarks/fake_telegram.py --url http://127.0.0.1:5000/telegram/webhook --secret bench
+
+Usage:
+    python benchmarks/fake_telegram.py [--updates N] [--concurrency N] [--chats N]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Every user goes through the same mix: commands, saving words, listing them
+MESSAGES = ['/start', 'cat', 'house', 'dog', '/words', 'water', '/help', 'tree', 'book', '/words']
+
+
+# Methods Telegram rate-limits per chat and globally
+LIMITED_METHODS = ('sendMessage', 'sendPoll', 'editMessageText', 'editMessageReplyMarkup', 'stopPoll', 'deleteMessage')
+
+
+class TooManyRequests(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """Answers /bot<token>/<method> like the Bot API and counts the calls
+
+    With chat_limit/global_limit it answers 429 (retry_after 1) to sends over
+    that many per second for one chat / for the bot; inject_429 answers 429 to
+    that fraction of sends at random.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, port, chat_limit=None, global_limit=None, inject_429=0.0, latency=0.0):
+        super().__init__(('127.0.0.1', port), FakeBotAPIHandler)
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.message_id = 0
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.inject_429 = inject_429
+        self.latency = latency
+        self.too_many_requests = 0
+        self._recent = []       # send times in the last second
+        self._recent_chat = {}  # chat id -> send times in the last second
+
+    def check_limits(self, method, params):
+        """Raise TooManyRequests if this send breaks a limit"""
+        if method not in LIMITED_METHODS:
+            return
+        now = time.monotonic()
+        chat_id = params.get('chat_id')
+        with self.lock:
+            self._recent = [t for t in self._recent if now - t < 1.0]
+            chat_recent = [t for t in self._recent_chat.get(chat_id, ()) if now - t < 1.0]
+            limited = (random.random() < self.inject_429
+                       or (self.global_limit and len(self._recent) >= self.global_limit)
+                       or (self.chat_limit and len(chat_recent) >= self.chat_limit))
+            if limited:
+                self.too_many_requests += 1
+                raise TooManyRequests(1)
+            self._recent.append(now)
+            chat_recent.append(now)
+            self._recent_chat[chat_id] = chat_recent
+
+    def result(self, method, params):
+        self.check_limits(method, params)
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.message_id += 1
+            message_id = self.message_id
+        if method == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method in ('sendMessage', 'sendPoll', 'editMessageText', 'editMessageReplyMarkup'):
+            chat_id = int(params.get('chat_id', 1))
+            message = {'message_id': message_id, 'date': int(time.time()),
+                       'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
+            if method == 'sendPoll':
+                message['poll'] = {'id': str(message_id), 'question': params.get('question', ''),
+                                   'options': [], 'total_voter_count': 0, 'is_closed': False,
+                                   'is_anonymous': False, 'type': 'quiz', 'allows_multiple_answers': False}
+            return message
+        return True
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        # telebot sends the parameters in the query string, other clients in the body
+        path, _, query = self.path.partition('?')
+        method = path.rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        params = dict(urllib.parse.parse_qsl(query))
+        params.update(urllib.parse.parse_qsl(body))
+        try:
+            status, answer = 200, {'ok': True, 'result': self.server.result(method, params)}
+        except TooManyRequests as e:
+            status, answer = 429, {'ok': False, 'error_code': 429,
+                                   'description': f'Too Many Requests: retry after {e.retry_after}',
+                                   'parameters': {'retry_after': e.retry_after}}
+        payload = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+def synthetic_update(update_id, chat_id, text):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Bench'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench', 'username': f'bench{chat_id}'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}] if text.startswith('/') else [],
+        },
+    }
+
+
+def post_update(url, secret, update):
+    request = urllib.request.Request(url, data=json.dumps(update).encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/json',
+                                              'X-Telegram-Bot-Api-Secret-Token': secret})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+        status = response.status
+    return status, time.perf_counter() - started
+
+
+def start_local_app(api_port, secret):
+    """Serve app.py in webhook mode from a background thread, return its webhook URL"""
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'webhook.db')}")
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:BENCH')
+    os.environ.setdefault('TRANSLATION_OFFLINE', '1')
+    os.environ.setdefault('TRANSLATION_PERSISTENT_CACHE', '0')
+    os.environ.setdefault('QUIZ_STATE_STORE', 'none')
+    # Measure the worker, not Telegram's 30 messages/second: lift the outbound rate limits
+    os.environ.setdefault('OUTBOUND_GLOBAL_RATE', '100000')
+    os.environ.setdefault('OUTBOUND_CHAT_RATE', '100000')
+    os.environ['BOT_MODE'] = 'webhook'
+    os.environ['WEBHOOK_SECRET'] = secret
+    os.environ['TELEGRAM_API_URL'] = f'http://127.0.0.1:{api_port}'
+    os.environ.pop('WEBHOOK_URL', None)
+
+    from werkzeug.serving import make_server
+    from app import app
+    from bot.webhook import webhook_path
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}{webhook_path()}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='webhook endpoint of a running app (default: start one in-process)')
+    parser.add_argument('--secret', default='bench', help='WEBHOOK_SECRET of the app')
+    parser.add_argument('--api-port', type=int, default=8081, help='port of the fake Bot API server')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16, help='updates in flight at once')
+    parser.add_argument('--chats', type=int, default=200, help='distinct users sending updates')
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.api_port)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    url = args.url or start_local_app(args.api_port, args.secret)
+
+    # Each chat sends its messages in order, chats interleave
+    updates = []
+    for n in range(args.updates):
+        chat_id = 100000 + n % args.chats
+        updates.append(synthetic_update(n + 1, chat_id, MESSAGES[(n // args.chats) % len(MESSAGES)]))
+
+    # One warm-up update builds the bot and the database connection
+    post_update(url, args.secret, synthetic_update(0, 99999, '/start'))
+    rejected = post_update_status(url, 'wrong-' + args.secret)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for future in [pool.submit(post_update, url, args.secret, u) for u in updates]:
+            try:
+                status, seconds = future.result()
+                latencies.append(seconds)
+                errors += status != 200
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - started
+
+    dispatcher = None
+    if not args.url:
+        # The endpoint returns once an update is queued; wait for the dispatcher and the sends to drain
+        from bot.webhook import get_bot
+        dispatcher = get_bot().dispatcher
+        outbound = get_bot().outbound
+        while dispatcher is not None and dispatcher.processed < dispatcher.submitted:
+            time.sleep(0.01)
+        while outbound is not None and (outbound.depth() or outbound.stats()['in_flight']):
+            time.sleep(0.01)
+    handled = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"webhook: {url}")
+    print(f"wrong secret answered with HTTP {rejected}")
+    print(f"{args.updates} updates from {args.chats} chats, {args.concurrency} in flight, {errors} errors")
+    print(f"throughput: {args.updates / elapsed:.0f} updates/s accepted, {args.updates / handled:.0f} updates/s handled")
+    if latencies:
+        print(f"latency: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"Bot API calls: {dict(sorted(api.calls.items()))}")
+    if dispatcher is not None:
+        stats = dispatcher.stats()
+        print(f"dispatcher: {stats['workers']} shards, {stats['shed']} shed, max depth {max(stats['max_depth'])}, "
+              f"queue wait p99 {stats['queue_wait']['p99_ms']} ms")
+    api.shutdown()
+    return 0
+
+
+def post_update_status(url, secret):
+    try:
+        return post_update(url, secret, synthetic_update(random.randint(1, 10 ** 9), 1, '/help'))[0]
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Stress test for quiz timers: run many concurrent quizzes through QuizManager
+with a fake bot and record the peak thread count.
+
+Question delays are shortened so a full run takes a few seconds. With the
+central scheduler the thread count stays flat as quizzes grow; the old
+approach (one sleeping thread per question) is simulated for comparison.
+
+Usage:
+    python benchmarks/stress_quiz_scheduler.py [quiz counts...]   # default: 100 500 2000
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+# A file database: in-memory SQLite shares one connection between threads
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}")
+os.environ.setdefault('QUIZ_STATE_STORE', 'none')
+
+import bot.quiz as quiz_module
+from bot.quiz import QuizManager
+from bot.quiz_state import QuizState
+
+QUESTIONS = 5
+DELAY = 0.2
+
+
+class FakeBot:
+    """Accepts the calls QuizManager makes and answers like Telegram would"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._polls = 0
+        self.results = 0
+
+    def send_poll(self, **kwargs):
+        with self._lock:
+            self._polls += 1
+            return SimpleNamespace(poll=SimpleNamespace(id=str(self._polls)))
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self._lock:
+            self.results += 1
+
+
+class PeakThreads:
+    """Sample threading.active_count() in the background"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.peak
+
+
+def make_quiz(chat_id):
+    words = [SimpleNamespace(id=i, english_word=f'word{i}', translation=f'слово{i}') for i in range(8)]
+    return QuizState.from_words(chat_id, chat_id, chat_id, 'all', QUESTIONS, words)
+
+
+def run_scheduler(quizzes):
+    fake_bot = FakeBot()
+    manager = QuizManager(fake_bot)
+    baseline = threading.active_count()
+    sampler = PeakThreads()
+    started = time.perf_counter()
+    for chat_id in range(quizzes):
+        manager.active_quizzes[chat_id] = make_quiz(chat_id)
+        manager._send_poll_question(chat_id)
+    while fake_bot.results < quizzes:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+    manager.scheduler.shutdown()
+    return peak - baseline, elapsed
+
+
+def run_thread_per_question(quizzes):
+    # What the old code did: every question parks a thread in time.sleep()
+    done = threading.Semaphore(0)
+    baseline = threading.active_count()
+    sampler = PeakThreads()
+    started = time.perf_counter()
+
+    def question(remaining):
+        time.sleep(DELAY)
+        if remaining > 1:
+            threading.Thread(target=question, args=(remaining - 1,), daemon=True).start()
+        else:
+            done.release()
+
+    for _ in range(quizzes):
+        threading.Thread(target=question, args=(QUESTIONS,), daemon=True).start()
+    for _ in range(quizzes):
+        done.acquire()
+    elapsed = time.perf_counter() - started
+    return sampler.stop() - baseline, elapsed
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [100, 500, 2000]
+    quiz_module.NEXT_QUESTION_DELAY = DELAY
+    print(f"{QUESTIONS} questions per quiz, {DELAY * 1000:.0f} ms between questions\n")
+    print(f"{'quizzes':>8} | {'mode':<20} | {'extra threads':>13} | {'wall time':>9}")
+    print('-' * 60)
+    for count in counts:
+        for mode, runner in (('scheduler', run_scheduler), ('thread per question', run_thread_per_question)):
+            threads, elapsed = runner(count)
+            print(f"{count:>8} | {mode:<20} | {threads:>13} | {elapsed:>8.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
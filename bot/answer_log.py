@@ -0,0 +1,210 @@
+"""
+Write-behind buffer for quiz answers
+
+Poll answers are appended in memory and written in bulk: one multi-row
+INSERT into quiz_answers plus one executemany UPDATE of the touched quiz
+scores, in a single transaction. A flush happens when a quiz ends, when the
+buffer reaches QUIZ_ANSWER_FLUSH_SIZE rows, and every
+QUIZ_ANSWER_FLUSH_INTERVAL seconds.
+
+QUIZ_ANSWER_DURABILITY=sync writes every answer immediately instead (one
+transaction per answer, nothing lost on a crash); the default 'buffered'
+can lose up to one interval of answers if the process dies.
+
+A failed flush puts its rows back and the next attempt waits for a backoff
+that doubles from the flush interval up to QUIZ_ANSWER_MAX_BACKOFF seconds,
+so an unreachable database keeps the rows instead of losing them. Only a
+row-specific error (IntegrityError, DataError) can cost data: after
+QUIZ_ANSWER_FLUSH_RETRIES of those in a row the rows are written one at a
+time, so a single bad row cannot hold the buffer hostage, and rows that
+still fail that way are logged and dropped. While the database is down the
+buffer holds at most QUIZ_ANSWER_MAX_PENDING answers; past that the oldest
+ones are dropped.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import update
+from sqlalchemy.exc import DataError, IntegrityError
+
+from utils.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by the rows themselves: retrying the same rows cannot help
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+class AnswerBuffer:
+    """Collects quiz answers and score changes until the next flush"""
+
+    def __init__(self, scheduler=None, durability=None, flush_interval=None, flush_size=None,
+                 max_pending=None, clock=time.monotonic):
+        self.durability = durability or os.environ.get('QUIZ_ANSWER_DURABILITY', 'buffered')
+        self.flush_interval = flush_interval or float(os.environ.get('QUIZ_ANSWER_FLUSH_INTERVAL', '5'))
+        self.flush_size = flush_size or int(os.environ.get('QUIZ_ANSWER_FLUSH_SIZE', '500'))
+        self.max_retries = int(os.environ.get('QUIZ_ANSWER_FLUSH_RETRIES', '3'))
+        self.max_backoff = float(os.environ.get('QUIZ_ANSWER_MAX_BACKOFF', '300'))
+        self.max_pending = max_pending or int(os.environ.get('QUIZ_ANSWER_MAX_PENDING', '50000'))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._answers: List[Dict] = []
+        self._scores: Dict[int, int] = {}  # session id -> latest score
+        self.flush_latency = LatencyHistogram()
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.last_flush_size = 0
+        self.max_flush_size = 0
+        self.failures = 0
+        self.dropped = 0
+        self._failed_flushes = 0  # consecutive failed flushes
+        self._bad_rows = False    # the last failure was a row-specific error
+        self._retry_at = 0.0      # no flush before this clock time
+        self._full = False        # answers dropped since the last successful flush
+        self._scheduler = scheduler
+        if scheduler is not None and self.durability != 'sync':
+            scheduler.schedule(self.flush_interval, self._flush_on_timer)
+
+    @property
+    def sync(self) -> bool:
+        return self.durability == 'sync'
+
+    def record(self, state, selected_option, correct: bool):
+        """Buffer one answer to the open question of a QuizState"""
+        answer = {
+            'session_id': state.session_id,
+            'user_id': state.user_id,
+            'word_id': state.word_ids[state.correct_position],
+            'question_number': state.current_question,
+            'selected_option': selected_option,
+            'correct': correct,
+            'answered_at': datetime.utcnow(),
+        }
+        with self._lock:
+            self._answers.append(answer)
+            self._scores[state.session_id] = state.score
+            overflow = len(self._answers) - self.max_pending
+            if overflow > 0:
+                del self._answers[:overflow]
+                self.dropped += overflow
+            pending = len(self._answers)
+        if overflow > 0 and not self._full:
+            self._full = True
+            logger.warning(f"Quiz answer buffer is full ({self.max_pending}), dropping the oldest answers")
+        if self.sync or pending >= self.flush_size:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._answers)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of answers written"""
+        from app import app, db
+        from models import QuizAnswer, QuizSession
+        with self._flush_lock:
+            if self._clock() < self._retry_at:
+                return 0  # backing off after a failed flush
+            with self._lock:
+                answers, self._answers = self._answers, []
+                scores, self._scores = self._scores, {}
+            if not answers and not scores:
+                return 0
+            started = time.perf_counter()
+            with app.app_context():
+                try:
+                    if self._bad_rows and self._failed_flushes >= self.max_retries:
+                        written = self._flush_rows(answers, scores)
+                    else:
+                        if answers:
+                            db.session.execute(QuizAnswer.__table__.insert(), answers)
+                        if scores:
+                            db.session.execute(update(QuizSession),
+                                               [{'id': sid, 'score': score} for sid, score in scores.items()])
+                        db.session.commit()
+                        written = len(answers)
+                    self._failed_flushes = 0
+                    self._bad_rows = False
+                    self._full = False
+                except Exception as e:
+                    db.session.rollback()
+                    self._requeue(answers, scores)
+                    self.failures += 1
+                    self._failed_flushes += 1
+                    self._bad_rows = isinstance(e, ROW_ERRORS)
+                    backoff = min(self.flush_interval * 2 ** (self._failed_flushes - 1), self.max_backoff)
+                    self._retry_at = self._clock() + backoff
+                    logger.error(f"Error flushing {len(answers)} quiz answers (failure {self._failed_flushes}, "
+                                 f"retrying in {backoff:.0f}s): {e}")
+                    return 0
+            self.flush_latency.observe(time.perf_counter() - started)
+            self.flushes += 1
+            self.rows_flushed += written
+            self.last_flush_size = written
+            self.max_flush_size = max(self.max_flush_size, written)
+            return written
+
+    def _requeue(self, answers: List[Dict], scores: Dict[int, int]):
+        """Put rows back in front of anything buffered meanwhile"""
+        with self._lock:
+            self._answers[:0] = answers
+            for sid, score in scores.items():
+                self._scores.setdefault(sid, score)
+
+    def _flush_rows(self, answers: List[Dict], scores: Dict[int, int]) -> int:
+        """Write rows one transaction each, dropping the ones that are themselves bad
+
+        Any other error stops the pass; the rows not yet written go back to
+        the buffer through the caller. Needs an app context.
+        """
+        from app import db
+        from models import QuizAnswer, QuizSession
+        written = 0
+        while answers:
+            try:
+                db.session.execute(QuizAnswer.__table__.insert(), answers[:1])
+                db.session.commit()
+                written += 1
+            except ROW_ERRORS as e:
+                db.session.rollback()
+                self.dropped += 1
+                logger.error(f"Dropping quiz answer that cannot be written {answers[0]}: {e}")
+            answers.pop(0)
+        while scores:
+            sid, score = next(iter(scores.items()))
+            try:
+                db.session.execute(update(QuizSession).where(QuizSession.id == sid).values(score=score))
+                db.session.commit()
+            except ROW_ERRORS as e:
+                db.session.rollback()
+                self.dropped += 1
+                logger.error(f"Dropping score {score} of quiz session {sid}: {e}")
+            del scores[sid]
+        logger.warning(f"Wrote {written} quiz answers one by one after repeated row errors")
+        return written
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            self._scheduler.schedule(self.flush_interval, self._flush_on_timer)
+
+    def stats(self) -> Dict:
+        """Flush sizes and latency"""
+        return {
+            'durability': self.durability,
+            'pending': self.pending(),
+            'flushes': self.flushes,
+            'rows_flushed': self.rows_flushed,
+            'avg_flush_size': self.rows_flushed / self.flushes if self.flushes else 0.0,
+            'last_flush_size': self.last_flush_size,
+            'max_flush_size': self.max_flush_size,
+            'failures': self.failures,
+            'dropped': self.dropped,
+            'latency': self.flush_latency.snapshot(),
+        }
@@ -0,0 +1,274 @@
+"""
+Asyncio runtime for the bot (BOT_RUNTIME=asyncio)
+
+Telegram I/O runs on one event loop with telebot's AsyncTeleBot: long
+polling and every Bot API call share a single keep-alive aiohttp session
+(at most ASYNC_HTTP_POOL_SIZE connections). Waiting on Telegram therefore
+costs a coroutine, not a thread, and quiz timers already run on the central
+scheduler.
+
+There is no async database path. The handler logic (BotHandlers,
+QuizManager) stays synchronous and runs on a bounded executor of
+ASYNC_DB_WORKERS threads, the only place the database and the translator
+are touched; a handler holds its thread while it waits on them, so at most
+ASYNC_DB_WORKERS updates are handled at once. This runtime bounds that
+work, it does not make it non-blocking. Bot API sends are started on the
+event loop by LoopBot, which returns a future and keeps the calls of one
+chat in order; calls whose result the handler needs (RESULT_METHODS: the
+quiz's send_poll) still wait on the executor thread. With the outbound
+queue on, its sender threads wait on the loop instead.
+
+Updates of one chat run in arrival order. The polling loop takes one of
+ASYNC_MAX_INFLIGHT slots before it hands an update to the handlers and
+stops fetching updates while all slots are taken, so a backlog waits at
+Telegram instead of piling up as tasks.
+"""
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from telebot import asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+
+from bot.handlers import BotHandlers
+from bot.outbound import RATE_LIMITED_METHODS, RESULT_METHODS, OutboundBot, OutboundQueue, chat_id_of
+from bot.broadcast import BroadcastEngine
+from utils.translator import Translator
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingBot:
+    """Synchronous face of an AsyncTeleBot for code running outside the event loop"""
+
+    def __init__(self, async_bot: AsyncTeleBot, timeout: float = 60.0):
+        self._async_bot = async_bot
+        self.timeout = timeout
+        self.loop = None  # set once the event loop runs
+        self._loop_thread = None
+
+    def __getattr__(self, name):
+        attr = getattr(self._async_bot, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self.loop is None:
+                raise RuntimeError("The bot event loop is not running")
+            if threading.get_ident() == self._loop_thread:
+                raise RuntimeError(f"BlockingBot.{name} called on the event loop thread")
+            future = asyncio.run_coroutine_threadsafe(attr(*args, **kwargs), self.loop)
+            try:
+                return future.result(self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise
+        return call
+
+    def attach(self, loop):
+        self.loop = loop
+        self._loop_thread = threading.get_ident()
+
+
+class LoopBot(BlockingBot):
+    """Bot for handler threads: sends run on the event loop without blocking the caller
+
+    A send returns a concurrent Future; RESULT_METHODS and calls that are
+    not coroutines return their result as usual. Sends to one chat reach
+    Telegram one after another, in the order they were made.
+    """
+
+    def __init__(self, async_bot: AsyncTeleBot, timeout: float = 60.0):
+        super().__init__(async_bot, timeout)
+        self._tails: Dict[int, asyncio.Future] = {}  # chat id -> done marker of its last send (loop thread only)
+
+    def __getattr__(self, name):
+        attr = getattr(self._async_bot, name)
+        if name in RESULT_METHODS or name not in RATE_LIMITED_METHODS:
+            return super().__getattr__(name)
+
+        def call(*args, **kwargs):
+            if self.loop is None:
+                raise RuntimeError("The bot event loop is not running")
+            chat_id = chat_id_of(name, args, kwargs)
+            future = asyncio.run_coroutine_threadsafe(self._in_order(chat_id, attr, args, kwargs), self.loop)
+            future.add_done_callback(lambda f: _log_failure(f, name, chat_id))
+            return future
+        return call
+
+    async def _in_order(self, chat_id: Optional[int], attr, args, kwargs):
+        """Run the call after the chat's earlier calls have finished"""
+        if chat_id is None:
+            return await attr(*args, **kwargs)
+        previous = self._tails.get(chat_id)
+        done = self._tails[chat_id] = asyncio.get_running_loop().create_future()
+        try:
+            if previous is not None:
+                await previous
+            return await attr(*args, **kwargs)
+        finally:
+            done.set_result(None)
+            if self._tails.get(chat_id) is done:
+                del self._tails[chat_id]
+
+
+def _log_failure(future: Future, method: str, chat_id: Optional[int]):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error sending {method} to chat {chat_id}: {future.exception()}")
+
+
+class AsyncVocabularyBot:
+    """VocabularyBot on an event loop, with handler logic on a bounded executor"""
+
+    def __init__(self):
+        self.token = os.environ.get('TELEGRAM_BOT_TOKEN')
+        if not self.token:
+            raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
+
+        if os.environ.get('TELEGRAM_API_URL'):
+            asyncio_helper.API_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/bot{0}/{1}'
+        # All calls from the loop thread reuse one session with this many keep-alive connections
+        asyncio_helper.REQUEST_LIMIT = int(os.environ.get('ASYNC_HTTP_POOL_SIZE', '100'))
+
+        self.bot = AsyncTeleBot(self.token)
+        self.blocking_bot = BlockingBot(self.bot)
+        self.loop_bot = LoopBot(self.bot)
+        self.executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASYNC_DB_WORKERS', '16')),
+                                           thread_name_prefix='BotDB')
+        self.max_inflight = int(os.environ.get('ASYNC_MAX_INFLIGHT', '1000'))
+        self._inflight = None  # asyncio.Semaphore, created on the loop
+        self._tasks = set()  # updates being handled
+        self._chat_locks: Dict[int, List] = {}  # chat id -> [asyncio.Lock, waiting handlers]
+        self.translator = Translator()
+        self.outbound = OutboundQueue(self.blocking_bot) if os.environ.get('OUTBOUND_QUEUE', '1') != '0' else None
+        self.handlers = BotHandlers(OutboundBot(self.blocking_bot, self.outbound) if self.outbound else self.loop_bot,
+                                    self.translator)
+        self.broadcasts = BroadcastEngine(self.outbound or OutboundQueue(self.blocking_bot),
+                                          self.translator, on_blocked=self.handlers.forget_users)
+        self.setup_handlers()
+
+    async def dispatch(self, chat_id, handler, update):
+        """Run a handler on the executor after the chat's earlier updates"""
+        if isinstance(update, types.Message):
+            logger.info(f"📩 Incoming message from {update.from_user.id} (@{update.from_user.username}): '{update.text}'")
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await asyncio.get_running_loop().run_in_executor(self.executor, handler, update)
+        except Exception as e:
+            logger.error(f"Error handling update for chat {chat_id}: {e}")
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[chat_id]
+
+    def setup_handlers(self):
+        """Setup all bot command and message handlers"""
+
+        @self.bot.message_handler(commands=['start'])
+        async def start_command(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_start, message)
+
+        @self.bot.message_handler(commands=['words'])
+        async def words_command(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_words, message)
+
+        @self.bot.message_handler(commands=['test'])
+        async def test_command(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_test, message)
+
+        @self.bot.message_handler(commands=['delete'])
+        async def delete_command(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_delete, message)
+
+        @self.bot.message_handler(commands=['stop'])
+        async def stop_command(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_stop, message)
+
+        @self.bot.message_handler(commands=['help'])
+        async def help_command(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_help, message)
+
+        @self.bot.message_handler(func=lambda message: True)
+        async def handle_text(message):
+            await self.dispatch(message.chat.id, self.handlers.handle_text_message, message)
+
+        @self.bot.callback_query_handler(func=lambda call: True)
+        async def handle_callback(call):
+            chat_id = call.message.chat.id if call.message else call.from_user.id
+            await self.dispatch(chat_id, self.handlers.handle_callback_query, call)
+
+        @self.bot.poll_answer_handler(func=lambda poll_answer: True)
+        async def handle_poll_answer(poll_answer):
+            # Quizzes run in private chats, where the chat id is the user id
+            await self.dispatch(poll_answer.user.id, self.handlers.handle_poll_answer, poll_answer)
+
+    async def poll(self, timeout: int = 20, request_timeout: int = 30):
+        """Long polling that stops fetching while ASYNC_MAX_INFLIGHT updates are being handled"""
+        offset = None
+        error_interval = 0.25
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=timeout, request_timeout=request_timeout)
+                error_interval = 0.25
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error getting updates: {e}")
+                await asyncio.sleep(error_interval)
+                error_interval = min(error_interval * 2, 60)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                # Taken before the task exists: a backlog waits at Telegram, not in memory
+                await self._inflight.acquire()
+                task = asyncio.create_task(self._handle_update(update))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _handle_update(self, update):
+        try:
+            await self.bot.process_new_updates([update])
+        except Exception as e:
+            logger.error(f"Error processing update {update.update_id}: {e}")
+        finally:
+            self._inflight.release()
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        self.blocking_bot.attach(loop)
+        self.loop_bot.attach(loop)
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        try:
+            bot_info = await self.bot.get_me()
+            logger.info(f"Bot connected successfully as @{bot_info.username} (asyncio runtime)")
+
+            logger.info("Removing existing webhooks...")
+            await self.bot.remove_webhook()
+
+            # Pick up quizzes that were running before the restart
+            await loop.run_in_executor(self.executor, self.handlers.quiz_manager.recover)
+            # Daily broadcasts, and broadcasts interrupted by the restart
+            self.broadcasts.watch(self.handlers.quiz_manager.scheduler)
+
+            logger.info("Starting polling...")
+            await self.poll()
+        finally:
+            await self.bot.close_session()
+
+    def run(self):
+        """Start the bot"""
+        logger.info("Starting Vocabulary Bot (asyncio runtime)...")
+        try:
+            asyncio.run(self.main())
+        except Exception as e:
+            logger.error(f"Bot error: {e}")
+            raise
+        finally:
+            self.executor.shutdown(wait=False)
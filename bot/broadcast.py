@@ -0,0 +1,366 @@
+"""
+Broadcasts to every user: word of the day and review reminders
+
+A broadcast is a BroadcastRun row keyed '<kind>:<day>', so each kind goes
+out once a day however many processes try to start it. Users are read in
+batches of BROADCAST_BATCH_SIZE by id (keyset, skipping blocked users), and
+messages are rendered from data computed once per run (the word of the
+day) or once per batch (due-word counts for the whole batch in two grouped
+queries). Sends go through the outbound queue at background priority, so
+they use the bot's full rate limit without delaying interactive replies;
+the next batch is read while the current one is being sent.
+
+After every batch the run records the last user id it finished, and while
+it is sending a heartbeat thread touches the run every BROADCAST_LEASE / 3
+seconds however long a batch takes. A run whose sender stopped updating it
+for BROADCAST_LEASE seconds (a crash or restart) is picked up again from
+the checkpoint, so up to two batches (the one being sent and the one queued
+behind it) can go out twice. A batch's sends get BROADCAST_SEND_TIMEOUT
+seconds; those still queued then are cancelled and counted as failed. Users Telegram
+reports as blocked or gone are written to blocked_users and skipped from
+then on; writing to the bot again clears the mark.
+"""
+import os
+import sys
+import json
+import logging
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import exists, func, select, update
+from telebot.apihelper import ApiTelegramException
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.buttons import BotButtons
+from bot.outbound import BACKGROUND
+from database.upsert import insert_ignore
+
+logger = logging.getLogger(__name__)
+
+WORD_OF_THE_DAY = 'word_of_day'
+DUE_REMINDER = 'due_reminder'
+KINDS = (WORD_OF_THE_DAY, DUE_REMINDER)
+
+# Error descriptions meaning the user cannot receive messages from the bot any more
+BLOCKED_ERRORS = ('bot was blocked', 'user is deactivated', 'chat not found', "can't initiate conversation")
+
+
+def _is_blocked(error: Exception) -> bool:
+    if not isinstance(error, ApiTelegramException) or error.error_code not in (400, 403):
+        return False
+    description = str(error.description).lower()
+    return any(reason in description for reason in BLOCKED_ERRORS)
+
+
+class BroadcastEngine:
+    """Sends broadcasts through an OutboundQueue and checkpoints their progress"""
+
+    def __init__(self, outbound, translator=None, batch_size: Optional[int] = None,
+                 lease: Optional[float] = None, send_timeout: Optional[float] = None, on_blocked=None):
+        self.outbound = outbound
+        self.translator = translator
+        # Called with the telegram ids of users found to have blocked the bot (e.g. to drop cached state)
+        self.on_blocked = on_blocked
+        self.batch_size = batch_size or int(os.environ.get('BROADCAST_BATCH_SIZE', '500'))
+        self.lease = lease or float(os.environ.get('BROADCAST_LEASE', '300'))
+        self.send_timeout = send_timeout or float(os.environ.get('BROADCAST_SEND_TIMEOUT', '600'))
+        self.buttons = BotButtons()
+        self._running = set()  # run ids this process is sending
+        self._lock = threading.Lock()
+
+    # Starting and resuming runs
+
+    def start(self, kind: str, day=None) -> Optional[int]:
+        """Create today's run of a kind; None if it already exists"""
+        from app import app, db
+        from models import BroadcastRun
+        if kind not in KINDS:
+            raise ValueError(f"Unknown broadcast kind: {kind}")
+        day = day or datetime.utcnow().date()
+        run_key = f'{kind}:{day.isoformat()}'
+        with app.app_context():
+            if db.session.execute(select(BroadcastRun.id).where(BroadcastRun.run_key == run_key)).first():
+                return None
+            payload = self._payload(kind, day)
+            if payload is None:
+                logger.warning(f"Nothing to broadcast for {kind} on {day}")
+                return None
+            now = datetime.utcnow()
+            # The unique run_key makes concurrent starts (several workers) create one run
+            run_id = insert_ignore(db.session, BroadcastRun.__table__, {
+                'run_key': run_key,
+                'kind': kind,
+                'payload': json.dumps(payload, ensure_ascii=False),
+                'status': 'running',
+                'last_user_id': 0,
+                'sent': 0, 'failed': 0, 'skipped': 0, 'blocked': 0,
+                'created_at': now,
+                'updated_at': now,
+            })
+            db.session.commit()
+        if run_id is not None:
+            logger.info(f"Started broadcast run {run_id} ({kind} for {day})")
+        return run_id
+
+    def claim_stale_runs(self) -> List[int]:
+        """Take over unfinished runs whose sender stopped checkpointing"""
+        from app import app, db
+        from models import BroadcastRun
+        claimed = []
+        with app.app_context():
+            now = datetime.utcnow()
+            stale = now - timedelta(seconds=self.lease)
+            candidates = db.session.execute(
+                select(BroadcastRun.id).where(BroadcastRun.status == 'running', BroadcastRun.updated_at < stale)
+            ).scalars().all()
+            for run_id in candidates:
+                # Conditional update: only one process wins the claim
+                result = db.session.execute(
+                    update(BroadcastRun)
+                    .where(BroadcastRun.id == run_id, BroadcastRun.status == 'running',
+                           BroadcastRun.updated_at < stale)
+                    .values(updated_at=now)
+                )
+                if result.rowcount == 1:
+                    claimed.append(run_id)
+            db.session.commit()
+        for run_id in claimed:
+            logger.info(f"Resuming broadcast run {run_id}")
+        return claimed
+
+    def run_in_background(self, run_id: int):
+        with self._lock:
+            if run_id in self._running:
+                return
+            self._running.add(run_id)
+        threading.Thread(target=self._run_and_release, args=(run_id,), name=f'Broadcast-{run_id}',
+                         daemon=True).start()
+
+    def _run_and_release(self, run_id: int):
+        try:
+            self.run(run_id)
+        except Exception as e:
+            logger.error(f"Broadcast run {run_id} stopped: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(run_id)
+
+    def watch(self, scheduler, daily_at: Optional[str] = None, kinds=None, interval: Optional[float] = None):
+        """Every interval: start the day's broadcasts once daily_at (UTC HH:MM) has passed, resume stale runs"""
+        daily_at = daily_at if daily_at is not None else os.environ.get('BROADCAST_DAILY_AT', '')
+        kinds = kinds or [k for k in os.environ.get('BROADCAST_KINDS', ','.join(KINDS)).split(',') if k]
+        interval = interval or min(60.0, self.lease / 2)
+
+        def tick():
+            try:
+                now = datetime.utcnow()
+                if daily_at and now.strftime('%H:%M') >= daily_at:
+                    for kind in kinds:
+                        run_id = self.start(kind, now.date())
+                        if run_id is not None:
+                            self.run_in_background(run_id)
+                for run_id in self.claim_stale_runs():
+                    self.run_in_background(run_id)
+            except Exception as e:
+                logger.error(f"Error checking broadcasts: {e}")
+            finally:
+                scheduler.schedule(interval, tick)
+
+        scheduler.schedule(0, tick)
+
+    # Sending
+
+    def run(self, run_id: int):
+        """Send a run from its checkpoint to the last user"""
+        from app import app, db
+        from models import BroadcastRun
+        with app.app_context():
+            run = db.session.get(BroadcastRun, run_id)
+            if run is None or run.status != 'running':
+                return
+            kind, after = run.kind, run.last_user_id
+            payload = json.loads(run.payload)
+            db.session.close()
+
+            stop = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(run_id, stop), name=f'Broadcast-{run_id}-heartbeat',
+                             daemon=True).start()
+            try:
+                self._send_batches(run_id, kind, payload, after)
+            finally:
+                stop.set()
+
+            db.session.execute(update(BroadcastRun).where(BroadcastRun.id == run_id)
+                               .values(status='done', finished_at=datetime.utcnow(), updated_at=datetime.utcnow()))
+            db.session.commit()
+            run = db.session.get(BroadcastRun, run_id)
+            logger.info(f"Broadcast run {run_id} done: {run.sent} sent, {run.failed} failed, "
+                        f"{run.blocked} blocked, {run.skipped} skipped")
+
+    def _send_batches(self, run_id: int, kind: str, payload: Dict, after: int):
+        """Send batch after batch from a user id on, checkpointing each"""
+        pending = None  # (last user id, [(user id, chat id, future)], skipped) of the batch being sent
+        while True:
+            users = self._next_users(after)
+            messages, skipped = self._render(kind, payload, users)
+            futures = [(user_id, chat_id, self.outbound.submit('send_message', chat_id, (chat_id, text), options,
+                                                               priority=BACKGROUND))
+                       for user_id, chat_id, text, options in messages]
+            # While this batch is queued, wait for the previous one and checkpoint it
+            if pending is not None:
+                self._checkpoint(run_id, *pending)
+            if not users:
+                break
+            after = users[-1].id
+            pending = (after, futures, skipped)
+            if len(users) < self.batch_size:
+                self._checkpoint(run_id, *pending)
+                break
+
+    def _heartbeat(self, run_id: int, stop: threading.Event):
+        """Keep a run's lease fresh while it is being sent"""
+        from app import app, db
+        from models import BroadcastRun
+        while not stop.wait(self.lease / 3):
+            try:
+                with app.app_context():
+                    db.session.execute(update(BroadcastRun)
+                                       .where(BroadcastRun.id == run_id, BroadcastRun.status == 'running')
+                                       .values(updated_at=datetime.utcnow()))
+                    db.session.commit()
+            except Exception as e:
+                logger.error(f"Error refreshing broadcast run {run_id}: {e}")
+
+    def _next_users(self, after: int) -> List:
+        """The next batch of (id, telegram_id) rows after a user id, blocked users excluded"""
+        from app import db
+        from models import BlockedUser, User
+        return db.session.execute(
+            select(User.id, User.telegram_id)
+            .where(User.id > after, ~exists().where(BlockedUser.user_id == User.id))
+            .order_by(User.id)
+            .limit(self.batch_size)
+        ).all()
+
+    def _checkpoint(self, run_id: int, last_user_id: int, futures, skipped: int):
+        """Wait (up to send_timeout) for a batch's sends, record blocked users and move the run's checkpoint"""
+        from app import db
+        from models import BlockedUser, BroadcastRun
+        sent = failed = 0
+        blocked = []
+        deadline = time.monotonic() + self.send_timeout
+        for user_id, chat_id, future in futures:
+            try:
+                future.result(max(0.0, deadline - time.monotonic()))
+                sent += 1
+            except TimeoutError:
+                # Still queued: drop it rather than hold the run (a send already in flight completes anyway)
+                future.cancel()
+                failed += 1
+            except Exception as e:
+                if _is_blocked(e):
+                    blocked.append((user_id, chat_id, str(e.description)[:200]))
+                else:
+                    failed += 1
+        now = datetime.utcnow()
+        for user_id, _, reason in blocked:
+            insert_ignore(db.session, BlockedUser.__table__,
+                          {'user_id': user_id, 'reason': reason, 'blocked_at': now})
+        db.session.execute(
+            update(BroadcastRun).where(BroadcastRun.id == run_id).values(
+                last_user_id=last_user_id,
+                sent=BroadcastRun.sent + sent,
+                failed=BroadcastRun.failed + failed,
+                blocked=BroadcastRun.blocked + len(blocked),
+                skipped=BroadcastRun.skipped + skipped,
+                updated_at=now,
+            )
+        )
+        db.session.commit()
+        if blocked and self.on_blocked is not None:
+            self.on_blocked([str(chat_id) for _, chat_id, _ in blocked])
+
+    # Rendering
+
+    def _payload(self, kind: str, day) -> Optional[Dict]:
+        """Data shared by every message of a run"""
+        if kind == WORD_OF_THE_DAY:
+            if self.translator is None:
+                return None
+            lexicon = self.translator.lexicon
+            words = sorted(lexicon.words())
+            if not words:
+                return None
+            # The same word for everyone, a different one each day
+            word = words[day.toordinal() % len(words)]
+            return {'word': word, 'translation': lexicon.lookup(word)}
+        return {}
+
+    def _render(self, kind: str, payload: Dict, users):
+        """(user id, chat id, text, send_message options) per user, and how many users were skipped"""
+        if kind == WORD_OF_THE_DAY:
+            text = f"🌟 Word of the day\n\n🔤 **{payload['word'].title()}**\n📖 {payload['translation']}"
+            options = {'parse_mode': 'Markdown'}
+            if len(f"add_word:{payload['word']}:{payload['translation']}".encode('utf-8')) <= 64:
+                options['reply_markup'] = self.buttons.add_to_dictionary_button(payload['word'], payload['translation'])
+            messages = [(u.id, int(u.telegram_id), text, options) for u in users if u.telegram_id]
+        else:
+            due = self._due_counts([u.id for u in users])
+            options = {'reply_markup': self.buttons.review_reminder_keyboard()}
+            messages = [
+                (u.id, int(u.telegram_id),
+                 f"🔁 You have {due[u.id]} word{'s' if due[u.id] != 1 else ''} due for review.", options)
+                for u in users if u.telegram_id and due.get(u.id)
+            ]
+        return messages, len(users) - len(messages)
+
+    def _due_counts(self, user_ids: List[int]) -> Dict[int, int]:
+        """Words due for review per user (overdue plus never reviewed), for a whole batch"""
+        from app import db
+        from models import Word, WordReview
+        if not user_ids:
+            return {}
+        counts: Dict[int, int] = {}
+        overdue = db.session.execute(
+            select(WordReview.user_id, func.count())
+            .where(WordReview.user_id.in_(user_ids), WordReview.due_at <= datetime.utcnow())
+            .group_by(WordReview.user_id)
+        ).all()
+        never_reviewed = db.session.execute(
+            select(Word.user_id, func.count())
+            .outerjoin(WordReview, WordReview.word_id == Word.id)
+            .where(Word.user_id.in_(user_ids), WordReview.id.is_(None))
+            .group_by(Word.user_id)
+        ).all()
+        for user_id, count in list(overdue) + list(never_reviewed):
+            counts[user_id] = counts.get(user_id, 0) + count
+        return counts
+
+
+def main(argv):
+    """python bot/broadcast.py word_of_day|due_reminder|resume: send now from this process"""
+    import telebot
+    from bot.outbound import OutboundQueue
+    from utils.translator import Translator
+
+    if len(argv) != 2 or argv[1] not in KINDS + ('resume',):
+        print(f"Usage: python bot/broadcast.py {'|'.join(KINDS)}|resume")
+        return 2
+    if os.environ.get('TELEGRAM_API_URL'):
+        telebot.apihelper.API_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/bot{0}/{1}'
+    bot = telebot.TeleBot(os.environ['TELEGRAM_BOT_TOKEN'], threaded=False)
+    outbound = OutboundQueue(bot)
+    engine = BroadcastEngine(outbound, Translator() if argv[1] == WORD_OF_THE_DAY else None)
+    run_ids = engine.claim_stale_runs() if argv[1] == 'resume' else [engine.start(argv[1])]
+    for run_id in run_ids:
+        if run_id is not None:
+            engine.run(run_id)
+    outbound.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
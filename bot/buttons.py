@@ -12,6 +12,45 @@ class BotButtons:
         markup.add(button)
         return markup
     
+    def suggestions_keyboard(self, word, suggestions):
+        """Create "did you mean" buttons plus a button to translate the word as typed"""
+        markup = telebot.types.InlineKeyboardMarkup(row_width=1)
+
+        buttons = []
+        for suggestion in suggestions:
+            callback_data = f"suggest:{suggestion}"
+            if len(callback_data.encode('utf-8')) <= 64:  # Telegram callback data limit
+                buttons.append(telebot.types.InlineKeyboardButton(f"🔤 {suggestion}", callback_data=callback_data))
+
+        callback_data = f"translate:{word}"
+        if len(callback_data.encode('utf-8')) <= 64:
+            buttons.append(telebot.types.InlineKeyboardButton(f"🌐 Translate '{word}' anyway", callback_data=callback_data))
+
+        markup.add(*buttons)
+        return markup
+    
+    def batch_actions_keyboard(self, token, count):
+        """Create "add all" / "add selected" buttons for a translated word list"""
+        markup = telebot.types.InlineKeyboardMarkup(row_width=1)
+        markup.add(
+            telebot.types.InlineKeyboardButton(f"➕ Add all ({count})", callback_data=f"batch_all:{token}"),
+            telebot.types.InlineKeyboardButton("✅ Add selected", callback_data=f"batch_pick:{token}")
+        )
+        return markup
+    
+    def batch_select_keyboard(self, token, words, selected):
+        """Create toggle buttons for picking words out of a translated list"""
+        markup = telebot.types.InlineKeyboardMarkup(row_width=2)
+        
+        buttons = []
+        for i, word in enumerate(words):
+            mark = "☑️" if i in selected else "⬜"
+            buttons.append(telebot.types.InlineKeyboardButton(f"{mark} {word}", callback_data=f"batch_toggle:{token}:{i}"))
+        markup.add(*buttons)
+        markup.add(telebot.types.InlineKeyboardButton(f"💾 Save selected ({len(selected)})",
+                                                      callback_data=f"batch_save:{token}"))
+        return markup
+    
     def quiz_options_keyboard(self):
         """Create keyboard for quiz options"""
         markup = telebot.types.InlineKeyboardMarkup(row_width=1)
@@ -19,12 +58,19 @@ class BotButtons:
         buttons = [
             telebot.types.InlineKeyboardButton("📚 All Words", callback_data="quiz:all"),
             telebot.types.InlineKeyboardButton("🕐 Last 20 Words", callback_data="quiz:recent"),
-            telebot.types.InlineKeyboardButton("🎲 Random 20 Words", callback_data="quiz:random")
+            telebot.types.InlineKeyboardButton("🎲 Random 20 Words", callback_data="quiz:random"),
+            telebot.types.InlineKeyboardButton("🔁 Due for Review", callback_data="quiz:due")
         ]
         
         markup.add(*buttons)
         return markup
     
+    def review_reminder_keyboard(self):
+        """Create the button under a "words due for review" reminder"""
+        markup = telebot.types.InlineKeyboardMarkup()
+        markup.add(telebot.types.InlineKeyboardButton("🔁 Review now", callback_data="quiz:due"))
+        return markup
+    
     def quiz_question_keyboard(self, options, question_number):
         """Create keyboard for quiz question with multiple choice answers"""
         markup = telebot.types.InlineKeyboardMarkup(row_width=1)
@@ -41,7 +87,7 @@ class BotButtons:
         markup.add(*buttons)
         return markup
     
-    def delete_words_keyboard(self, words):
+    def delete_words_keyboard(self, words, page=None, older=None, newer=None):
         """Create keyboard for deleting words"""
         markup = telebot.types.InlineKeyboardMarkup(row_width=2)
         
@@ -59,4 +105,24 @@ class BotButtons:
             else:
                 markup.add(buttons[i])
         
+        if page is not None:
+            self._add_page_navigation(markup, 'delpage', page, older, newer)
+        return markup
+    
+    def words_page_keyboard(self, page, older, newer):
+        """Create next/previous buttons for the /words list"""
+        markup = telebot.types.InlineKeyboardMarkup()
+        self._add_page_navigation(markup, 'words', page, older, newer)
         return markup
+    
+    def _add_page_navigation(self, markup, prefix, page, older, newer):
+        """Add a ⬅️/➡️ row whose callback data carries the page number and keyset cursor"""
+        buttons = []
+        if newer:
+            buttons.append(telebot.types.InlineKeyboardButton(
+                "⬅️ Newer", callback_data=f"{prefix}:n:{page - 1}:{newer}"))
+        if older:
+            buttons.append(telebot.types.InlineKeyboardButton(
+                "Older ➡️", callback_data=f"{prefix}:o:{page + 1}:{older}"))
+        if buttons:
+            markup.row(*buttons)
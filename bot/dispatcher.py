@@ -0,0 +1,131 @@
+"""
+Per-chat ordered dispatch of bot updates
+
+Every update is routed by chat id to one of DISPATCH_WORKERS shards. A shard
+is a bounded queue drained by a single thread, so the updates of one chat
+run one after another in arrival order while different chats run in
+parallel, and a slow translation or database call only holds up the chats
+that share its shard.
+
+When a shard is full the submitting thread (the polling loop or a webhook
+request) waits up to DISPATCH_PUT_TIMEOUT seconds, which slows down intake;
+if the shard is still full the update is dropped and counted as shed.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from utils.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+SHED_LOG_EVERY = 100  # log the first shed update and then every Nth
+
+
+class UpdateDispatcher:
+    """Fixed pool of single-threaded shards keyed by chat id"""
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 put_timeout: Optional[float] = None, on_shed: Optional[Callable] = None):
+        self.workers = workers or int(os.environ.get('DISPATCH_WORKERS', '8'))
+        self.queue_size = queue_size or int(os.environ.get('DISPATCH_QUEUE_SIZE', '100'))
+        self.put_timeout = float(os.environ.get('DISPATCH_PUT_TIMEOUT', '0.5')) if put_timeout is None else put_timeout
+        self.on_shed = on_shed
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.shed = 0
+        self.max_depth = [0] * self.workers  # high-water mark per shard
+        self.queue_wait = LatencyHistogram()
+        self.handler_latency = LatencyHistogram()
+        self._threads = []
+        for shard in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(shard,), name=f'Dispatch-{shard}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shard_of(self, chat_id: int) -> int:
+        return int(chat_id) % self.workers
+
+    def submit(self, chat_id: int, fn: Callable, *args) -> bool:
+        """Queue fn(*args) behind the earlier updates of the chat; False if it was shed"""
+        shard = self.shard_of(chat_id)
+        shard_queue = self._queues[shard]
+        try:
+            # put_timeout 0 sheds at once instead of waiting
+            shard_queue.put((time.monotonic(), fn, args), block=self.put_timeout > 0,
+                            timeout=self.put_timeout if self.put_timeout > 0 else None)
+        except queue.Full:
+            with self._lock:
+                self.shed += 1
+                shed = self.shed
+            if shed == 1 or shed % SHED_LOG_EVERY == 0:
+                logger.warning(f"Dispatch shard {shard} is full ({self.queue_size} updates), "
+                               f"dropped update for chat {chat_id} ({shed} shed so far)")
+            if self.on_shed is not None:
+                try:
+                    self.on_shed(chat_id, *args)
+                except Exception as e:
+                    logger.error(f"Error in shed callback for chat {chat_id}: {e}")
+            return False
+        depth = shard_queue.qsize()
+        with self._lock:
+            self.submitted += 1
+            if depth > self.max_depth[shard]:
+                self.max_depth[shard] = depth
+        return True
+
+    def _run(self, shard: int):
+        shard_queue = self._queues[shard]
+        while True:
+            item = shard_queue.get()
+            if item is None:
+                return
+            queued_at, fn, args = item
+            started = time.monotonic()
+            self.queue_wait.observe(started - queued_at)
+            try:
+                fn(*args)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Error handling update on dispatch shard {shard}: {e}")
+            finally:
+                self.handler_latency.observe(time.monotonic() - started)
+                with self._lock:
+                    self.processed += 1
+
+    def depths(self) -> List[int]:
+        """Updates waiting in each shard right now"""
+        return [q.qsize() for q in self._queues]
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers after the queued updates are handled"""
+        for shard_queue in self._queues:
+            shard_queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self) -> Dict:
+        """Throughput, shedding and queue depths"""
+        depths = self.depths()
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'failed': self.failed,
+                'shed': self.shed,
+                'queued': sum(depths),
+                'depths': depths,
+                'max_depth': list(self.max_depth),
+                'queue_wait': self.queue_wait.snapshot(),
+                'handler_latency': self.handler_latency.snapshot(),
+            }
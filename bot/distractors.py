@@ -0,0 +1,338 @@
+"""
+Hard distractors for quiz questions
+
+For every user vocabulary a NeighborTable keeps, per word, the words that
+look most alike: English spelling (character n-grams) and translation
+overlap (character n-grams of the Russian text). Each word is a hashed
+n-gram vector; similarities for a whole vocabulary are one matrix product,
+and adding or deleting a word only touches the rows whose neighbors change.
+Rows live in buffers that grow by doubling, so adding a word is amortized
+O(1) copying plus one similarity pass. Picking distractors is then a lookup
+in the word's neighbor row.
+
+A user's table is built in the background the first time a quiz needs
+it; until it is ready (and for vocabularies over QUIZ_DISTRACTOR_MAX_WORDS,
+whose tables would be too slow to build and too large to keep) questions
+use random distractors, so a quiz never waits for a build.
+
+NumPy is imported softly: without it the engine returns no hard
+distractors and quizzes fall back to random ones.
+"""
+import os
+import random
+import logging
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.cache import TTLCache
+from utils.lexicon import normalize_russian
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional speed-up
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NGRAM_BUCKETS = 512
+ORTHOGRAPHIC_WEIGHT = 0.6
+TRANSLATION_WEIGHT = 0.4
+BUILD_CHUNK = 512  # rows per similarity block when building a table
+MIN_CAPACITY = 16  # rows allocated for a table's first words
+
+
+def _ngrams(text: str) -> List[str]:
+    padded = f'^{text}$'
+    grams = [padded[i:i + 2] for i in range(len(padded) - 1)]
+    grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return grams
+
+
+def _variants(translation: str) -> frozenset:
+    return frozenset(normalize_russian(v) for v in translation.split(',') if v.strip())
+
+
+class NeighborTable:
+    """Nearest neighbors for one user's words, updated in place"""
+
+    def __init__(self, neighbors: int = 8):
+        self.k = neighbors
+        self._lock = threading.Lock()
+        self._ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        self._translations: List[str] = []
+        self._variants: List[frozenset] = []
+        self._variant_words: Dict[str, set] = {}  # translation variant -> word ids
+        # Row buffers with spare capacity; the attributes below are views of their used rows
+        self._vector_buffer = np.zeros((0, 2 * NGRAM_BUCKETS), dtype=np.float32)
+        self._id_buffer = np.zeros((0, neighbors), dtype=np.int64)
+        self._sim_buffer = np.zeros((0, neighbors), dtype=np.float32)
+        self._vectors = self._vector_buffer
+        # Per row: neighbor word ids (-1 = empty) and their similarity, best first
+        self._neighbor_ids = self._id_buffer
+        self._neighbor_sims = self._sim_buffer
+
+    def _resize(self, rows: int):
+        """Use `rows` rows of the buffers, doubling their capacity when they are full"""
+        capacity = len(self._vector_buffer)
+        if rows > capacity:
+            capacity = max(rows, 2 * capacity, MIN_CAPACITY)
+            used = len(self._vectors)
+            for name in ('_vector_buffer', '_id_buffer', '_sim_buffer'):
+                old = getattr(self, name)
+                new = np.empty((capacity, old.shape[1]), dtype=old.dtype)
+                new[:used] = old[:used]
+                setattr(self, name, new)
+        self._vectors = self._vector_buffer[:rows]
+        self._neighbor_ids = self._id_buffer[:rows]
+        self._neighbor_sims = self._sim_buffer[:rows]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, word_id: int) -> bool:
+        return word_id in self._rows
+
+    @staticmethod
+    def _vector(english: str, translation: str):
+        vector = np.zeros(2 * NGRAM_BUCKETS, dtype=np.float32)
+        for offset, weight, text in ((0, ORTHOGRAPHIC_WEIGHT, english.lower()),
+                                     (NGRAM_BUCKETS, TRANSLATION_WEIGHT, normalize_russian(translation))):
+            part = vector[offset:offset + NGRAM_BUCKETS]
+            for gram in _ngrams(text):
+                part[zlib.crc32(gram.encode('utf-8')) % NGRAM_BUCKETS] += 1.0
+            norm = np.linalg.norm(part)
+            if norm:
+                part *= np.sqrt(weight) / norm
+        return vector
+
+    def build(self, words: Iterable[Tuple[int, str, str]]):
+        """Replace the table with (word_id, english_word, translation) rows"""
+        words = list(words)
+        vectors = np.array([self._vector(e, t) for _, e, t in words], dtype=np.float32)
+        vectors = vectors.reshape(len(words), 2 * NGRAM_BUCKETS)
+        with self._lock:
+            self._ids = [word_id for word_id, _, _ in words]
+            self._rows = {word_id: row for row, word_id in enumerate(self._ids)}
+            self._translations = [t for _, _, t in words]
+            self._variants = [_variants(t) for t in self._translations]
+            self._variant_words = {}
+            for word_id, variants in zip(self._ids, self._variants):
+                for variant in variants:
+                    self._variant_words.setdefault(variant, set()).add(word_id)
+            capacity = max(len(words), MIN_CAPACITY)
+            self._vector_buffer = np.zeros((capacity, 2 * NGRAM_BUCKETS), dtype=np.float32)
+            self._vector_buffer[:len(words)] = vectors
+            self._id_buffer = np.full((capacity, self.k), -1, dtype=np.int64)
+            self._sim_buffer = np.full((capacity, self.k), -np.inf, dtype=np.float32)
+            self._resize(len(words))
+            for start in range(0, len(words), BUILD_CHUNK):
+                rows = np.arange(start, min(start + BUILD_CHUNK, len(words)))
+                self._recompute(rows)
+
+    def _recompute(self, rows):
+        """Recompute the neighbor rows for the given row indexes from scratch"""
+        sims = self._vectors[rows] @ self._vectors.T
+        sims[np.arange(len(rows)), rows] = -np.inf
+        for i, row in enumerate(rows):
+            self._exclude_synonyms(sims[i], row)
+        self._store_top(rows, sims)
+
+    def _exclude_synonyms(self, sims, row):
+        # A word sharing a translation with the answer would be a second right answer
+        for variant in self._variants[row]:
+            for word_id in self._variant_words.get(variant, ()):
+                sims[self._rows[word_id]] = -np.inf
+
+    def _store_top(self, rows, sims):
+        k = min(self.k, sims.shape[1])
+        if k == 0:
+            return
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+        ids = np.asarray(self._ids, dtype=np.int64)[top]
+        ids[~np.isfinite(top_sims)] = -1
+        self._neighbor_ids[rows] = -1
+        self._neighbor_sims[rows] = -np.inf
+        self._neighbor_ids[rows, :k] = ids
+        self._neighbor_sims[rows, :k] = top_sims
+
+    def add(self, word_id: int, english: str, translation: str):
+        """Add (or update) one word; only rows that gain it as a neighbor change"""
+        vector = self._vector(english, translation)
+        with self._lock:
+            if word_id in self._rows:
+                self._remove_locked(word_id)
+            row = len(self._ids)
+            self._ids.append(word_id)
+            self._rows[word_id] = row
+            self._translations.append(translation)
+            self._variants.append(_variants(translation))
+            for variant in self._variants[row]:
+                self._variant_words.setdefault(variant, set()).add(word_id)
+            self._resize(row + 1)
+            self._vectors[row] = vector
+            self._neighbor_ids[row] = -1
+            self._neighbor_sims[row] = -np.inf
+
+            sims = self._vectors @ vector
+            sims[row] = -np.inf
+            self._exclude_synonyms(sims, row)
+            self._store_top(np.array([row]), sims[None, :])
+
+            # Existing rows where the new word beats their weakest neighbor
+            candidates = np.nonzero(sims[:row] > self._neighbor_sims[:row, -1])[0]
+            for other in candidates:
+                self._insert_neighbor(other, word_id, sims[other])
+
+    def _insert_neighbor(self, row: int, word_id: int, sim: float):
+        ids = self._neighbor_ids[row]
+        sims = self._neighbor_sims[row]
+        position = int(np.searchsorted(-sims, -sim, side='right'))
+        ids[position + 1:] = ids[position:-1].copy()
+        sims[position + 1:] = sims[position:-1].copy()
+        ids[position] = word_id
+        sims[position] = sim
+
+    def remove(self, word_id: int):
+        """Delete one word; rows that listed it as a neighbor are recomputed"""
+        with self._lock:
+            self._remove_locked(word_id)
+
+    def _remove_locked(self, word_id: int):
+        row = self._rows.pop(word_id, None)
+        if row is None:
+            return
+        for variant in self._variants[row]:
+            words = self._variant_words.get(variant)
+            if words is not None:
+                words.discard(word_id)
+                if not words:
+                    del self._variant_words[variant]
+        last = len(self._ids) - 1
+        if row != last:
+            # Move the last row into the hole so the arrays stay dense
+            moved_id = self._ids[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+            self._translations[row] = self._translations[last]
+            self._variants[row] = self._variants[last]
+            self._vectors[row] = self._vectors[last]
+            self._neighbor_ids[row] = self._neighbor_ids[last]
+            self._neighbor_sims[row] = self._neighbor_sims[last]
+        self._ids.pop()
+        self._translations.pop()
+        self._variants.pop()
+        self._resize(last)
+
+        affected = np.nonzero((self._neighbor_ids == word_id).any(axis=1))[0]
+        if len(affected):
+            self._recompute(affected)
+
+    def neighbors(self, word_id: int) -> List[int]:
+        """Most similar word ids, best first"""
+        row = self._rows.get(word_id)
+        if row is None:
+            return []
+        ids = self._neighbor_ids[row]
+        return [int(i) for i in ids if i >= 0]
+
+    def pick(self, word_id: int, count: int = 3, rng=random) -> List[str]:
+        """Translations of `count` hard distractors for a word (fewer if the table is small)"""
+        with self._lock:
+            neighbors = self.neighbors(word_id)
+            # Draw from the closest neighbors so repeated questions vary
+            chosen = rng.sample(neighbors, min(count, len(neighbors)))
+            return [self._translations[self._rows[i]] for i in chosen]
+
+
+class DistractorEngine:
+    """Neighbor tables for recently quizzed users, built in the background on first use"""
+
+    def __init__(self, neighbors: Optional[int] = None, max_users: Optional[int] = None,
+                 max_words: Optional[int] = None):
+        self.enabled = np is not None and os.environ.get('QUIZ_HARD_DISTRACTORS', '1') != '0'
+        self.neighbors = neighbors or int(os.environ.get('QUIZ_DISTRACTOR_NEIGHBORS', '8'))
+        self.max_words = max_words or int(os.environ.get('QUIZ_DISTRACTOR_MAX_WORDS', '2000'))
+        self._tables = TTLCache(maxsize=max_users or int(os.environ.get('QUIZ_DISTRACTOR_USERS', '64')),
+                                ttl=3600)
+        self._oversized = TTLCache(maxsize=10000, ttl=3600)  # users with more than max_words words
+        self._building = set()  # user ids with a build queued or running
+        self._lock = threading.Lock()
+        self._executor = None
+        if np is None:
+            logger.info("NumPy not installed, quizzes use random distractors")
+
+    def table(self, user_id: int) -> Optional[NeighborTable]:
+        """The neighbor table of a user, or None while it is being built (or never will be)"""
+        if not self.enabled:
+            return None
+        table = self._tables.get(user_id)
+        if table is not None or self._oversized.get(user_id):
+            return table
+        with self._lock:
+            if user_id in self._building:
+                return None
+            self._building.add(user_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get('QUIZ_DISTRACTOR_BUILDERS', '2')),
+                    thread_name_prefix='Distractors')
+        self._executor.submit(self._build_in_background, user_id)
+        return None
+
+    def _build_in_background(self, user_id: int):
+        from app import app
+        try:
+            with app.app_context():
+                self._build(user_id)
+        except Exception as e:
+            logger.error(f"Error building distractor table for user {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(user_id)
+
+    def _build(self, user_id: int) -> Optional[NeighborTable]:
+        from app import db
+        from models import Word
+        from sqlalchemy import func, select
+        count = db.session.execute(select(func.count()).where(Word.user_id == user_id)).scalar()
+        if count > self.max_words:
+            self._oversized.set(user_id, True)
+            logger.info(f"User {user_id} has {count} words, more than {self.max_words}: random distractors")
+            return None
+        rows = Word.query.with_entities(Word.id, Word.english_word, Word.translation)\
+                         .filter_by(user_id=user_id).all()
+        table = NeighborTable(self.neighbors)
+        table.build(rows)
+        self._tables.set(user_id, table)
+        logger.info(f"Built distractor table for user {user_id} ({len(table)} words)")
+        return table
+
+    def pick(self, user_id: int, word_id: int, count: int = 3) -> List[str]:
+        """Translations of hard distractors for a word, or [] if unavailable"""
+        try:
+            table = self.table(user_id)
+            if table is None:
+                return []
+            return table.pick(word_id, count)
+        except Exception as e:
+            logger.error(f"Error picking distractors for user {user_id}: {e}")
+            return []
+
+    def word_added(self, user_id: int, word_id: int, english: str, translation: str):
+        """Keep a loaded table current after a word was saved"""
+        table = self._tables.get(user_id) if self.enabled else None
+        if table is not None:
+            table.add(word_id, english, translation)
+
+    def word_deleted(self, user_id: int, word_id: int):
+        """Keep a loaded table current after a word was deleted"""
+        table = self._tables.get(user_id) if self.enabled else None
+        if table is not None:
+            table.remove(word_id)
@@ -1,40 +1,85 @@
 import sys
 import os
+import re
+import secrets
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, exists, func, select
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import db
-from models import User, Word, QuizSession
+from models import BlockedUser, User, Word
 from bot.buttons import BotButtons
 from bot.quiz import QuizManager
+from utils.cache import TTLCache
+from database.upsert import insert_ignore
+from database.pagination import word_page
 
 logger = logging.getLogger(__name__)
 
+# Word lists pasted as one message are split on commas, semicolons and newlines
+WORD_LIST_SEPARATORS = re.compile(r'[,;\n]+')
+MAX_BATCH_WORDS = 30
+WORDS_PAGE_SIZE = 50
+DELETE_PAGE_SIZE = 10
+
+
+class UserIdentity(NamedTuple):
+    """The parts of a User row the handlers need, safe to cache across sessions"""
+    id: int
+    telegram_id: str
+    username: Optional[str]
+
+
 class BotHandlers:
     def __init__(self, bot, translator):
         self.bot = bot
         self.translator = translator
         self.buttons = BotButtons()
         self.quiz_manager = QuizManager(bot)
-
+        # telegram_id -> UserIdentity, so handlers do not look the user up on every update
+        self.user_cache = TTLCache(maxsize=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+                                   ttl=float(os.environ.get('USER_CACHE_TTL', '600')))
+        # Translated word lists waiting for "add all" / "add selected", keyed by a short token
+        self.pending_batches = TTLCache(maxsize=10000, ttl=3600)
     
     def get_or_create_user(self, telegram_user):
-        """Get or create a user in the database"""
+        """Get or create a user in the database (cached: no query for recently seen users)"""
+        telegram_id = str(telegram_user.id)
+        identity = self.user_cache.get(telegram_id)
+        if identity is not None:
+            return identity
+        
         from app import app
         with app.app_context():
-            user = User.query.filter_by(telegram_id=str(telegram_user.id)).first()
-            if not user:
-                user = User(
-                    telegram_id=str(telegram_user.id),
-                    username=telegram_user.username or telegram_user.first_name
-                )
-                db.session.add(user)
-                db.session.commit()
-                db.session.refresh(user)
-            return user
+            blocked = exists().where(BlockedUser.user_id == User.id).label('blocked')
+            query = select(User.id, User.username, blocked).where(User.telegram_id == telegram_id)
+            row = db.session.execute(query).one_or_none()
+            if row is None:
+                # Atomic create: a concurrent update for the same user cannot insert twice
+                insert_ignore(db.session, User.__table__, {
+                    'telegram_id': telegram_id,
+                    'username': telegram_user.username or telegram_user.first_name,
+                    'created_at': datetime.utcnow()
+                })
+                row = db.session.execute(query).one()
+            if row.blocked:
+                # A user writing to the bot has unblocked it: include them in broadcasts again
+                db.session.execute(delete(BlockedUser).where(BlockedUser.user_id == row.id))
+            db.session.commit()
+        
+        identity = UserIdentity(row.id, telegram_id, row.username)
+        self.user_cache.set(telegram_id, identity)
+        return identity
+
+    def forget_users(self, telegram_ids):
+        """Drop cached identities, e.g. of users who just blocked the bot: their next update unblocks them"""
+        for telegram_id in telegram_ids:
+            self.user_cache.pop(telegram_id)
     
     def handle_start(self, message):
         """Handle /start command"""
@@ -63,7 +108,8 @@ class BotHandlers:
             "/test - Start vocabulary quiz with options:\n"
             "  • All words - Test all your saved words\n"
             "  • Last 20 - Test your 20 most recent words\n"
-            "  • Random 20 - Test 20 random words from your dictionary\n\n"
+            "  • Random 20 - Test 20 random words from your dictionary\n"
+            "  • Due for review - Words your answers say you are about to forget\n\n"
             "/delete - View and delete saved words\n"
             "/stop - Stop current quiz\n"
             "/help - Show this help message\n\n"
@@ -82,22 +128,68 @@ class BotHandlers:
                 # If user is in an active quiz, let quiz manager handle it
                 return
             
+            items = [w.strip().lower() for w in WORD_LIST_SEPARATORS.split(message.text) if w.strip()]
+            if len(items) > 1:
+                self._handle_word_list(message, items)
+                return
+            
             word = message.text.strip().lower()
             logger.info(f"User {message.from_user.id} requested translation for: '{word}'")
             
-            # Get translation
-            translation = self.translator.translate(word)
+            translation = self.translator.translate(word, allow_remote=False)
+            if not translation:
+                # A word the local sources miss is offered close dictionary words first;
+                # the remote backend is asked only via "translate anyway" or without suggestions
+                suggestions = self.translator.suggest(word)
+                if suggestions:
+                    markup = self.buttons.suggestions_keyboard(word, suggestions)
+                    self.bot.send_message(message.chat.id,
+                                        f"🤔 I couldn't find '{word}'. Did you mean:",
+                                        reply_markup=markup)
+                    return
+                translation = self.translator.translate(word)
             
             if translation:
                 # Send translation with "Add to Dictionary" button
                 markup = self.buttons.add_to_dictionary_button(word, translation)
-                response = f"🔤 **{word.title()}**\n📖 {translation}"
+                response = self._format_translation(word, translation)
                 self.bot.send_message(message.chat.id, response, 
                                     reply_markup=markup, parse_mode='Markdown')
             else:
                 self.bot.send_message(message.chat.id, 
                                     "❌ Sorry, I couldn't find a translation for that word.")
     
+    def _handle_word_list(self, message, items):
+        """Translate a pasted list of words as one batch and reply with a single message"""
+        if len(items) > MAX_BATCH_WORDS:
+            self.bot.send_message(message.chat.id,
+                                f"✂️ Only the first {MAX_BATCH_WORDS} words of your list will be translated.")
+            items = items[:MAX_BATCH_WORDS]
+        logger.info(f"User {message.from_user.id} requested translation for {len(items)} words")
+        
+        results = self.translator.translate_many(items)
+        found = [(word, translation) for word, translation in results if translation]
+        missing = [word for word, translation in results if not translation]
+        
+        if not found:
+            self.bot.send_message(message.chat.id,
+                                "❌ Sorry, I couldn't find a translation for any of these words.")
+            return
+        
+        lines = [f"{i}. {word} — {translation}" for i, (word, translation) in enumerate(found, 1)]
+        response = f"📚 Translations ({len(found)} of {len(results)}):\n\n" + "\n".join(lines)
+        if missing:
+            response += "\n\n❌ Not found: " + ", ".join(missing)
+        
+        token = secrets.token_hex(4)
+        self.pending_batches.set(token, {'items': found, 'selected': set()})
+        markup = self.buttons.batch_actions_keyboard(token, len(found))
+        self.bot.send_message(message.chat.id, response, reply_markup=markup)
+    
+    def _format_translation(self, word, translation):
+        """Format a translation reply"""
+        return f"🔤 **{word.title()}**\n📖 {translation}"
+    
     def handle_test(self, message):
         """Handle /test command"""
         from app import app
@@ -125,37 +217,35 @@ class BotHandlers:
         with app.app_context():
             user = self.get_or_create_user(message.from_user)
             
-            # Get user's words
-            words = Word.query.filter_by(user_id=user.id).order_by(Word.date_added.desc()).limit(20).all()
+            # Get user's newest words
+            page = word_page(user.id, DELETE_PAGE_SIZE)
             
-            if not words:
+            if not page.words:
                 self.bot.send_message(message.chat.id, 
                                     "📚 You don't have any saved words to delete.")
                 return
             
             # Show words with delete buttons
-            markup = self.buttons.delete_words_keyboard(words)
-            word_list = "\n".join([f"• {word.english_word} - {word.translation}" for word in words[:10]])
-            
-            self.bot.send_message(message.chat.id, 
-                                f"🗑️ **Your saved words** (showing up to 10):\n\n{word_list}\n\n"
-                                "Click a button below to delete a word:",
-                                reply_markup=markup, parse_mode='Markdown')
+            text, markup = self._delete_page(page, 1)
+            self.bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode='Markdown')
+    
+    def _delete_page(self, page, number):
+        """Text and keyboard of one /delete page"""
+        markup = self.buttons.delete_words_keyboard(page.words, number, page.older, page.newer)
+        word_list = "\n".join([f"• {word.english_word} - {word.translation}" for word in page.words])
+        text = (f"🗑️ **Your saved words** (page {number}):\n\n{word_list}\n\n"
+                "Click a button below to delete a word:")
+        return text, markup
     
     def handle_stop(self, message):
         """Handle /stop command"""
         from app import app
         with app.app_context():
-            if message.chat.id in self.quiz_manager.active_quizzes:
-                quiz_data = self.quiz_manager.active_quizzes[message.chat.id]
-                quiz_session = quiz_data['session']
-                quiz_session.completed = True
-                db.session.commit()
-                del self.quiz_manager.active_quizzes[message.chat.id]
-                
+            state = self.quiz_manager.stop_quiz(message.chat.id)
+            if state:
                 self.bot.send_message(message.chat.id, 
                                     f"⏹️ Quiz stopped!\n"
-                                    f"📊 Current Progress: {quiz_data['current_question']}/{quiz_session.total_questions}")
+                                    f"📊 Current Progress: {state.current_question}/{state.total_questions}")
             else:
                 self.bot.send_message(message.chat.id, "❌ No active quiz to stop.")
     
@@ -179,6 +269,12 @@ class BotHandlers:
                     self._handle_quiz_answer(call, user, data)
                 elif data.startswith('delete:'):
                     self._handle_delete_word(call, user, data)
+                elif data.startswith('suggest:') or data.startswith('translate:'):
+                    self._handle_suggestion(call, data)
+                elif data.startswith('words:') or data.startswith('delpage:'):
+                    self._handle_page(call, user, data)
+                elif data.startswith('batch_'):
+                    self._handle_batch_action(call, user, data)
                 
                 # Answer the callback to remove loading state
                 self.bot.answer_callback_query(call.id)
@@ -204,27 +300,23 @@ class BotHandlers:
             
             _, english_word, translation = parts
             
-            # Check if word already exists
-            existing_word = Word.query.filter_by(
-                user_id=user.id, 
-                english_word=english_word.lower()
-            ).first()
+            # One statement: inserts unless the user already has this word (double taps included)
+            word_id = insert_ignore(db.session, Word.__table__, {
+                'user_id': user.id,
+                'english_word': english_word.lower(),
+                'translation': translation,
+                'date_added': datetime.utcnow()
+            })
+            db.session.commit()
             
-            if existing_word:
+            if word_id is None:
                 self.bot.edit_message_text(
                     f"📚 '{english_word}' is already in your dictionary!",
                     call.message.chat.id,
                     call.message.message_id
                 )
             else:
-                # Add new word
-                new_word = Word(
-                    user_id=user.id,
-                    english_word=english_word.lower(),
-                    translation=translation
-                )
-                db.session.add(new_word)
-                db.session.commit()
+                self.quiz_manager.distractors.word_added(user.id, word_id, english_word.lower(), translation)
                 
                 self.bot.edit_message_text(
                     f"✅ Added '{english_word}' to your dictionary!\n📖 {translation}",
@@ -234,9 +326,96 @@ class BotHandlers:
         except Exception as e:
             logger.error(f"Error adding word: {e}")
     
+    def _handle_batch_action(self, call, user, data):
+        """Handle "add all" / "add selected" for a translated word list"""
+        parts = data.split(':')
+        action, token = parts[0], parts[1]
+        batch = self.pending_batches.get(token)
+        if batch is None:
+            self.bot.edit_message_text(
+                "⌛ This list has expired. Please send the words again.",
+                call.message.chat.id,
+                call.message.message_id
+            )
+            return
+        
+        words = [word for word, _ in batch['items']]
+        if action == 'batch_pick' or action == 'batch_toggle':
+            if action == 'batch_toggle':
+                index = int(parts[2])
+                batch['selected'] ^= {index}
+            markup = self.buttons.batch_select_keyboard(token, words, batch['selected'])
+            self.bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
+            return
+        
+        if action == 'batch_all':
+            items = batch['items']
+        else:
+            items = [item for i, item in enumerate(batch['items']) if i in batch['selected']]
+        if not items:
+            # Nothing ticked yet; keep the selection keyboard as it is
+            return
+        
+        added, existing = self._add_words(user, items)
+        self.pending_batches.pop(token)
+        text = f"✅ Added {len(added)} words to your dictionary!"
+        if added:
+            text += "\n" + ", ".join(added)
+        if existing:
+            text += f"\n\n📚 Already saved: {', '.join(existing)}"
+        self.bot.edit_message_text(text, call.message.chat.id, call.message.message_id)
+    
+    def _add_words(self, user, items):
+        """Save (word, translation) pairs; returns (added words, already saved words)"""
+        added, existing = [], []
+        now = datetime.utcnow()
+        for word, translation in items:
+            word = word.lower()
+            word_id = insert_ignore(db.session, Word.__table__, {
+                'user_id': user.id,
+                'english_word': word,
+                'translation': translation,
+                'date_added': now
+            })
+            if word_id is None:
+                existing.append(word)
+            else:
+                added.append((word_id, word, translation))
+        db.session.commit()
+        for word_id, word, translation in added:
+            self.quiz_manager.distractors.word_added(user.id, word_id, word, translation)
+        added_words = [word for _, word, _ in added]
+        # A word listed twice in one batch is added once, not reported as already saved
+        return added_words, sorted(set(existing) - set(added_words))
+    
+    def _handle_suggestion(self, call, data):
+        """Handle a "did you mean" choice or a request to translate the word as typed"""
+        action, word = data.split(':', 1)
+        logger.info(f"User {call.from_user.id} chose {action} for: '{word}'")
+        if action == 'translate':
+            # Explicitly asked for: try the remote backend even if it missed the word recently
+            self.translator.forget_miss(word)
+        translation = self.translator.translate(word)
+        
+        if translation:
+            markup = self.buttons.add_to_dictionary_button(word, translation)
+            self.bot.edit_message_text(
+                self._format_translation(word, translation),
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=markup,
+                parse_mode='Markdown'
+            )
+        else:
+            self.bot.edit_message_text(
+                "❌ Sorry, I couldn't find a translation for that word.",
+                call.message.chat.id,
+                call.message.message_id
+            )
+    
     def _handle_quiz_start(self, call, user, data):
         """Handle quiz start"""
-        quiz_type = data.split(':')[1]  # quiz:all, quiz:recent, quiz:random
+        quiz_type = data.split(':')[1]  # quiz:all, quiz:recent, quiz:random, quiz:due
         
         # Start quiz session
         quiz_session_id = self.quiz_manager.start_quiz(call.message.chat.id, user.id, quiz_type)
@@ -247,6 +426,12 @@ class BotHandlers:
                 call.message.chat.id,
                 call.message.message_id
             )
+        elif quiz_type == 'due':
+            self.bot.edit_message_text(
+                "🎉 Fewer than 4 words are due for review right now! Come back later or try another quiz type.",
+                call.message.chat.id,
+                call.message.message_id
+            )
         else:
             self.bot.edit_message_text(
                 "❌ Not enough words for this quiz type. You need at least 4 words.",
@@ -269,6 +454,7 @@ class BotHandlers:
                 word_text = f"{word.english_word} - {word.translation}"
                 db.session.delete(word)
                 db.session.commit()
+                self.quiz_manager.distractors.word_deleted(user.id, word_id)
                 
                 self.bot.edit_message_text(
                     f"🗑️ Deleted: {word_text}",
@@ -285,26 +471,52 @@ class BotHandlers:
             logger.error(f"Error deleting word: {e}")
 
     def handle_words(self, message):
-    # """Handle /words command — show all user's saved words"""
+    # """Handle /words command — show user's saved words page by page"""
         from app import app
         with app.app_context():
             user = self.get_or_create_user(message.from_user)
 
-            # Получаем все слова пользователя
-            words = Word.query.filter_by(user_id=user.id).order_by(Word.date_added.desc()).all()
+            # Первая страница: самые новые слова
+            page = word_page(user.id, WORDS_PAGE_SIZE)
 
-            if not words:
+            if not page.words:
                 self.bot.send_message(message.chat.id, 
                                     "📚 Ваш словарь пуст. Добавьте слова, отправив их в чат.")
                 return
 
-            # Ограничим вывод до 50 слов (можно изменить)
-            max_display = 50
-            display_words = words[:max_display]
-            word_list = "\n".join([f"• {w.english_word} — {w.translation}" for w in display_words])
+            text, markup = self._words_page(page, 1, self._word_count(user.id))
+            self.bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode="Markdown")
 
-            response = f"📖 **Ваш словарь** (всего: {len(words)} слов):\n\n{word_list}"
-            if len(words) > max_display:
-                response += f"\n\n...и ещё {len(words) - max_display} слов."
+    def _words_page(self, page, number, total=None):
+        """Text and keyboard of one /words page (the first one also shows the total)"""
+        word_list = "\n".join([f"• {w.english_word} — {w.translation}" for w in page.words])
+        heading = f"всего: {total} слов, стр. {number}" if total is not None else f"стр. {number}"
+        text = f"📖 **Ваш словарь** ({heading}):\n\n{word_list}"
+        return text, self.buttons.words_page_keyboard(number, page.older, page.newer)
 
-            self.bot.send_message(message.chat.id, response, parse_mode="Markdown")
+    def _word_count(self, user_id):
+        """How many words a user has saved (one COUNT on the (user_id, id) index)"""
+        return db.session.execute(select(func.count()).where(Word.user_id == user_id)).scalar()
+
+    def _handle_page(self, call, user, data):
+        """Handle ⬅️/➡️ on /words and /delete (data: prefix:direction:page:cursor)"""
+        prefix, direction, number, cursor = data.split(':', 3)
+        number = int(number)
+        size = WORDS_PAGE_SIZE if prefix == 'words' else DELETE_PAGE_SIZE
+        if direction == 'o':
+            page = word_page(user.id, size, older_than=cursor)
+        else:
+            page = word_page(user.id, size, newer_than=cursor)
+        if not page.words:
+            # Everything on that side was deleted meanwhile; start over from the newest words
+            page, number = word_page(user.id, size), 1
+        if not page.words:
+            self.bot.edit_message_text("📚 You don't have any saved words.",
+                                       call.message.chat.id, call.message.message_id)
+            return
+        if prefix == 'words':
+            text, markup = self._words_page(page, number, self._word_count(user.id) if number == 1 else None)
+        else:
+            text, markup = self._delete_page(page, number)
+        self.bot.edit_message_text(text, call.message.chat.id, call.message.message_id,
+                                   reply_markup=markup, parse_mode='Markdown')
@@ -11,63 +11,87 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import app, db
 from models import User, Word, QuizSession
 from bot.handlers import BotHandlers
+from bot.dispatcher import UpdateDispatcher
+from bot.outbound import OutboundBot, OutboundQueue
+from bot.broadcast import BroadcastEngine
 from utils.translator import Translator
 
 # Logger is already configured in app.py
 logger = logging.getLogger(__name__)
 
 class VocabularyBot:
-    def __init__(self):
+    def __init__(self, threaded=True):
         self.token = os.environ.get('TELEGRAM_BOT_TOKEN')
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
         
         # Enable middleware before initializing TeleBot
         telebot.apihelper.ENABLE_MIDDLEWARE = True
+        # Point the bot at another Bot API server (local server, benchmarks/fake_telegram.py)
+        if os.environ.get('TELEGRAM_API_URL'):
+            telebot.apihelper.API_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/bot{0}/{1}'
         
-        self.bot = telebot.TeleBot(self.token)
+        # Updates are handed to per-chat ordered shards; DISPATCH_WORKERS=0 keeps telebot's own dispatch
+        self.dispatcher = UpdateDispatcher() if int(os.environ.get('DISPATCH_WORKERS', '8')) > 0 else None
+        # With the dispatcher, telebot only routes updates (in order) and must not reorder them on its threads
+        self.bot = telebot.TeleBot(self.token, threaded=threaded and self.dispatcher is None)
         self.translator = Translator()
-        self.handlers = BotHandlers(self.bot, self.translator)
+        # Handlers send through the rate-limited queue; OUTBOUND_QUEUE=0 calls Telegram directly
+        self.outbound = OutboundQueue(self.bot) if os.environ.get('OUTBOUND_QUEUE', '1') != '0' else None
+        self.handlers = BotHandlers(OutboundBot(self.bot, self.outbound) if self.outbound else self.bot,
+                                    self.translator)
+        # Broadcasts always go through a rate-limited queue
+        self.broadcasts = BroadcastEngine(self.outbound or OutboundQueue(self.bot),
+                                          self.translator, on_blocked=self.handlers.forget_users)
         self.setup_handlers()
     
+    def dispatch(self, chat_id, handler, update):
+        """Run a handler on the chat's dispatch shard (or right here without a dispatcher)"""
+        if self.dispatcher is None:
+            handler(update)
+        else:
+            self.dispatcher.submit(chat_id, handler, update)
+    
     def setup_handlers(self):
         """Setup all bot command and message handlers"""
         
         @self.bot.message_handler(commands=['start'])
         def start_command(message):
-            self.handlers.handle_start(message)
+            self.dispatch(message.chat.id, self.handlers.handle_start, message)
         
         @self.bot.message_handler(commands=['words'])
         def words_command(message):
-            self.handlers.handle_words(message)
+            self.dispatch(message.chat.id, self.handlers.handle_words, message)
 
         @self.bot.message_handler(commands=['test'])
         def test_command(message):
-            self.handlers.handle_test(message)
+            self.dispatch(message.chat.id, self.handlers.handle_test, message)
         
         @self.bot.message_handler(commands=['delete'])
         def delete_command(message):
-            self.handlers.handle_delete(message)
+            self.dispatch(message.chat.id, self.handlers.handle_delete, message)
         
         @self.bot.message_handler(commands=['stop'])
         def stop_command(message):
-            self.handlers.handle_stop(message)
+            self.dispatch(message.chat.id, self.handlers.handle_stop, message)
         
         @self.bot.message_handler(commands=['help'])
         def help_command(message):
-            self.handlers.handle_help(message)
+            self.dispatch(message.chat.id, self.handlers.handle_help, message)
         
         @self.bot.message_handler(func=lambda message: True)
         def handle_text(message):
-            self.handlers.handle_text_message(message)
+            self.dispatch(message.chat.id, self.handlers.handle_text_message, message)
         
         @self.bot.callback_query_handler(func=lambda call: True)
         def handle_callback(call):
-            self.handlers.handle_callback_query(call)
+            chat_id = call.message.chat.id if call.message else call.from_user.id
+            self.dispatch(chat_id, self.handlers.handle_callback_query, call)
         
         @self.bot.poll_answer_handler(func=lambda poll_answer: True)
         def handle_poll_answer(poll_answer): 
-            self.handlers.handle_poll_answer(poll_answer)
+            # Quizzes run in private chats, where the chat id is the user id
+            self.dispatch(poll_answer.user.id, self.handlers.handle_poll_answer, poll_answer)
 
         @self.bot.middleware_handler(update_types=['message'])
         def log_incoming_messages(bot_instance, message):
@@ -85,14 +109,39 @@ class VocabularyBot:
             logger.info("Removing existing webhooks...")
             self.bot.remove_webhook()
             
+            # Pick up quizzes that were running before the restart
+            self.handlers.quiz_manager.recover()
+            # Daily broadcasts, and broadcasts interrupted by the restart
+            self.broadcasts.watch(self.handlers.quiz_manager.scheduler)
+            
             logger.info("Starting infinity polling...")
             self.bot.infinity_polling(timeout=20, long_polling_timeout=10)
         except Exception as e:
             logger.error(f"Bot error: {e}")
             raise
 
+    def start_webhook(self):
+        """Register the webhook with Telegram (BOT_MODE=webhook); updates then arrive via bot/webhook.py"""
+        webhook_url = os.environ.get('WEBHOOK_URL')
+        if webhook_url:
+            logger.info(f"Setting webhook to {webhook_url}...")
+            self.bot.set_webhook(url=webhook_url,
+                                 secret_token=os.environ.get('WEBHOOK_SECRET') or None,
+                                 max_connections=int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40')))
+        else:
+            logger.warning("WEBHOOK_URL is not set, expecting the webhook to be registered already")
+        
+        # Pick up quizzes that were running before the restart
+        self.handlers.quiz_manager.recover()
+        # Daily broadcasts, and broadcasts interrupted by the restart (one worker sends each run)
+        self.broadcasts.watch(self.handlers.quiz_manager.scheduler)
+
 def run_bot():
     """Function to run the bot in a separate thread"""
+    if os.environ.get('BOT_RUNTIME', 'threads') == 'asyncio':
+        from bot.async_runtime import AsyncVocabularyBot
+        AsyncVocabularyBot().run()
+        return
     bot = VocabularyBot()
     bot.run()
 
@@ -0,0 +1,330 @@
+"""
+Outbound Telegram queue with rate limits
+
+Bot API calls that post to a chat (messages, polls, edits) go through one
+OutboundQueue instead of straight to Telegram. A sender thread releases
+them under a global token bucket (OUTBOUND_GLOBAL_RATE calls per second)
+and a bucket per chat (OUTBOUND_CHAT_RATE per second with bursts of
+OUTBOUND_CHAT_BURST; group chats get OUTBOUND_GROUP_RATE), and a pool of
+OUTBOUND_WORKERS threads makes the HTTP calls. A 429 puts the call back at
+the head of its chat's lane until retry_after has passed.
+
+Interactive replies go before background sends such as broadcasts. Calls
+for one chat at one priority keep their order. Handlers get a future back
+and do not wait for the send (except for RESULT_METHODS); a call whose
+future was cancelled before it reached Telegram is dropped.
+
+The buckets live in one process. Every process sending for the same bot
+(the polling bot and a broadcast script, or webhook hosts) has its own
+OUTBOUND_GLOBAL_RATE, so the rates of all of them must add up to
+Telegram's 30 messages per second.
+"""
+import os
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from telebot.apihelper import ApiTelegramException
+
+from utils.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Calls that count against Telegram's per-chat and global limits
+RATE_LIMITED_METHODS = frozenset({
+    'send_message', 'send_poll', 'edit_message_text', 'edit_message_reply_markup', 'stop_poll', 'delete_message',
+})
+
+# Calls whose result the handlers use (the quiz needs the poll id); other sends are fire-and-forget
+RESULT_METHODS = frozenset({'send_poll'})
+
+# Position of chat_id among the positional arguments, where it is not the first
+CHAT_ID_POSITION = {'edit_message_text': 1}
+
+BUCKET_PRUNE_AT = 10000  # idle per-chat buckets are dropped beyond this many
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+class OutboundCall:
+    __slots__ = ('method', 'chat_id', 'args', 'kwargs', 'priority', 'future', 'enqueued', 'attempts')
+
+    def __init__(self, method: str, chat_id: int, args: tuple, kwargs: dict, priority: int, enqueued: float):
+        self.method = method
+        self.chat_id = chat_id
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.enqueued = enqueued
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """Rate-limited, prioritized sender for one bot"""
+
+    def __init__(self, bot, workers: Optional[int] = None, global_rate: Optional[float] = None,
+                 chat_rate: Optional[float] = None, chat_burst: Optional[float] = None,
+                 group_rate: Optional[float] = None, max_retries: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bot = bot
+        self.workers = workers or int(os.environ.get('OUTBOUND_WORKERS', '8'))
+        self.chat_rate = chat_rate or float(os.environ.get('OUTBOUND_CHAT_RATE', '1'))
+        self.chat_burst = chat_burst or float(os.environ.get('OUTBOUND_CHAT_BURST', '3'))
+        self.group_rate = group_rate or float(os.environ.get('OUTBOUND_GROUP_RATE', str(20 / 60)))
+        self.max_retries = int(os.environ.get('OUTBOUND_MAX_RETRIES', '5')) if max_retries is None else max_retries
+        self._clock = clock
+        global_rate = global_rate or float(os.environ.get('OUTBOUND_GLOBAL_RATE', '30'))
+        # No burst: a full bucket would let 2x the rate through in the first second
+        self._global = TokenBucket(global_rate, 1, clock())
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._lanes: Dict[Tuple[int, int], Deque[OutboundCall]] = {}  # (priority, chat id) -> calls in order
+        self._busy = set()       # lanes with a call in flight
+        self._scheduled = set()  # lanes in _ready or _delayed
+        self._ready = []         # (priority, seq, lane)
+        self._delayed = []       # (not before, seq, lane)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._stopped = False
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0  # 429 answers from Telegram
+        self.cancelled = 0     # calls dropped because their caller gave up
+        self.latency = {INTERACTIVE: LatencyHistogram(), BACKGROUND: LatencyHistogram()}
+        self.call_latency = LatencyHistogram()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbound')
+        self._thread = threading.Thread(target=self._run, name='Outbound', daemon=True)
+        self._thread.start()
+
+    def submit(self, method: str, chat_id: int, args: tuple = (), kwargs: Optional[dict] = None,
+               priority: int = INTERACTIVE) -> Future:
+        """Queue bot.<method>(*args, **kwargs) for a chat; the future gets its result"""
+        call = OutboundCall(method, chat_id, args, kwargs or {}, priority, self._clock())
+        lane = (priority, chat_id)
+        with self._condition:
+            self._lanes.setdefault(lane, deque()).append(call)
+            self._schedule_lane(lane)
+        return call.future
+
+    def _schedule_lane(self, lane: Hashable, not_before: Optional[float] = None):
+        """Make a lane eligible to send (now or later); caller holds the condition"""
+        if lane in self._busy or lane in self._scheduled:
+            return
+        self._scheduled.add(lane)
+        if not_before is None:
+            heapq.heappush(self._ready, (lane[0], next(self._counter), lane))
+        else:
+            heapq.heappush(self._delayed, (not_before, next(self._counter), lane))
+        self._condition.notify()
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= BUCKET_PRUNE_AT:
+                for idle in [c for c, b in self._chat_buckets.items() if b.delay(now) == 0 and b.tokens >= b.burst]:
+                    del self._chat_buckets[idle]
+            # Groups are limited to about 20 messages a minute
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst if chat_id > 0 else 1, now)
+        return bucket
+
+    def _run(self):
+        with self._condition:
+            while not self._stopped:
+                now = self._clock()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, lane = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (lane[0], next(self._counter), lane))
+                if not self._ready or self._in_flight >= self.workers:
+                    timeout = self._delayed[0][0] - now if self._delayed else None
+                    self._condition.wait(timeout)
+                    continue
+                wait = self._global.delay(now)
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                _, _, lane = heapq.heappop(self._ready)
+                if not self._drop_cancelled(lane):
+                    continue
+                wait = self._chat_bucket(lane[1], now).delay(now)
+                if wait > 0:
+                    heapq.heappush(self._delayed, (now + wait, next(self._counter), lane))
+                    continue
+                self._scheduled.discard(lane)
+                call = self._lanes[lane].popleft()
+                self._chat_buckets[lane[1]].take()
+                self._global.take()
+                self._busy.add(lane)
+                self._in_flight += 1
+                self._executor.submit(self._send, lane, call)
+
+    def _drop_cancelled(self, lane: Tuple[int, int]) -> bool:
+        """Drop cancelled calls at the head of a popped lane; False if none are left"""
+        calls = self._lanes[lane]
+        while calls and calls[0].future.cancelled():
+            calls.popleft()
+            self.cancelled += 1
+        if calls:
+            return True
+        self._scheduled.discard(lane)
+        del self._lanes[lane]
+        return False
+
+    def _send(self, lane: Tuple[int, int], call: OutboundCall):
+        call.attempts += 1
+        started = self._clock()
+        try:
+            result = getattr(self.bot, call.method)(*call.args, **call.kwargs)
+            error = None
+        except ApiTelegramException as e:
+            if e.error_code == 429 and call.attempts <= self.max_retries and not call.future.cancelled():
+                self._retry_later(lane, call, e)
+                return
+            error = e
+        except Exception as e:
+            error = e
+        finished = self._clock()
+        self.call_latency.observe(finished - started)
+        self.latency[call.priority].observe(finished - call.enqueued)
+
+        with self._condition:
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._release(lane)
+        if error is not None:
+            # 403 (blocked by the user) is routine for broadcasts
+            log = logger.warning if getattr(error, 'error_code', None) == 403 else logger.error
+            log(f"Error sending {call.method} to chat {call.chat_id}: {error}")
+        try:
+            if error is None:
+                call.future.set_result(result)
+            else:
+                call.future.set_exception(error)
+        except InvalidStateError:
+            pass  # the caller cancelled it while it was being sent
+
+    def _retry_later(self, lane: Tuple[int, int], call: OutboundCall, error: ApiTelegramException):
+        retry_after = ((error.result_json or {}).get('parameters') or {}).get('retry_after') or 1
+        logger.warning(f"Telegram rate limit for chat {call.chat_id}, retrying {call.method} in {retry_after}s")
+        with self._condition:
+            self.rate_limited += 1
+            self._lanes[lane].appendleft(call)
+            self._chat_bucket(lane[1], self._clock()).drain()
+            self._busy.discard(lane)
+            self._in_flight -= 1
+            self._schedule_lane(lane, self._clock() + retry_after)
+
+    def _release(self, lane: Tuple[int, int]):
+        """A lane's call finished; queue its next call; caller holds the condition"""
+        self._busy.discard(lane)
+        self._in_flight -= 1
+        if self._lanes[lane]:
+            self._schedule_lane(lane)
+        else:
+            del self._lanes[lane]
+        self._condition.notify()
+
+    def depth(self, priority: Optional[int] = None) -> int:
+        """Calls waiting to be sent (at one priority, or in total)"""
+        with self._condition:
+            return sum(len(calls) for (p, _), calls in self._lanes.items() if priority is None or p == priority)
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        """Throughput, rate limiting, queue depth and send latency"""
+        with self._condition:
+            return {
+                'queued': sum(len(calls) for calls in self._lanes.values()),
+                'queued_interactive': sum(len(c) for (p, _), c in self._lanes.items() if p == INTERACTIVE),
+                'queued_background': sum(len(c) for (p, _), c in self._lanes.items() if p == BACKGROUND),
+                'in_flight': self._in_flight,
+                'sent': self.sent,
+                'failed': self.failed,
+                'rate_limited': self.rate_limited,
+                'cancelled': self.cancelled,
+                'latency_interactive': self.latency[INTERACTIVE].snapshot(),
+                'latency_background': self.latency[BACKGROUND].snapshot(),
+                'call_latency': self.call_latency.snapshot(),
+            }
+
+
+class OutboundBot:
+    """Bot stand-in that sends chat calls through an OutboundQueue
+
+    A send returns its future without waiting. RESULT_METHODS wait up to
+    OUTBOUND_SEND_TIMEOUT for the result; on timeout the call is cancelled,
+    so it is not sent later to a caller that has moved on.
+    """
+
+    def __init__(self, bot, queue: OutboundQueue, priority: int = INTERACTIVE, timeout: Optional[float] = None):
+        self._bot = bot
+        self._queue = queue
+        self._priority = priority
+        self._timeout = timeout or float(os.environ.get('OUTBOUND_SEND_TIMEOUT', '60'))
+
+    def __getattr__(self, name):
+        attr = getattr(self._bot, name)
+        if name not in RATE_LIMITED_METHODS:
+            return attr
+
+        def call(*args, **kwargs):
+            chat_id = chat_id_of(name, args, kwargs)
+            if chat_id is None:
+                # Inline-message edits have no chat to rate-limit
+                return attr(*args, **kwargs)
+            future = self._queue.submit(name, chat_id, args, kwargs, priority=self._priority)
+            if name not in RESULT_METHODS:
+                return future
+            try:
+                return future.result(self._timeout)
+            except TimeoutError:
+                future.cancel()
+                raise
+        return call
+
+
+def chat_id_of(method: str, args: tuple, kwargs: dict) -> Optional[int]:
+    """Chat a Bot API call goes to; None for inline-message edits"""
+    if kwargs.get('chat_id') is not None:
+        return int(kwargs['chat_id'])
+    position = CHAT_ID_POSITION.get(method, 0)
+    return int(args[position]) if len(args) > position else None
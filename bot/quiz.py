@@ -2,6 +2,7 @@ import sys
 import os
 import random
 import logging
+import threading
 from datetime import datetime
 
 # Add parent directory to path
@@ -10,15 +11,31 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import db
 from models import User, Word, QuizSession
 from bot.buttons import BotButtons
+from bot.scheduler import Scheduler
+from bot.quiz_state import QuizState, create_quiz_store
+from bot.distractors import DistractorEngine
+from bot.answer_log import AnswerBuffer
+from database.sampling import sample_words
+from bot.spaced_repetition import (QUALITY_CORRECT, QUALITY_WRONG, QUALITY_UNANSWERED,
+                                   apply_reviews, due_word_ids)
 
 logger = logging.getLogger(__name__)
 
+QUESTION_OPEN_PERIOD = 10  # Seconds a quiz poll stays open
+NEXT_QUESTION_DELAY = 12   # Wait for the poll to close + 2 seconds
+
 class QuizManager:
-    def __init__(self, bot):
+    def __init__(self, bot, scheduler=None):
         self.bot = bot
         self.buttons = BotButtons()
-        self.active_quizzes = {}  # Store current quiz sessions for each chat
-        self.active_polls = {}   # Store poll_id -> quiz_session mapping
+        # One timer thread drives every quiz instead of a sleeping thread per question
+        self.scheduler = scheduler or Scheduler(workers=int(os.environ.get('QUIZ_SCHEDULER_WORKERS', '4')))
+        self.active_quizzes = {}  # chat_id -> QuizState
+        self.active_polls = {}   # poll_id -> chat_id
+        self._poll_lock = threading.Lock()
+        self.store = create_quiz_store()
+        self.distractors = DistractorEngine()
+        self.answers = AnswerBuffer(self.scheduler)
     
     def start_quiz(self, chat_id, user_id, quiz_type):
         """Start a new quiz session"""
@@ -40,17 +57,21 @@ class QuizManager:
                 db.session.add(quiz_session)
                 db.session.commit()
                 
-                # Store quiz session
-                self.active_quizzes[chat_id] = {
-                    'session': quiz_session,
-                    'words': words,
-                    'current_question': 0,
-                    'used_words': []  # Track used words to avoid repetition
-                }
+                # A new quiz replaces any unfinished one in this chat
+                self.cancel_timers(chat_id)
+                previous = self.active_quizzes.get(chat_id)
+                if previous and previous.poll_id:
+                    self.active_polls.pop(previous.poll_id, None)
+                
+                # Keep only ids and texts, not the ORM objects
+                state = QuizState.from_words(chat_id, user_id, quiz_session.id, quiz_type,
+                                             quiz_session.total_questions, words)
+                self.active_quizzes[chat_id] = state
+                self._checkpoint(state, start=True)
                 
                 # Start first question
                 logger.info(f"Quiz started for user {user_id} (type: {quiz_type}, questions: {quiz_session.total_questions})")
-                self._send_poll_question(chat_id, quiz_session, words)
+                self._send_poll_question(chat_id)
                 
                 return quiz_session.id
                 
@@ -59,65 +80,61 @@ class QuizManager:
                 return None
     
     def _get_quiz_words(self, user_id, quiz_type):
-        """Get words for quiz based on type"""
+        """Get (id, english_word, translation) rows for quiz based on type"""
+        # Only the columns a quiz needs, no ORM objects
+        words = Word.query.with_entities(Word.id, Word.english_word, Word.translation)\
+                          .filter_by(user_id=user_id)
         if quiz_type == 'all':
-            return Word.query.filter_by(user_id=user_id).all()
+            return words.all()
         elif quiz_type == 'recent':
-            return Word.query.filter_by(user_id=user_id)\
-                          .order_by(Word.date_added.desc())\
-                          .limit(20).all()
+            return words.order_by(Word.date_added.desc())\
+                        .limit(20).all()
         elif quiz_type == 'random':
-            all_words = Word.query.filter_by(user_id=user_id).all()
-            return random.sample(all_words, min(len(all_words), 20))
+            return sample_words(user_id, 20)
+        elif quiz_type == 'due':
+            word_ids = due_word_ids(user_id, limit=20)
+            return words.filter(Word.id.in_(word_ids)).all() if word_ids else []
         else:
             return []
     
-    def _send_poll_question(self, chat_id, quiz_session, available_words):
+    def _send_poll_question(self, chat_id):
         """Send a quiz question using Telegram Poll"""
         from app import app
         with app.app_context():
             try:
-                quiz_data = self.active_quizzes.get(chat_id)
-                if not quiz_data:
+                state = self.active_quizzes.get(chat_id)
+                if not state:
                     return
                 
-                current_question = quiz_data['current_question'] + 1
+                current_question = state.current_question + 1
                 
-                if current_question > quiz_session.total_questions:
-                    self._finish_quiz(chat_id, quiz_session)
+                if current_question > state.total_questions:
+                    self._finish_quiz(chat_id)
                     return
                 
-                # Select random word for question (avoid used words)
-                used_word_ids = quiz_data.get('used_words', [])
-                unused_words = [w for w in available_words if w.id not in used_word_ids]
-                
-                # If we've used all words, reset the used list
-                if not unused_words:
-                    unused_words = available_words
-                    quiz_data['used_words'] = []
-                    used_word_ids = []
-                
-                correct_word = random.choice(unused_words)
-                quiz_data['used_words'].append(correct_word.id)
-                
-                # Get 3 other random words for wrong answers
-                other_words = [w for w in available_words if w.id != correct_word.id]
-                wrong_answers = random.sample(other_words, min(3, len(other_words)))
-                
-                # Create answer options
-                all_options = [correct_word] + wrong_answers[:3]
-                random.shuffle(all_options)
+                # Deal the next word (no repeats until every word was asked)
+                correct_position = state.next_word()
+                english_word = state.english[correct_position]
+                translation = state.translations[correct_position]
+                
+                # Prefer 3 look-alike wrong answers, topped up with random ones
+                options = [(translation, True)]
+                word_id = state.word_ids[correct_position]
+                wrong = self.distractors.pick(state.user_id, word_id, 3)
+                wrong += [state.translations[position] for position in state.distractors(correct_position, 3)]
+                for text in wrong:
+                    if len(options) == 4:
+                        break
+                    if all(text != option for option, _ in options):
+                        options.append((text, False))
+                random.shuffle(options)
                 
                 # Find correct answer index and create option texts
-                correct_index = None
-                options = []
-                for i, word in enumerate(all_options):
-                    options.append(word.translation)
-                    if word.id == correct_word.id:
-                        correct_index = i
+                correct_index = [is_correct for _, is_correct in options].index(True)
+                options = [text for text, _ in options]
                 
                 # Create poll question
-                question = f"🎯 Question {current_question}/{quiz_session.total_questions}\n🔤 What does '{correct_word.english_word}' mean?"
+                question = f"🎯 Question {current_question}/{state.total_questions}\n🔤 What does '{english_word}' mean?"
                 
                 # Send poll with automatic timer
                 poll_message = self.bot.send_poll(
@@ -127,43 +144,130 @@ class QuizManager:
                     type='quiz',
                     correct_option_id=correct_index,
                     is_anonymous=False,
-                    explanation=f"✅ '{correct_word.english_word}' = '{correct_word.translation}'",
-                    open_period=10  # Auto-close after 10 seconds
+                    explanation=f"✅ '{english_word}' = '{translation}'",
+                    open_period=QUESTION_OPEN_PERIOD  # Auto-close after 10 seconds
                 )
                 
                 # Store poll data
-                poll_id = poll_message.poll.id
-                self.active_polls[poll_id] = {
-                    'chat_id': chat_id,
-                    'quiz_session': quiz_session,
-                    'correct_word': correct_word,
-                    'question_number': current_question,
-                    'correct_index': correct_index  # Store the correct answer index
-                }
+                if state.poll_id:
+                    self.active_polls.pop(state.poll_id, None)
+                state.poll_id = poll_message.poll.id
+                state.correct_index = correct_index
+                state.correct_position = correct_position
+                self.active_polls[state.poll_id] = chat_id
                 
                 # Update current question number
-                quiz_data['current_question'] = current_question
+                state.current_question = current_question
+                self._checkpoint(state)
                 
                 # Schedule next question after poll timeout
-                import threading
-                def send_next_question():
-                    import time
-                    time.sleep(12)  # Wait for poll to close + 2 seconds
-                    from app import app
-                    with app.app_context():
-                        if current_question < quiz_session.total_questions:
-                            self._send_poll_question(chat_id, quiz_session, quiz_data['words'])
-                        else:
-                            self._finish_quiz(chat_id, quiz_session)
-                            if chat_id in self.active_quizzes:
-                                del self.active_quizzes[chat_id]
-                
-                threading.Thread(target=send_next_question, daemon=True).start()
+                self.scheduler.schedule(NEXT_QUESTION_DELAY, self._on_question_timeout,
+                                        chat_id, state.session_id, current_question, key=chat_id)
                                 
             except Exception as e:
                 logger.error(f"Error sending poll question: {e}")
                 self.bot.send_message(chat_id, "❌ Error generating question. Please try again.")
     
+    def _on_question_timeout(self, chat_id, session_id, question_number):
+        """Move on once a question's poll has closed (or finish the quiz after the last one)"""
+        from app import app
+        with app.app_context():
+            state = self.active_quizzes.get(chat_id)
+            # The quiz was stopped, replaced or already moved on while the timer was pending
+            if not state or state.session_id != session_id or state.current_question != question_number:
+                return
+            if state.poll_id and self._close_poll(state, state.poll_id):
+                # The poll closed without an answer
+                state.record_review(QUALITY_UNANSWERED)
+            if question_number < state.total_questions:
+                self._send_poll_question(chat_id)
+            else:
+                self._finish_quiz(chat_id)
+    
+    def _close_poll(self, state, poll_id):
+        """Mark a question's poll as done; False if it was already closed"""
+        with self._poll_lock:
+            if state.poll_id != poll_id:
+                return False
+            state.poll_id = None
+            self.active_polls.pop(poll_id, None)
+            return True
+    
+    def cancel_timers(self, chat_id):
+        """Cancel pending question timers for a chat (e.g. on /stop)"""
+        cancelled = self.scheduler.cancel(chat_id)
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} quiz timer(s) for chat {chat_id}")
+    
+    def stop_quiz(self, chat_id):
+        """Stop a running quiz; returns its state, or None if there was none"""
+        state = self.active_quizzes.pop(chat_id, None)
+        if state is None:
+            return None
+        self.cancel_timers(chat_id)
+        if state.poll_id:
+            self.active_polls.pop(state.poll_id, None)
+        self.answers.flush()
+        QuizSession.query.filter_by(id=state.session_id).update({'completed': True, 'score': state.score})
+        db.session.commit()
+        self._save_reviews(state)
+        self._discard_checkpoint(chat_id)
+        return state
+    
+    def _save_reviews(self, state):
+        """Write the quiz's answers to the spaced-repetition schedule in one batch"""
+        try:
+            updated = apply_reviews(state.user_id, state.reviews())
+            logger.info(f"Updated review schedule of {updated} words for user {state.user_id}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error saving reviews for user {state.user_id}: {e}")
+    
+    def _checkpoint(self, state, start=False):
+        """Save quiz state so the quiz can resume after a restart (the words only at the start)"""
+        if self.store is None:
+            return
+        try:
+            if start:
+                self.store.start(state)
+            else:
+                self.store.save(state)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error saving quiz checkpoint for chat {state.chat_id}: {e}")
+    
+    def _discard_checkpoint(self, chat_id):
+        if self.store is None:
+            return
+        try:
+            self.store.delete(chat_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error removing quiz checkpoint for chat {chat_id}: {e}")
+    
+    def recover(self):
+        """Resume quizzes that were running when the bot last stopped"""
+        if self.store is None:
+            return 0
+        from app import app
+        with app.app_context():
+            try:
+                states = self.store.load_all()
+            except Exception as e:
+                logger.error(f"Error loading quiz checkpoints: {e}")
+                return 0
+            for state in states:
+                self.active_quizzes[state.chat_id] = state
+                if state.poll_id:
+                    # Late answers to the poll that was open are still scored
+                    self.active_polls[state.poll_id] = state.chat_id
+                self.scheduler.schedule(NEXT_QUESTION_DELAY, self._on_question_timeout,
+                                        state.chat_id, state.session_id, state.current_question,
+                                        key=state.chat_id)
+            if states:
+                logger.info(f"Resumed {len(states)} quiz(zes) from checkpoints")
+            return len(states)
+    
     def handle_poll_answer(self, poll_answer):
         """Handle poll answer"""
         from app import app
@@ -173,70 +277,60 @@ class QuizManager:
                 user_id = poll_answer.user.id
                 option_ids = poll_answer.option_ids
                 
-                if poll_id not in self.active_polls:
+                chat_id = self.active_polls.get(poll_id)
+                if chat_id is None:
                     return
                 
-                poll_data = self.active_polls[poll_id]
-                chat_id = poll_data['chat_id']
-                quiz_session = poll_data['quiz_session']
-                correct_word = poll_data['correct_word']
-                question_number = poll_data['question_number']
+                state = self.active_quizzes.get(chat_id)
+                if not state or state.poll_id != poll_id:
+                    return
                 
-                # Only process answers from the quiz participant
-                if user_id != quiz_session.user_id:
+                # Only process answers from the quiz participant (quizzes run in private chats)
+                if user_id != chat_id:
                     return
                 
-                quiz_data = self.active_quizzes.get(chat_id)
-                if not quiz_data:
+                # The question timer may have closed this poll in the meantime
+                if not self._close_poll(state, poll_id):
                     return
                 
                 # Check if answer is correct and update score
                 if option_ids and len(option_ids) > 0:
                     selected_option = option_ids[0]
-                    correct_option = poll_data['correct_index']
                     
-                    # Update score if answer is correct
-                    if selected_option == correct_option:
-                        quiz_session.score += 1
-                        db.session.commit()
-                        logger.info(f"Correct answer! Score updated to {quiz_session.score}")
+                    # Update score if answer is correct; the answer is written with the next flush
+                    correct = selected_option == state.correct_index
+                    if correct:
+                        state.record_review(QUALITY_CORRECT)
+                        state.score += 1
+                        logger.info(f"Correct answer! Score updated to {state.score}")
                     else:
-                        logger.info(f"Wrong answer. Score remains {quiz_session.score}")
-                
-                # Check if current question is completed
-                # if question_number < quiz_session.total_questions:
-                #     # Wait a bit for user to see the result, then send next question
-                #     import time
-                #     time.sleep(2)
-                #     self._send_poll_question(chat_id, quiz_session, quiz_data['words'])
-                # else:
-                #     # Quiz finished
-                #     self._finish_quiz(chat_id, quiz_session)
-                #     # Clean up
-                #     if chat_id in self.active_quizzes:
-                #         del self.active_quizzes[chat_id]
-                pass
+                        state.record_review(QUALITY_WRONG)
+                        logger.info(f"Wrong answer. Score remains {state.score}")
+                    self.answers.record(state, selected_option, correct)
                 
-                # Clean up this poll
-                if poll_id in self.active_polls:
-                    del self.active_polls[poll_id]
+                # Buffered mode: the next question's checkpoint picks up this answer
+                if self.answers.sync:
+                    self._checkpoint(state)
                     
             except Exception as e:
                 logger.error(f"Error handling poll answer: {e}")
     
-
-    
-    def _finish_quiz(self, chat_id, quiz_session):
+    def _finish_quiz(self, chat_id):
         """Finish the quiz and show results"""
         from app import app
         with app.app_context():
             try:
-                quiz_session.completed = True
+                state = self.active_quizzes.get(chat_id)
+                if not state:
+                    return
+                self.answers.flush()
+                QuizSession.query.filter_by(id=state.session_id).update({'completed': True, 'score': state.score})
                 db.session.commit()
+                self._save_reviews(state)
                 
                 # Calculate percentage
-                percentage = (quiz_session.score / quiz_session.total_questions) * 100
-                logger.info(f"Quiz finished for user {quiz_session.user_id}: score {quiz_session.score}/{quiz_session.total_questions} ({percentage:.0f}%)")
+                percentage = (state.score / state.total_questions) * 100
+                logger.info(f"Quiz finished for user {state.user_id}: score {state.score}/{state.total_questions} ({percentage:.0f}%)")
                 
                 # Determine performance message
                 if percentage >= 90:
@@ -252,16 +346,18 @@ class QuizManager:
                     f"🎯 **Quiz Complete!**\n\n"
                     f"{performance}\n"
                     f"📊 **Results:**\n"
-                    f"✅ Correct: {quiz_session.score}\n"
-                    f"❌ Wrong: {quiz_session.total_questions - quiz_session.score}\n"
-                    f"📈 Score: {quiz_session.score}/{quiz_session.total_questions} ({percentage:.0f}%)\n\n"
+                    f"✅ Correct: {state.score}\n"
+                    f"❌ Wrong: {state.total_questions - state.score}\n"
+                    f"📈 Score: {state.score}/{state.total_questions} ({percentage:.0f}%)\n\n"
                     f"💡 Keep adding new words and take more quizzes to improve!"
                 )
                 
                 self.bot.send_message(chat_id, results_text, parse_mode='Markdown')
                 
                 # Clean up
-                if chat_id in self.active_quizzes:
-                    del self.active_quizzes[chat_id]
+                self.active_quizzes.pop(chat_id, None)
+                if state.poll_id:
+                    self.active_polls.pop(state.poll_id, None)
+                self._discard_checkpoint(chat_id)
             except Exception as e:
                 logger.error(f"Error finishing quiz: {e}")
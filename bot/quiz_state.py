@@ -0,0 +1,269 @@
+"""
+Compact quiz state and checkpoint stores
+
+A running quiz keeps only what it needs to ask questions: word ids in an
+array plus parallel tuples of English words and translations, instead of
+live ORM objects. So quizzes survive a restart the state is checkpointed in
+two parts: the deck (the quiz's words, which never change) is written once
+when the quiz starts, and the progress (question number, score, the words
+dealt so far and the open poll) after every question. A progress checkpoint
+is a few hundred bytes however large the vocabulary is.
+"""
+import os
+import json
+import random
+import logging
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QuizState:
+    """Everything needed to continue one chat's quiz"""
+
+    __slots__ = ('chat_id', 'user_id', 'session_id', 'quiz_type', 'total_questions',
+                 'current_question', 'score', 'word_ids', 'english', 'translations',
+                 'deck', 'dealt', 'poll_id', 'correct_index', 'correct_position',
+                 'review_ids', 'review_quality')
+
+    def __init__(self, chat_id: int, user_id: int, session_id: int, quiz_type: str,
+                 total_questions: int, word_ids: Iterable[int], english: Iterable[str],
+                 translations: Iterable[str]):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.session_id = session_id
+        self.quiz_type = quiz_type
+        self.total_questions = total_questions
+        self.current_question = 0
+        self.score = 0
+        self.word_ids = array('q', word_ids)
+        self.english = tuple(english)
+        self.translations = tuple(translations)
+        # Word positions in dealing order; deck[:dealt] have been asked this round
+        self.deck = array('l', range(len(self.word_ids)))
+        self.dealt = 0
+        # The open poll, if any
+        self.poll_id: Optional[str] = None
+        self.correct_index: Optional[int] = None
+        self.correct_position: Optional[int] = None
+        # Answers so far as (word id, SM-2 quality), written to the schedule when the quiz ends
+        self.review_ids = array('q')
+        self.review_quality = array('b')
+
+    @classmethod
+    def from_words(cls, chat_id: int, user_id: int, session_id: int, quiz_type: str,
+                   total_questions: int, words) -> 'QuizState':
+        """Build the state from Word rows (or any objects with id/english_word/translation)"""
+        return cls(chat_id, user_id, session_id, quiz_type, total_questions,
+                   [w.id for w in words], [w.english_word for w in words], [w.translation for w in words])
+
+    def __len__(self) -> int:
+        return len(self.word_ids)
+
+    def next_word(self, rng=random) -> int:
+        """Deal the position of the next word to ask, without repeats until all were asked
+
+        The deck is shuffled as it is dealt (Fisher-Yates, one swap per card),
+        so a question costs O(1) however many words the quiz has.
+        """
+        deck = self.deck
+        if self.dealt >= len(deck):
+            self.dealt = 0
+        j = rng.randrange(self.dealt, len(deck))
+        deck[self.dealt], deck[j] = deck[j], deck[self.dealt]
+        position = deck[self.dealt]
+        self.dealt += 1
+        return position
+
+    def distractors(self, position: int, count: int = 3, rng=random) -> List[int]:
+        """Pick up to `count` distinct positions other than `position`
+
+        Rejection sampling over the index range: with at least 4 words a
+        pick is rejected at most 3/4 of the time, so this is O(1) expected.
+        """
+        size = len(self.word_ids)
+        count = min(count, size - 1)
+        picked: List[int] = []
+        while len(picked) < count:
+            candidate = rng.randrange(size)
+            if candidate != position and candidate not in picked:
+                picked.append(candidate)
+        return picked
+
+    def record_review(self, quality: int):
+        """Record the answer to the open question"""
+        self.review_ids.append(self.word_ids[self.correct_position])
+        self.review_quality.append(quality)
+
+    def reviews(self) -> List[Tuple[int, int]]:
+        return list(zip(self.review_ids, self.review_quality))
+
+    def deck_dict(self) -> Dict:
+        """The part of the state that is fixed when the quiz starts"""
+        return {
+            'chat_id': self.chat_id,
+            'user_id': self.user_id,
+            'session_id': self.session_id,
+            'quiz_type': self.quiz_type,
+            'total_questions': self.total_questions,
+            'word_ids': self.word_ids.tolist(),
+            'english': list(self.english),
+            'translations': list(self.translations),
+        }
+
+    def progress_dict(self) -> Dict:
+        """The part of the state that changes with every question"""
+        return {
+            'chat_id': self.chat_id,
+            'session_id': self.session_id,
+            'current_question': self.current_question,
+            'score': self.score,
+            # Only the dealt words: the order of the rest does not matter, it is drawn at random
+            'dealt': self.deck[:self.dealt].tolist(),
+            'poll_id': self.poll_id,
+            'correct_index': self.correct_index,
+            'correct_position': self.correct_position,
+            'review_ids': self.review_ids.tolist(),
+            'review_quality': self.review_quality.tolist(),
+        }
+
+    @classmethod
+    def from_checkpoint(cls, deck: Dict, progress: Dict) -> 'QuizState':
+        """Rebuild the state from its deck and progress checkpoints"""
+        if deck['session_id'] != progress['session_id']:
+            raise ValueError(f"progress of session {progress['session_id']} does not match deck of session {deck['session_id']}")
+        state = cls(deck['chat_id'], deck['user_id'], deck['session_id'], deck['quiz_type'],
+                    deck['total_questions'], deck['word_ids'], deck['english'], deck['translations'])
+        state.current_question = progress['current_question']
+        state.score = progress['score']
+        dealt = progress['dealt']
+        dealt_set = set(dealt)
+        state.deck = array('l', dealt + [p for p in range(len(state.word_ids)) if p not in dealt_set])
+        state.dealt = len(dealt)
+        state.poll_id = progress.get('poll_id')
+        state.correct_index = progress.get('correct_index')
+        state.correct_position = progress.get('correct_position')
+        state.review_ids = array('q', progress.get('review_ids', ()))
+        state.review_quality = array('b', progress.get('review_quality', ()))
+        return state
+
+
+class DatabaseQuizStore:
+    """Checkpoints quiz decks in quiz_decks and progress in quiz_checkpoints"""
+
+    def start(self, state: QuizState):
+        """Save the deck of a new quiz (replacing the chat's previous one) and its progress"""
+        from app import db
+        from models import QuizDeck
+        deck = QuizDeck.query.filter_by(chat_id=state.chat_id).first()
+        if deck is None:
+            deck = QuizDeck(chat_id=state.chat_id)
+            db.session.add(deck)
+        deck.session_id = state.session_id
+        deck.words = json.dumps(state.deck_dict(), ensure_ascii=False)
+        deck.created_at = datetime.utcnow()
+        self.save(state)
+
+    def save(self, state: QuizState):
+        from app import db
+        from models import QuizCheckpoint
+        payload = json.dumps(state.progress_dict(), ensure_ascii=False)
+        checkpoint = QuizCheckpoint.query.filter_by(chat_id=state.chat_id).first()
+        if checkpoint is None:
+            checkpoint = QuizCheckpoint(chat_id=state.chat_id)
+            db.session.add(checkpoint)
+        checkpoint.state = payload
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    def delete(self, chat_id: int):
+        from app import db
+        from models import QuizCheckpoint, QuizDeck
+        QuizCheckpoint.query.filter_by(chat_id=chat_id).delete()
+        QuizDeck.query.filter_by(chat_id=chat_id).delete()
+        db.session.commit()
+
+    def load_all(self) -> List[QuizState]:
+        from models import QuizCheckpoint, QuizDeck
+        decks = {deck.chat_id: deck for deck in QuizDeck.query.all()}
+        states = []
+        for checkpoint in QuizCheckpoint.query.all():
+            try:
+                deck = decks.get(checkpoint.chat_id)
+                if deck is None:
+                    raise ValueError("no deck")
+                states.append(QuizState.from_checkpoint(json.loads(deck.words), json.loads(checkpoint.state)))
+            except (ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable quiz checkpoint for chat {checkpoint.chat_id}: {e}")
+        return states
+
+
+class FileQuizStore:
+    """Checkpoints quizzes as JSON files per chat in a directory (<chat>.deck.json and <chat>.json)"""
+
+    DECK_SUFFIX = '.deck.json'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, chat_id: int) -> str:
+        return os.path.join(self.directory, f'{chat_id}.json')
+
+    def _deck_path(self, chat_id: int) -> str:
+        return os.path.join(self.directory, f'{chat_id}{self.DECK_SUFFIX}')
+
+    def _write(self, path: str, data: Dict):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        # Atomic rename: a crash never leaves a half-written checkpoint
+        os.replace(tmp_path, path)
+
+    def start(self, state: QuizState):
+        """Save the deck of a new quiz and its progress"""
+        self._write(self._deck_path(state.chat_id), state.deck_dict())
+        self.save(state)
+
+    def save(self, state: QuizState):
+        self._write(self._path(state.chat_id), state.progress_dict())
+
+    def delete(self, chat_id: int):
+        for path in (self._path(chat_id), self._deck_path(chat_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def load_all(self) -> List[QuizState]:
+        states = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name.endswith(self.DECK_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    progress = json.load(f)
+                with open(self._deck_path(progress['chat_id']), 'r', encoding='utf-8') as f:
+                    deck = json.load(f)
+                states.append(QuizState.from_checkpoint(deck, progress))
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable quiz checkpoint {name}: {e}")
+        return states
+
+
+def create_quiz_store(spec: Optional[str] = None):
+    """Create the checkpoint store named by QUIZ_STATE_STORE
+
+    'db' (default) uses the database, 'file:<directory>' a local directory,
+    'none' disables checkpointing.
+    """
+    spec = spec if spec is not None else os.environ.get('QUIZ_STATE_STORE', 'db')
+    if spec == 'none':
+        return None
+    if spec.startswith('file:'):
+        return FileQuizStore(spec[len('file:'):])
+    if spec != 'db':
+        logger.warning(f"Unknown QUIZ_STATE_STORE '{spec}', using the database")
+    return DatabaseQuizStore()
@@ -0,0 +1,116 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledTask:
+    """Handle for a scheduled call; cancel() stops it from running"""
+
+    __slots__ = ('when', 'key', 'fn', 'args', 'cancelled')
+
+    def __init__(self, when: float, key: Optional[Hashable], fn: Callable, args: tuple):
+        self.when = when
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """Run delayed calls from one timer thread instead of a sleeping thread per call
+
+    Due tasks are handed to a small worker pool so a slow Telegram request
+    does not hold up the other timers. Tasks can be grouped under a key
+    (e.g. a chat id) and cancelled together.
+    """
+
+    def __init__(self, workers: int = 4, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._by_key: Dict[Hashable, Set[ScheduledTask]] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scheduler')
+        self._thread = threading.Thread(target=self._run, name='Scheduler', daemon=True)
+        self._thread.start()
+        self.fired = 0
+        self.cancelled = 0
+
+    def schedule(self, delay: float, fn: Callable, *args, key: Optional[Hashable] = None) -> ScheduledTask:
+        """Call fn(*args) after delay seconds"""
+        task = ScheduledTask(self._clock() + delay, key, fn, args)
+        with self._condition:
+            heapq.heappush(self._heap, (task.when, next(self._counter), task))
+            if key is not None:
+                self._by_key.setdefault(key, set()).add(task)
+            # Wake the timer thread if this is now the earliest task
+            if self._heap[0][2] is task:
+                self._condition.notify()
+        return task
+
+    def cancel(self, key: Hashable) -> int:
+        """Cancel every pending task scheduled under key; returns how many"""
+        with self._condition:
+            tasks = self._by_key.pop(key, ())
+            for task in tasks:
+                task.cancel()
+            self.cancelled += len(tasks)
+        return len(tasks)
+
+    def pending(self, key: Optional[Hashable] = None) -> int:
+        """Number of pending tasks (for one key, or in total)"""
+        with self._condition:
+            if key is not None:
+                return len(self._by_key.get(key, ()))
+            return sum(1 for _, _, task in self._heap if not task.cancelled)
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    # Drop cancelled tasks so they do not decide the wait time
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    timeout = self._heap[0][0] - self._clock()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, task = heapq.heappop(self._heap)
+                if task.key is not None:
+                    tasks = self._by_key.get(task.key)
+                    if tasks is not None:
+                        tasks.discard(task)
+                        if not tasks:
+                            del self._by_key[task.key]
+                self.fired += 1
+            self._executor.submit(self._call, task)
+
+    def _call(self, task: ScheduledTask):
+        if task.cancelled:
+            return
+        try:
+            task.fn(*task.args)
+        except Exception as e:
+            logger.error(f"Scheduled task {getattr(task.fn, '__name__', task.fn)} failed: {e}")
@@ -0,0 +1,92 @@
+"""
+SM-2 spaced repetition for saved words
+
+Every quiz answer is a review. Answers are collected while the quiz runs
+and written in one batch when it ends: one IN query for the existing review
+rows, then a single commit.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Answer quality on SM-2's 0-5 scale
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+QUALITY_UNANSWERED = 0
+
+MIN_EASINESS = 1.3
+
+
+def sm2(easiness: float, interval: int, repetitions: int, quality: int) -> Tuple[float, int, int]:
+    """Apply one review; returns the new (easiness, interval in days, repetitions)"""
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = round(interval * easiness)
+    easiness += 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return max(MIN_EASINESS, easiness), interval, repetitions
+
+
+def apply_reviews(user_id: int, reviews: Iterable[Tuple[int, int]], now: datetime = None) -> int:
+    """Update the schedule of (word_id, quality) reviews in one transaction
+
+    Words reviewed more than once in a quiz get each review applied in order.
+    Deleted words are skipped. Returns the number of words updated.
+    """
+    from app import db
+    from models import Word, WordReview
+    reviews = list(reviews)
+    if not reviews:
+        return 0
+    now = now or datetime.utcnow()
+    word_ids = {word_id for word_id, _ in reviews}
+
+    existing = {r.word_id: r for r in WordReview.query.filter(WordReview.word_id.in_(word_ids))}
+    missing = word_ids - existing.keys()
+    if missing:
+        # Only words that still exist (and belong to the user) get a review row
+        for (word_id,) in Word.query.with_entities(Word.id)\
+                                   .filter(Word.user_id == user_id, Word.id.in_(missing)):
+            review = WordReview(word_id=word_id, user_id=user_id, easiness=2.5,
+                                interval=0, repetitions=0, due_at=now)
+            db.session.add(review)
+            existing[word_id] = review
+
+    for word_id, quality in reviews:
+        review = existing.get(word_id)
+        if review is None:
+            continue
+        review.easiness, review.interval, review.repetitions = sm2(
+            review.easiness, review.interval, review.repetitions, quality)
+        review.due_at = now + timedelta(days=review.interval)
+        review.last_reviewed_at = now
+    db.session.commit()
+    return len(existing)
+
+
+def due_word_ids(user_id: int, limit: int = 20, now: datetime = None) -> List[int]:
+    """Ids of the words most overdue for review, then never-reviewed words"""
+    from models import Word, WordReview
+    now = now or datetime.utcnow()
+    ids = [word_id for (word_id,) in WordReview.query.with_entities(WordReview.word_id)
+                                               .filter(WordReview.user_id == user_id,
+                                                       WordReview.due_at <= now)
+                                               .order_by(WordReview.due_at)
+                                               .limit(limit)]
+    if len(ids) < limit:
+        new_words = Word.query.with_entities(Word.id)\
+                              .outerjoin(WordReview, WordReview.word_id == Word.id)\
+                              .filter(Word.user_id == user_id, WordReview.id.is_(None))\
+                              .order_by(Word.id)\
+                              .limit(limit - len(ids))
+        ids += [word_id for (word_id,) in new_words]
+    return ids
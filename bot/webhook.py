@@ -0,0 +1,214 @@
+"""
+Webhook ingestion: Telegram POSTs updates to the Flask app
+
+With BOT_MODE=webhook nothing polls Telegram. The serving entry point
+(main.py, or the post_worker_init hook in gunicorn.conf.py) calls
+init_webhook, which registers this blueprint; importing app alone never
+does. The worker builds one VocabularyBot and hands each update to its
+dispatcher (or handles it on the request thread with DISPATCH_WORKERS=0);
+scale it with threads (gunicorn --threads), not worker processes. Telegram
+sends WEBHOOK_SECRET in the X-Telegram-Bot-Api-Secret-Token header; webhook
+mode does not start without a secret and requests without it get 403.
+
+Running quizzes (timers, open polls) live in the memory of the process that
+started them, and a poll answer must reach that process. So webhook mode
+runs in exactly one process: it takes the 'webhook' row of bot_leases and
+keeps it fresh every WEBHOOK_LEASE / 3 seconds, and a second worker or host
+refuses to start while the holder is alive. Only the holder registers the
+webhook and recovers quizzes. A holder that stopped heartbeating for
+WEBHOOK_LEASE seconds, or whose process on this host is gone, is taken over.
+"""
+import os
+import hmac
+import atexit
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import urlparse
+
+import telebot
+from flask import Blueprint, abort, request
+from sqlalchemy import delete, select, update
+
+from database.upsert import insert_ignore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBHOOK_PATH = '/telegram/webhook'
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+WEBHOOK_LEASE = 'webhook'
+
+webhook_blueprint = Blueprint('telegram_webhook', __name__)
+
+_bot = None
+_bot_lock = threading.Lock()
+
+
+class WebhookError(RuntimeError):
+    """Webhook mode cannot start in this process"""
+
+
+def webhook_mode() -> bool:
+    return os.environ.get('BOT_MODE', 'polling') == 'webhook'
+
+
+def webhook_path() -> str:
+    """Path of the update endpoint: the path of WEBHOOK_URL, or the default"""
+    path = urlparse(os.environ.get('WEBHOOK_URL', '')).path
+    return path if path and path != '/' else DEFAULT_WEBHOOK_PATH
+
+
+def get_bot():
+    """The VocabularyBot of this worker process, built on first use"""
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                from bot.main import VocabularyBot
+                # Request threads route updates themselves; no telebot thread pool
+                _bot = VocabularyBot(threaded=False)
+    return _bot
+
+
+def _secret_ok(secret: Optional[str]) -> bool:
+    expected = os.environ.get('WEBHOOK_SECRET', '')
+    if not expected:
+        return False
+    return hmac.compare_digest((secret or '').encode('utf-8'), expected.encode('utf-8'))
+
+
+def receive_update():
+    """Verify the secret token and run one update through the bot handlers"""
+    if not _secret_ok(request.headers.get(SECRET_HEADER)):
+        abort(403)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or 'update_id' not in payload:
+        abort(400)
+    update = telebot.types.Update.de_json(payload)
+    try:
+        get_bot().bot.process_new_updates([update])
+    except Exception as e:
+        # Answering with an error makes Telegram resend the update over and over
+        logger.error(f"Error processing webhook update {payload.get('update_id')}: {e}")
+    return '', 200
+
+
+def lease_seconds() -> float:
+    return float(os.environ.get('WEBHOOK_LEASE', '60'))
+
+
+def process_holder() -> str:
+    """Lease holder name of this process"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _holder_alive(holder: str) -> bool:
+    """Whether a holder process still runs (holders on other hosts are assumed to)"""
+    host, _, pid = holder.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def acquire_lease(holder: str, lease: Optional[float] = None) -> bool:
+    """Take the webhook lease unless a live process holds it"""
+    from app import app, db
+    from models import BotLease
+    lease = lease or lease_seconds()
+    with app.app_context():
+        now = datetime.utcnow()
+        if insert_ignore(db.session, BotLease.__table__,
+                         {'name': WEBHOOK_LEASE, 'holder': holder, 'updated_at': now}) is not None:
+            db.session.commit()
+            return True
+        current = db.session.execute(
+            select(BotLease.holder, BotLease.updated_at).where(BotLease.name == WEBHOOK_LEASE)
+        ).one()
+        if current.holder != holder:
+            if current.updated_at >= now - timedelta(seconds=lease) and _holder_alive(current.holder):
+                db.session.commit()
+                return False
+            logger.warning(f"Taking over the webhook lease from {current.holder}")
+        # Conditional update: of two processes taking over, only one wins
+        result = db.session.execute(
+            update(BotLease)
+            .where(BotLease.name == WEBHOOK_LEASE, BotLease.holder == current.holder)
+            .values(holder=holder, updated_at=now)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+
+def renew_lease(holder: str) -> bool:
+    """Heartbeat; False if another process has taken the lease"""
+    from app import app, db
+    from models import BotLease
+    with app.app_context():
+        result = db.session.execute(
+            update(BotLease)
+            .where(BotLease.name == WEBHOOK_LEASE, BotLease.holder == holder)
+            .values(updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+
+def release_lease(holder: str):
+    from app import app, db
+    from models import BotLease
+    with app.app_context():
+        db.session.execute(delete(BotLease).where(BotLease.name == WEBHOOK_LEASE, BotLease.holder == holder))
+        db.session.commit()
+
+
+def _keep_lease(holder: str, stop: threading.Event):
+    while not stop.wait(lease_seconds() / 3):
+        try:
+            if not renew_lease(holder):
+                logger.critical("Another process took over the webhook lease; quizzes of this process will be lost")
+                return
+        except Exception as e:
+            logger.error(f"Error renewing the webhook lease: {e}")
+
+
+def _release_at_exit(holder: str, stop: threading.Event):
+    stop.set()
+    try:
+        release_lease(holder)
+    except Exception as e:
+        logger.error(f"Error releasing the webhook lease: {e}")
+
+
+def init_webhook(app):
+    """Serve Telegram updates from this app and point the bot's webhook at it
+
+    Raises WebhookError without WEBHOOK_SECRET, or when another live process
+    holds the webhook lease.
+    """
+    if not os.environ.get('WEBHOOK_SECRET'):
+        raise WebhookError("WEBHOOK_SECRET is required in webhook mode")
+    holder = process_holder()
+    if not acquire_lease(holder):
+        raise WebhookError(
+            "Another process serves the webhook. Running quizzes live in one process's memory, "
+            "so webhook mode runs in a single worker: scale with threads (gunicorn -w 1 --threads N)"
+        )
+    stop = threading.Event()
+    threading.Thread(target=_keep_lease, args=(holder, stop), name='WebhookLease', daemon=True).start()
+    atexit.register(_release_at_exit, holder, stop)
+
+    webhook_blueprint.add_url_rule(webhook_path(), 'receive_update', receive_update, methods=['POST'])
+    app.register_blueprint(webhook_blueprint)
+    try:
+        get_bot().start_webhook()
+    except Exception as e:
+        logger.error(f"Error starting webhook mode: {e}")
+    logger.info(f"Webhook mode: serving Telegram updates on {webhook_path()} as {holder}")
@@ -0,0 +1,174 @@
+"""
+Startup schema maintenance
+
+db.create_all() only creates missing tables, so indexes added to existing
+tables are created here. A unique index cannot be built over duplicate
+rows, and startup never deletes data to make room for one: if duplicate
+words exist, startup fails and the duplicates are merged with the one-off
+command
+
+    python database/maintenance.py duplicate-words          # report them
+    python database/maintenance.py duplicate-words --merge  # merge them and add the index
+
+Several workers may start at once; an index another worker has just
+created is not an error.
+"""
+import os
+import sys
+import logging
+from typing import Dict, List, NamedTuple
+
+from sqlalchemy import bindparam, inspect, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+UNIQUE_WORDS_INDEX = 'uq_words_user_word'
+
+# The maintenance command clears this so the app can load while duplicates still exist
+fail_on_duplicates = True
+
+
+class SchemaError(RuntimeError):
+    """The database schema cannot be brought up to date automatically"""
+
+
+class DuplicateWords(NamedTuple):
+    user_id: int
+    english_word: str  # lowercased
+    ids: List[int]     # oldest (kept on merge) first
+
+
+def find_duplicate_words(db) -> List[DuplicateWords]:
+    """Groups of words a user saved more than once (ignoring case)"""
+    rows = db.session.execute(text(
+        "SELECT w.user_id, lower(w.english_word), w.id FROM words w JOIN ("
+        "SELECT user_id, lower(english_word) AS word FROM words "
+        "GROUP BY user_id, lower(english_word) HAVING COUNT(*) > 1) d "
+        "ON d.user_id = w.user_id AND d.word = lower(w.english_word) "
+        "ORDER BY w.user_id, lower(w.english_word), w.id"
+    )).all()
+    groups: Dict[tuple, List[int]] = {}
+    for user_id, word, word_id in rows:
+        groups.setdefault((user_id, word), []).append(word_id)
+    return [DuplicateWords(user_id, word, ids) for (user_id, word), ids in groups.items()]
+
+
+def merge_duplicate_words(db) -> int:
+    """Merge each duplicate group into its oldest word; returns how many rows were removed
+
+    The kept word takes over the review schedule of a duplicate if it has
+    none of its own, and logged quiz answers are pointed at it.
+    """
+    removed = 0
+    for group in find_duplicate_words(db):
+        keep, extra = group.ids[0], group.ids[1:]
+        params = {'keep': keep, 'extra': extra}
+        has_review = db.session.execute(
+            text("SELECT 1 FROM word_reviews WHERE word_id = :keep"), {'keep': keep}
+        ).first()
+        if not has_review:
+            db.session.execute(_with_ids(
+                "UPDATE word_reviews SET word_id = :keep WHERE id = ("
+                "SELECT MIN(id) FROM word_reviews WHERE word_id IN :extra)"
+            ), params)
+        db.session.execute(_with_ids("DELETE FROM word_reviews WHERE word_id IN :extra"), params)
+        db.session.execute(_with_ids("UPDATE quiz_answers SET word_id = :keep WHERE word_id IN :extra"), params)
+        db.session.execute(_with_ids("DELETE FROM words WHERE id IN :extra"), params)
+        removed += len(extra)
+        logger.info(f"Merged {len(extra)} duplicate(s) of '{group.english_word}' for user {group.user_id} "
+                    f"into word {keep}")
+    db.session.commit()
+    return removed
+
+
+def _with_ids(sql: str):
+    """SQL whose :extra parameter is a list of ids"""
+    return text(sql).bindparams(bindparam('extra', expanding=True))
+
+
+def _existing_index_names(db):
+    """Names of all indexes in the database
+
+    Read from the catalog directly: SQLAlchemy's reflection skips
+    expression indexes such as lower(english_word).
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        query = "SELECT name FROM sqlite_master WHERE type = 'index'"
+    elif dialect == 'postgresql':
+        query = "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+    else:
+        inspector = inspect(db.engine)
+        return {index['name'] for table in inspector.get_table_names()
+                for index in inspector.get_indexes(table)}
+    return {name for (name,) in db.session.execute(text(query))}
+
+
+def ensure_indexes(db):
+    """Create every declared index that is missing from an existing table
+
+    Raises SchemaError when the unique index on words cannot be created
+    because of duplicate rows: the app must not run without it.
+    """
+    existing = _existing_index_names(db)
+    db.session.commit()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.name == UNIQUE_WORDS_INDEX:
+                duplicates = find_duplicate_words(db)
+                db.session.commit()
+                if duplicates:
+                    rows = sum(len(group.ids) - 1 for group in duplicates)
+                    message = (
+                        f"Cannot create {UNIQUE_WORDS_INDEX}: {rows} duplicate words in {len(duplicates)} groups. "
+                        f"Review them with 'python database/maintenance.py duplicate-words' and merge them "
+                        f"with 'python database/maintenance.py duplicate-words --merge'"
+                    )
+                    if fail_on_duplicates:
+                        raise SchemaError(message)
+                    logger.warning(message)
+                    continue
+            try:
+                index.create(db.engine)
+            except Exception as e:
+                # Another worker starting at the same time may have created it first
+                if index.name not in _existing_index_names(db):
+                    if index.name == UNIQUE_WORDS_INDEX:
+                        raise SchemaError(f"Cannot create {UNIQUE_WORDS_INDEX}: {e}") from e
+                    raise
+                db.session.commit()
+                continue
+            logger.info(f"Created index {index.name} on {table.name}")
+
+
+def main(argv):
+    """python database/maintenance.py duplicate-words [--merge]"""
+    if len(argv) not in (2, 3) or argv[1] != 'duplicate-words' or argv[2:] not in ([], ['--merge']):
+        print("Usage: python database/maintenance.py duplicate-words [--merge]")
+        return 2
+    # Run as a script this module is __main__: the app imports (and checks) database.maintenance
+    import database.maintenance as maintenance
+    maintenance.fail_on_duplicates = False
+    from app import app, db
+    with app.app_context():
+        duplicates = maintenance.find_duplicate_words(db)
+        for group in duplicates:
+            print(f"user {group.user_id}: '{group.english_word}' saved {len(group.ids)} times (word ids {group.ids})")
+        if not duplicates:
+            print("No duplicate words")
+        elif argv[2:] == ['--merge']:
+            removed = maintenance.merge_duplicate_words(db)
+            maintenance.fail_on_duplicates = True
+            maintenance.ensure_indexes(db)
+            print(f"Merged {removed} duplicate words; {UNIQUE_WORDS_INDEX} is in place")
+        else:
+            print("Run again with --merge to keep the oldest word of each group and add the unique index")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
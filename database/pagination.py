@@ -0,0 +1,69 @@
+"""
+Keyset pagination over a user's words, newest first
+
+A page is addressed by the (date_added, id) of a row next to it rather than
+an OFFSET, so every page is one range scan on the (user_id, date_added)
+index no matter how deep the user pages. Cursors are short strings that fit
+in Telegram callback data.
+"""
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class WordPage(NamedTuple):
+    words: List  # rows of (id, english_word, translation, date_added)
+    older: Optional[str]  # cursor of the next (older) page, None on the last page
+    newer: Optional[str]  # cursor of the previous (newer) page, None on the first page
+
+
+def encode_cursor(date_added: datetime, word_id: int) -> str:
+    """'<microseconds since epoch>-<id>'"""
+    return f"{(date_added - _EPOCH) // timedelta(microseconds=1)}-{word_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    micros, word_id = cursor.split('-')
+    return _EPOCH + timedelta(microseconds=int(micros)), int(word_id)
+
+
+def word_page(user_id: int, limit: int, older_than: Optional[str] = None,
+              newer_than: Optional[str] = None) -> WordPage:
+    """Get `limit` words after a cursor (older_than), before one (newer_than) or the newest page"""
+    from app import db
+    from models import Word
+
+    query = select(Word.id, Word.english_word, Word.translation, Word.date_added)\
+        .where(Word.user_id == user_id)
+    if newer_than:
+        date_added, word_id = decode_cursor(newer_than)
+        query = query.where(or_(Word.date_added > date_added,
+                                and_(Word.date_added == date_added, Word.id > word_id)))\
+                     .order_by(Word.date_added.asc(), Word.id.asc())
+    else:
+        if older_than:
+            date_added, word_id = decode_cursor(older_than)
+            query = query.where(or_(Word.date_added < date_added,
+                                    and_(Word.date_added == date_added, Word.id < word_id)))
+        query = query.order_by(Word.date_added.desc(), Word.id.desc())
+
+    # One extra row tells whether there is another page in this direction
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if newer_than:
+        rows.reverse()
+        has_newer, has_older = more, True
+    else:
+        has_newer, has_older = bool(older_than), more
+
+    if not rows:
+        return WordPage([], None, None)
+    return WordPage(
+        rows,
+        encode_cursor(rows[-1].date_added, rows[-1].id) if has_older else None,
+        encode_cursor(rows[0].date_added, rows[0].id) if has_newer else None,
+    )
@@ -0,0 +1,38 @@
+"""
+Random sampling of a user's words inside the database
+
+Instead of loading every row and calling random.sample, the sampler counts
+the user's words (an index-only scan of (user_id, id)), draws `count`
+distinct positions uniformly from range(total) and reads the rows at those
+positions in one query: ROW_NUMBER() over the user's words in id order,
+filtered to the drawn positions. Every word is equally likely whatever the
+gaps in the id range, and only the picked rows leave the database.
+"""
+import random
+import logging
+from typing import List
+
+from sqlalchemy import func, select
+
+logger = logging.getLogger(__name__)
+
+
+def sample_words(user_id: int, count: int, rng=random) -> List:
+    """Get up to `count` random (id, english_word, translation) rows of a user's words"""
+    from app import db
+    from models import Word
+
+    total = db.session.execute(select(func.count()).where(Word.user_id == user_id)).scalar()
+    positions = rng.sample(range(1, total + 1), min(count, total))
+    if not positions:
+        return []
+
+    numbered = select(Word.id, Word.english_word, Word.translation,
+                      func.row_number().over(order_by=Word.id).label('position'))\
+        .where(Word.user_id == user_id).subquery()
+    rows = db.session.execute(
+        select(numbered.c.id, numbered.c.english_word, numbered.c.translation)
+        .where(numbered.c.position.in_(positions))
+    ).all()
+    rng.shuffle(rows)
+    return rows
@@ -0,0 +1,49 @@
+"""
+Dialect-aware "insert unless it already exists"
+
+One statement instead of SELECT-then-INSERT, so concurrent requests cannot
+both insert: PostgreSQL gets ON CONFLICT DO NOTHING, SQLite INSERT OR IGNORE
+and MySQL INSERT IGNORE. Any unique constraint or index counts as a conflict.
+Other databases get a plain INSERT in a savepoint, and an IntegrityError
+means the row already existed.
+"""
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Table, insert
+from sqlalchemy.exc import IntegrityError
+
+IGNORE_DIALECTS = ('postgresql', 'sqlite', 'mysql', 'mariadb')
+
+
+def insert_ignore_statement(table: Table, dialect_name: str):
+    """Build an INSERT for `table` that skips rows violating a unique constraint"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        return insert(table).prefix_with('OR IGNORE')
+    if dialect_name in ('mysql', 'mariadb'):
+        return insert(table).prefix_with('IGNORE')
+    raise NotImplementedError(f"The {dialect_name} dialect has no INSERT ... IGNORE")
+
+
+def insert_ignore(session, table: Table, values: Dict) -> Optional[Any]:
+    """Insert one row unless it conflicts (caller commits)
+
+    Returns the new row's primary key, or None if the row already existed.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name not in IGNORE_DIALECTS:
+        try:
+            # The savepoint keeps the caller's transaction usable after a conflict
+            with session.begin_nested():
+                result = session.execute(insert(table), values)
+        except IntegrityError:
+            return None
+        return result.inserted_primary_key[0]
+
+    statement = insert_ignore_statement(table, dialect_name)
+    result = session.execute(statement, values)
+    if result.rowcount != 1:
+        return None
+    return result.inserted_primary_key[0]
@@ -0,0 +1,19 @@
+"""
+Gunicorn settings for serving the Flask app
+
+In webhook mode (BOT_MODE=webhook) the worker registers the Telegram
+webhook and takes the webhook lease once it has booted. Importing app does
+neither, so CLIs and workers that only need the database stay out of it.
+Running quizzes live in one process's memory and the lease admits a single
+process, so webhook mode needs one worker; scale it with threads:
+
+    gunicorn -c gunicorn.conf.py -w 1 --threads 8 -b 0.0.0.0:5000 main:app
+"""
+import os
+
+
+def post_worker_init(worker):
+    if os.environ.get('BOT_MODE', 'polling') == 'webhook':
+        from app import app
+        from bot.webhook import init_webhook
+        init_webhook(app)
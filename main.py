@@ -17,11 +17,16 @@ def start_telegram_bot():
         logger.error(f"Critical error in Telegram bot thread: {e}")
 
 if __name__ == "__main__":
-    # Start bot in a background thread
-    bot_thread = threading.Thread(target=start_telegram_bot, name="BotThread")
-    bot_thread.daemon = True
-    bot_thread.start()
-    logger.info("Telegram bot background thread started")
+    if os.environ.get('BOT_MODE', 'polling') == 'webhook':
+        # Telegram POSTs updates to this app instead of the bot polling
+        from bot.webhook import init_webhook
+        init_webhook(app)
+    else:
+        # Start bot in a background thread
+        bot_thread = threading.Thread(target=start_telegram_bot, name="BotThread")
+        bot_thread.daemon = True
+        bot_thread.start()
+        logger.info("Telegram bot background thread started")
     
     # Start Flask server in the main thread
     try:
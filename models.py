@@ -29,6 +29,16 @@ class Word(db.Model):
     
     # Relationship with user
     user = relationship("User", back_populates="words")
+    review = relationship("WordReview", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Random quiz sampling counts and numbers one user's words in id order
+        db.Index('ix_words_user_id_id', 'user_id', 'id'),
+        # One row per word and user, whatever the case
+        db.Index('uq_words_user_word', 'user_id', db.func.lower(english_word), unique=True),
+        # Newest-first listings
+        db.Index('ix_words_user_date_added', 'user_id', 'date_added'),
+    )
     
     def __repr__(self):
         return f'<Word {self.english_word}: {self.translation}>'
@@ -49,3 +59,120 @@ class QuizSession(db.Model):
     
     def __repr__(self):
         return f'<QuizSession {self.id}: {self.score}/{self.total_questions}>'
+
+class TranslationCache(db.Model):
+    __tablename__ = 'translation_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    word = db.Column(db.String(200), nullable=False)  # normalized (lowercase, stripped)
+    source_lang = db.Column(db.String(10), nullable=False)
+    target_lang = db.Column(db.String(10), nullable=False)
+    translation = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('word', 'source_lang', 'target_lang', name='uq_translation_cache_key'),
+    )
+
+    def __repr__(self):
+        return f'<TranslationCache {self.source_lang}->{self.target_lang} {self.word}: {self.translation}>'
+
+class QuizCheckpoint(db.Model):
+    __tablename__ = 'quiz_checkpoints'
+
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.BigInteger, unique=True, nullable=False)
+    state = db.Column(db.Text, nullable=False)  # QuizState progress as JSON
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<QuizCheckpoint chat {self.chat_id}>'
+
+class QuizDeck(db.Model):
+    __tablename__ = 'quiz_decks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.BigInteger, unique=True, nullable=False)
+    session_id = db.Column(db.Integer, nullable=False)
+    words = db.Column(db.Text, nullable=False)  # the quiz's words as JSON, written once per quiz
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<QuizDeck chat {self.chat_id} session {self.session_id}>'
+
+class WordReview(db.Model):
+    __tablename__ = 'word_reviews'
+
+    id = db.Column(db.Integer, primary_key=True)
+    word_id = db.Column(db.Integer, db.ForeignKey('words.id', ondelete='CASCADE'), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    easiness = db.Column(db.Float, default=2.5, nullable=False)  # SM-2 easiness factor
+    interval = db.Column(db.Integer, default=0, nullable=False)  # days until the next review
+    repetitions = db.Column(db.Integer, default=0, nullable=False)  # correct answers in a row
+    due_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_reviewed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # "Next 20 due words of a user" is a range scan on this index
+        db.Index('ix_word_reviews_user_due', 'user_id', 'due_at'),
+    )
+
+    def __repr__(self):
+        return f'<WordReview word {self.word_id} due {self.due_at}>'
+
+class QuizAnswer(db.Model):
+    __tablename__ = 'quiz_answers'
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('quiz_sessions.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    word_id = db.Column(db.Integer, nullable=True)  # no FK: the log outlives deleted words
+    question_number = db.Column(db.Integer, nullable=False)
+    selected_option = db.Column(db.Integer, nullable=True)
+    correct = db.Column(db.Boolean, nullable=False)
+    answered_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<QuizAnswer session {self.session_id} q{self.question_number}: {self.correct}>'
+
+class BroadcastRun(db.Model):
+    __tablename__ = 'broadcast_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_key = db.Column(db.String(100), unique=True, nullable=False)  # '<kind>:<day>', one run per kind and day
+    kind = db.Column(db.String(50), nullable=False)  # 'word_of_day', 'due_reminder'
+    payload = db.Column(db.Text, nullable=True)  # message data computed once per run, as JSON
+    status = db.Column(db.String(20), default='running', nullable=False)  # 'running', 'done'
+    last_user_id = db.Column(db.Integer, default=0, nullable=False)  # users up to this id are done
+    sent = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    skipped = db.Column(db.Integer, default=0, nullable=False)
+    blocked = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # heartbeat of the sender
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<BroadcastRun {self.run_key}: {self.status} after user {self.last_user_id}>'
+
+class BlockedUser(db.Model):
+    __tablename__ = 'blocked_users'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), unique=True, nullable=False)
+    reason = db.Column(db.String(200), nullable=True)  # Telegram's error description
+    blocked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<BlockedUser {self.user_id}: {self.reason}>'
+
+class BotLease(db.Model):
+    __tablename__ = 'bot_leases'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)  # 'webhook'
+    holder = db.Column(db.String(200), nullable=False)  # '<host>:<pid>' of the process holding it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # heartbeat of the holder
+
+    def __repr__(self):
+        return f'<BotLease {self.name}: {self.holder}>'
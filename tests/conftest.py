@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Tests never reach Telegram, Google Translate or a background reloader
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TEST')
+os.environ.setdefault('TRANSLATION_OFFLINE', '1')
+os.environ.setdefault('TRANSLATION_PERSISTENT_CACHE', '0')
+os.environ.setdefault('DICTIONARY_RELOAD_INTERVAL', '0')
+os.environ.setdefault('QUIZ_STATE_STORE', 'none')
+# A file, not :memory:: an in-memory SQLite database is one connection shared by every thread
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+
+class FakeBot:
+    """Records Bot API calls and answers them like Telegram would"""
+
+    def __init__(self):
+        self.calls = []
+        self._message_id = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls.append((name, args, kwargs))
+                self._message_id += 1
+                chat_id = kwargs.get('chat_id', args[0] if args else None)
+                return SimpleNamespace(message_id=self._message_id, chat=SimpleNamespace(id=chat_id),
+                                       poll=SimpleNamespace(id=str(self._message_id)))
+        return call
+
+    def texts(self, method='send_message'):
+        return [args[1] if len(args) > 1 else kwargs.get('text') for name, args, kwargs in self.calls if name == method]
+
+
+@pytest.fixture
+def fake_bot():
+    return FakeBot()
+
+
+@pytest.fixture
+def dictionary_path(tmp_path, monkeypatch):
+    path = tmp_path / 'dict.json'
+    path.write_text(json.dumps({
+        'cat': 'кот', 'dog': 'собака', 'free': 'свободный', 'talk': 'говорить', 'car': 'машина',
+        'wish': 'желание', 'born': 'рождённый', 'new': 'новый', 'leave': 'уходить', 'see': 'видеть',
+        'run': 'бежать', 'house': 'дом', 'beautiful': 'красивый',
+    }), encoding='utf-8')
+    monkeypatch.setenv('DICTIONARY_PATH', str(path))
+    return path
+
+
+@pytest.fixture
+def make_message():
+    """Build a private-chat text message from a user"""
+    def make(text, chat_id=1001, username='tester'):
+        user = SimpleNamespace(id=chat_id, username=username, first_name='Test', last_name=None)
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), from_user=user, text=text, message_id=1)
+    return make
+
+
+@pytest.fixture
+def app_context():
+    from app import app
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def make_user(app_context):
+    """Create a user with `words` words, added a minute apart (word0 first)"""
+    from app import db
+    from models import User, Word
+
+    def make(words=0, same_time=False):
+        user = User(telegram_id=f'test-{uuid.uuid4().hex}', username='tester')
+        db.session.add(user)
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        db.session.add_all(
+            Word(user_id=user.id, english_word=f'word{i}', translation=f'слово{i}',
+                 date_added=start if same_time else start + timedelta(minutes=i))
+            for i in range(words)
+        )
+        db.session.commit()
+        return user.id
+    return make
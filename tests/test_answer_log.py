@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from bot.answer_log import AnswerBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def quiz_session(make_user):
+    from app import db
+    from models import QuizSession
+    user_id = make_user(words=0)
+    session = QuizSession(user_id=user_id, quiz_type='all', total_questions=5)
+    db.session.add(session)
+    db.session.commit()
+    return SimpleNamespace(session_id=session.id, user_id=user_id, word_ids=[11, 12, 13],
+                           correct_position=0, current_question=1, score=0)
+
+
+def answers_of(session_id):
+    from models import QuizAnswer
+    return QuizAnswer.query.filter_by(session_id=session_id).order_by(QuizAnswer.question_number).all()
+
+
+def test_answers_are_written_in_one_flush(make_user):
+    state = quiz_session(make_user)
+    buffer = AnswerBuffer(durability='buffered', flush_size=100)
+    for question in (1, 2, 3):
+        state.current_question = question
+        state.score += 1
+        buffer.record(state, 0, True)
+
+    assert buffer.pending() == 3
+    assert buffer.flush() == 3
+    assert [a.question_number for a in answers_of(state.session_id)] == [1, 2, 3]
+    from models import QuizSession
+    assert QuizSession.query.filter_by(id=state.session_id).one().score == 3
+
+
+def test_a_bad_row_is_dropped_after_the_retries(make_user, monkeypatch):
+    monkeypatch.setenv('QUIZ_ANSWER_FLUSH_RETRIES', '2')
+    state = quiz_session(make_user)
+    clock = FakeClock()
+    buffer = AnswerBuffer(durability='buffered', flush_size=100, flush_interval=5, clock=clock)
+    buffer.record(state, 0, True)
+    state.current_question = None  # violates NOT NULL: the whole bulk insert fails
+    buffer.record(state, 1, False)
+    state.current_question = 3
+    buffer.record(state, 2, True)
+
+    assert buffer.flush() == 0
+    clock.now += 5
+    assert buffer.flush() == 0
+    assert buffer.pending() == 3  # requeued, not lost, while retries remain
+
+    clock.now += 10
+    assert buffer.flush() == 2
+    assert buffer.pending() == 0
+    assert buffer.stats()['dropped'] == 1
+    assert [a.question_number for a in answers_of(state.session_id)] == [1, 3]
+
+    # The next flush is a normal bulk flush again
+    state.current_question = 4
+    buffer.record(state, 0, True)
+    assert buffer.flush() == 1
+
+
+def test_rows_survive_a_database_outage(make_user, monkeypatch):
+    from app import db
+    state = quiz_session(make_user)
+    clock = FakeClock()
+    buffer = AnswerBuffer(durability='buffered', flush_size=100, flush_interval=5, clock=clock)
+    for question in (1, 2):
+        state.current_question = question
+        buffer.record(state, 0, True)
+
+    attempts = []
+
+    def unreachable(*args, **kwargs):
+        attempts.append(clock.now)
+        raise OperationalError('INSERT', {}, Exception('connection refused'))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, 'execute', unreachable)
+        for _ in range(10):
+            buffer.flush()
+            clock.now += 1
+        clock.now = 200
+        for _ in range(5):
+            buffer.flush()
+            clock.now += 100
+
+    # Waits double from the flush interval: 5, 10, 20, 40, 80, then 160 (the one at 600 is skipped)
+    assert attempts == [0, 5, 200, 300, 400, 500]
+    assert buffer.pending() == 2 and buffer.stats()['dropped'] == 0
+
+    clock.now += 300
+    assert buffer.flush() == 2
+    assert [a.question_number for a in answers_of(state.session_id)] == [1, 2]
+
+
+def test_the_buffer_is_bounded(make_user):
+    state = quiz_session(make_user)
+    buffer = AnswerBuffer(durability='buffered', flush_size=100, max_pending=3)
+    for question in range(1, 6):
+        state.current_question = question
+        buffer.record(state, 0, True)
+
+    assert buffer.pending() == 3 and buffer.stats()['dropped'] == 2
+    assert buffer.flush() == 3
+    assert [a.question_number for a in answers_of(state.session_id)] == [3, 4, 5]
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from bot.async_runtime import AsyncVocabularyBot, LoopBot
+
+
+class FakeAsyncBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        # Earlier messages take longer: without ordering they would arrive last
+        await asyncio.sleep(0.02 if text == 'first' else 0)
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+    async def send_poll(self, chat_id, question, options):
+        return SimpleNamespace(poll=SimpleNamespace(id='poll-1'))
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def attached(bot, loop):
+    async def attach():
+        bot.attach(loop)
+    asyncio.run_coroutine_threadsafe(attach(), loop).result(1)
+    return bot
+
+
+def test_sends_return_futures_and_keep_the_chat_order(loop):
+    async_bot = FakeAsyncBot()
+    bot = attached(LoopBot(async_bot), loop)
+
+    first = bot.send_message(1, 'first')
+    other_chat = bot.send_message(2, 'other')
+    second = bot.send_message(1, 'second')
+    assert not first.done()  # the caller did not wait for Telegram
+
+    assert second.result(1).text == 'second'
+    assert first.done() and other_chat.result(1)
+    assert [text for chat_id, text in async_bot.sent if chat_id == 1] == ['first', 'second']
+    assert async_bot.sent[0] == (2, 'other')
+
+
+def test_calls_whose_result_is_needed_still_wait(loop):
+    bot = attached(LoopBot(FakeAsyncBot()), loop)
+
+    assert bot.send_poll(1, 'question?', ['a', 'b']).poll.id == 'poll-1'
+
+
+class FakePollingBot:
+    def __init__(self, updates):
+        self.batches = [updates]
+        self.fetches = 0
+        self.handling = 0
+        self.most_handling = 0
+        self.release = asyncio.Event()
+        self.handled = []
+
+    async def get_updates(self, offset=None, timeout=None, request_timeout=None):
+        self.fetches += 1
+        if self.batches:
+            return self.batches.pop()
+        await asyncio.sleep(3600)
+
+    async def process_new_updates(self, updates):
+        self.handling += 1
+        self.most_handling = max(self.most_handling, self.handling)
+        await self.release.wait()
+        self.handling -= 1
+        self.handled.extend(update.update_id for update in updates)
+
+
+def test_polling_stops_while_every_inflight_slot_is_taken():
+    async def scenario():
+        runtime = AsyncVocabularyBot.__new__(AsyncVocabularyBot)
+        runtime.bot = FakePollingBot([SimpleNamespace(update_id=n) for n in range(10)])
+        runtime._inflight = asyncio.Semaphore(3)
+        runtime._tasks = set()
+        polling = asyncio.create_task(runtime.poll())
+        await asyncio.sleep(0.05)
+
+        # Only three tasks exist for the ten updates, and no more updates were fetched
+        assert runtime.bot.most_handling == 3 and len(runtime._tasks) == 3
+        assert runtime.bot.fetches == 1
+
+        runtime.bot.release.set()
+        await asyncio.sleep(0.05)
+        polling.cancel()
+        return runtime.bot
+
+    bot = asyncio.run(scenario())
+    assert bot.handled == list(range(10))
+    assert bot.most_handling == 3
+    assert bot.fetches == 2
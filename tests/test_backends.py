@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+from utils.backends import BackendUnavailable, CircuitBreaker, InMemoryBackend, ResilientBackend, TranslationBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BlockingBackend(TranslationBackend):
+    """Answers only once released"""
+
+    def __init__(self, name, answer='ответ'):
+        self.name = name
+        self.answer = answer
+        self.release = threading.Event()
+        self.calls = 0
+
+    def translate(self, text, source_lang, target_lang):
+        self.calls += 1
+        self.release.wait(5)
+        return self.answer
+
+
+def test_breaker_opens_past_the_error_threshold():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=10, min_calls=4, error_threshold=0.5, reset_timeout=30, clock=clock)
+    for success in (True, False, False):
+        breaker.record(success)
+    assert breaker.state == CircuitBreaker.CLOSED  # fewer than min_calls
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_opens_for_one_trial_after_the_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, error_threshold=0.0, reset_timeout=30, clock=clock)
+    breaker.record(False)
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # one trial at a time
+
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_resilient_backend_fails_over_to_the_next_backend():
+    primary = InMemoryBackend(fail=True, name='primary')
+    secondary = InMemoryBackend({'cat': 'кот'}, name='secondary')
+    backend = ResilientBackend([primary, secondary], timeout=2, hedge_delay=None)
+
+    assert backend.translate('cat', 'en', 'ru') == 'кот'
+    stats = backend.stats()
+    assert stats['primary']['errors'] == 1
+    assert stats['secondary']['calls'] == 1
+
+
+def test_resilient_backend_hedges_a_slow_primary():
+    primary = BlockingBackend('primary', 'медленно')
+    secondary = InMemoryBackend({'cat': 'кот'}, name='secondary')
+    backend = ResilientBackend([primary, secondary], timeout=2, hedge_delay=0.05)
+    try:
+        assert backend.translate('cat', 'en', 'ru') == 'кот'
+        assert backend.stats()['secondary']['hedges'] == 1
+    finally:
+        primary.release.set()
+
+
+def test_resilient_backend_times_out():
+    slow = BlockingBackend('slow')
+    backend = ResilientBackend([slow], timeout=0.1, hedge_delay=None)
+    try:
+        with pytest.raises(BackendUnavailable):
+            backend.translate('cat', 'en', 'ru')
+    finally:
+        slow.release.set()
+
+
+def test_resilient_backend_skips_open_breakers():
+    failing = InMemoryBackend(fail=True, name='failing')
+    backend = ResilientBackend([failing], timeout=1, hedge_delay=None,
+                               breaker_factory=lambda name: CircuitBreaker(name, min_calls=1, error_threshold=0.0))
+    with pytest.raises(BackendUnavailable):
+        backend.translate('cat', 'en', 'ru')
+    with pytest.raises(BackendUnavailable, match='open'):
+        backend.translate('cat', 'en', 'ru')
+    assert failing.calls == 1
+
+
+def test_google_backend_keeps_concurrent_requests_apart(monkeypatch):
+    import deep_translator.google
+    from types import SimpleNamespace
+    from utils.backends import GoogleBackend
+
+    words = ['cat', 'dog', 'house', 'tree']
+    # Every request has set its text before any of them is read
+    all_sent = threading.Barrier(len(words), timeout=5)
+
+    def fake_get(url, params=None, proxies=None):
+        try:
+            all_sent.wait()
+        except threading.BrokenBarrierError:
+            pass
+        text = f'<div class="t0">{params["q"]}-ru</div>'
+        return SimpleNamespace(status_code=200, text=text, close=lambda: None)
+
+    monkeypatch.setattr(deep_translator.google.requests, 'get', fake_get)
+    backend = GoogleBackend()
+    results = {}
+
+    def translate(word):
+        results[word] = backend.translate(word, 'en', 'ru')
+
+    threads = [threading.Thread(target=translate, args=(word,)) for word in words]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == {word: f'{word}-ru' for word in words}
@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import date
+
+import pytest
+from sqlalchemy import update
+from telebot.apihelper import ApiTelegramException
+
+from bot.broadcast import DUE_REMINDER, BroadcastEngine
+
+
+class HeldOutbound:
+    """Outbound queue whose sends stay pending until released"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, method, chat_id, args=(), kwargs=None, priority=0):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def release(self):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(True)
+
+
+@pytest.fixture
+def due_run(app_context):
+    """A due-reminder run over two fresh users with unreviewed words"""
+    from app import db
+    from models import BroadcastRun, User, Word
+    users, telegram_ids = [], []
+    for _ in range(2):
+        user = User(telegram_id=str(uuid.uuid4().int % 10 ** 12), username='reader')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Word(user_id=user.id, english_word='cat', translation='кот'))
+        users.append(user.id)
+        telegram_ids.append(user.telegram_id)
+    db.session.commit()
+
+    def start(engine, day):
+        run_id = engine.start(DUE_REMINDER, day)
+        # Other tests' users are not part of this run
+        db.session.execute(update(BroadcastRun).where(BroadcastRun.id == run_id).values(last_user_id=users[0] - 1))
+        db.session.commit()
+        return run_id
+    start.telegram_ids = telegram_ids
+    return start
+
+
+class BlockedOutbound:
+    """Outbound queue whose every recipient has blocked the bot"""
+
+    def __init__(self):
+        self.chat_ids = []
+
+    def submit(self, method, chat_id, args=(), kwargs=None, priority=0):
+        self.chat_ids.append(chat_id)
+        future = Future()
+        future.set_exception(ApiTelegramException(method, None, {
+            'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}))
+        return future
+
+
+def run_state(run_id):
+    from app import db
+    from models import BroadcastRun
+    db.session.expire_all()
+    return db.session.get(BroadcastRun, run_id)
+
+
+def test_a_slow_batch_keeps_its_run_from_being_claimed(due_run):
+    outbound = HeldOutbound()
+    engine = BroadcastEngine(outbound, lease=0.3)
+    run_id = due_run(engine, date(2030, 1, 1))
+    started = run_state(run_id).updated_at
+
+    sender = threading.Thread(target=engine.run, args=(run_id,))
+    sender.start()
+    time.sleep(0.6)
+
+    # Two lease periods into the batch, nobody else may take the run over
+    assert run_state(run_id).updated_at > started
+    assert BroadcastEngine(HeldOutbound(), lease=0.3).claim_stale_runs() == []
+
+    outbound.release()
+    sender.join(2)
+    run = run_state(run_id)
+    assert (run.status, run.sent) == ('done', 2)
+
+
+def test_sends_that_outlast_the_timeout_are_dropped(due_run):
+    outbound = HeldOutbound()
+    engine = BroadcastEngine(outbound, send_timeout=0.1)
+    run_id = due_run(engine, date(2030, 1, 2))
+
+    began = time.monotonic()
+    engine.run(run_id)
+
+    assert time.monotonic() - began < 2
+    run = run_state(run_id)
+    assert (run.status, run.sent, run.failed) == ('done', 0, 2)
+    assert all(future.cancelled() for future in outbound.futures)
+
+
+def test_users_who_blocked_the_bot_are_unblocked_by_their_next_message(due_run, fake_bot, dictionary_path):
+    from types import SimpleNamespace
+    from app import db
+    from bot.handlers import BotHandlers
+    from models import BlockedUser
+    from utils.translator import Translator
+    handlers = BotHandlers(fake_bot, Translator(offline=True))
+    engine = BroadcastEngine(BlockedOutbound(), on_blocked=handlers.forget_users)
+    run_id = due_run(engine, date(2030, 1, 3))
+    # Both users talked to the bot recently: their identities are cached
+    users = [handlers.get_or_create_user(SimpleNamespace(id=int(telegram_id), username='reader', first_name='R'))
+             for telegram_id in due_run.telegram_ids]
+
+    engine.run(run_id)
+    assert run_state(run_id).blocked == 2
+    assert db.session.query(BlockedUser).filter(BlockedUser.user_id.in_([u.id for u in users])).count() == 2
+
+    # Their next message is not answered from the cache: it lifts the block
+    for user in users:
+        handlers.get_or_create_user(SimpleNamespace(id=int(user.telegram_id), username='reader', first_name='R'))
+    assert db.session.query(BlockedUser).filter(BlockedUser.user_id.in_([u.id for u in users])).count() == 0
@@ -0,0 +1,93 @@
+import random
+from collections import Counter
+
+from database.pagination import decode_cursor, encode_cursor, word_page
+from database.sampling import sample_words
+
+
+def test_small_vocabulary_is_sampled_without_repeats(make_user):
+    user_id = make_user(words=30)
+    rows = sample_words(user_id, 20, rng=random.Random(1))
+    assert len(rows) == 20
+    assert len({row.id for row in rows}) == 20
+    assert len(sample_words(user_id, 50, rng=random.Random(1))) == 30
+
+
+def test_only_the_users_words_are_sampled(make_user):
+    make_user(words=50)
+    user_id = make_user(words=200)
+    make_user(words=50)
+
+    rows = sample_words(user_id, 20, rng=random.Random(2))
+
+    assert len({row.id for row in rows}) == 20
+    from models import Word
+    owned = {w.id for w in Word.query.filter_by(user_id=user_id)}
+    assert {row.id for row in rows} <= owned
+    assert sample_words(make_user(), 20) == []
+
+
+def test_every_word_is_equally_likely_despite_id_gaps(make_user):
+    from app import db
+    from models import Word
+    user_id, other_id = make_user(), make_user()
+    # Long runs of another user's ids before some of this user's words
+    for i in range(20):
+        if i % 5 == 0:
+            db.session.add_all(Word(user_id=other_id, english_word=f'gap{i}-{n}', translation='x')
+                               for n in range(40))
+            db.session.flush()
+        db.session.add(Word(user_id=user_id, english_word=f'word{i}', translation=f'слово{i}'))
+        db.session.flush()
+    db.session.commit()
+
+    rng = random.Random(4)
+    picks = Counter(row.english_word for _ in range(1000) for row in sample_words(user_id, 5, rng=rng))
+
+    # 1000 draws of 5 out of 20: 250 each, standard deviation about 14
+    assert len(picks) == 20
+    assert all(180 < seen < 320 for seen in picks.values())
+
+
+def test_cursor_round_trip():
+    from datetime import datetime
+    when = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(when, 42)) == (when, 42)
+
+
+def page_words(page):
+    return [row.english_word for row in page.words]
+
+
+def test_keyset_pages_newest_first_and_back(make_user):
+    user_id = make_user(words=7)
+
+    first = word_page(user_id, 3)
+    assert page_words(first) == ['word6', 'word5', 'word4']
+    assert first.newer is None and first.older
+
+    second = word_page(user_id, 3, older_than=first.older)
+    assert page_words(second) == ['word3', 'word2', 'word1']
+    last = word_page(user_id, 3, older_than=second.older)
+    assert page_words(last) == ['word0']
+    assert last.older is None and last.newer
+
+    back = word_page(user_id, 3, newer_than=last.newer)
+    assert page_words(back) == page_words(second)
+    assert word_page(user_id, 3, newer_than=back.newer).newer is None
+
+
+def test_keyset_pages_break_date_ties_by_id(make_user):
+    user_id = make_user(words=5, same_time=True)
+    seen = []
+    page = word_page(user_id, 2)
+    while True:
+        seen += page_words(page)
+        if page.older is None:
+            break
+        page = word_page(user_id, 2, older_than=page.older)
+    assert seen == ['word4', 'word3', 'word2', 'word1', 'word0']
+
+
+def test_empty_vocabulary_has_no_pages(make_user):
+    assert word_page(make_user(), 10) == ([], None, None)
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from bot.dispatcher import UpdateDispatcher
+
+
+@pytest.fixture
+def dispatchers():
+    created = []
+
+    def make(**kwargs):
+        dispatcher = UpdateDispatcher(**kwargs)
+        created.append(dispatcher)
+        return dispatcher
+    yield make
+    for dispatcher in created:
+        dispatcher.shutdown(wait=False)
+
+
+def noop(*args):
+    pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_updates_of_one_chat_run_in_order(dispatchers):
+    dispatcher = dispatchers(workers=4, queue_size=1000)
+    seen = {chat: [] for chat in range(8)}
+
+    def handle(chat, n):
+        # Later updates of a chat would overtake a slow one if the chat ran on several threads
+        if n % 7 == 0:
+            time.sleep(0.001)
+        seen[chat].append(n)
+
+    for n in range(100):
+        for chat in seen:
+            assert dispatcher.submit(chat, handle, chat, n)
+    wait_for(lambda: dispatcher.processed == 800)
+
+    assert all(numbers == list(range(100)) for numbers in seen.values())
+
+
+def test_a_slow_chat_does_not_hold_up_other_shards(dispatchers):
+    dispatcher = dispatchers(workers=2, queue_size=10)
+    release = threading.Event()
+    done = threading.Event()
+    dispatcher.submit(0, release.wait)
+    dispatcher.submit(1, done.set)
+
+    assert done.wait(2)
+    release.set()
+
+
+def test_a_full_shard_sheds_at_once_with_put_timeout_zero(dispatchers):
+    shed = []
+    dispatcher = dispatchers(workers=1, queue_size=2, put_timeout=0,
+                             on_shed=lambda chat_id, *args: shed.append((chat_id, args)))
+    release = threading.Event()
+    started = threading.Event()
+    dispatcher.submit(5, lambda: (started.set(), release.wait()))
+    assert started.wait(2)
+
+    assert dispatcher.submit(5, noop, 'first')
+    assert dispatcher.submit(6, noop, 'second')
+    began = time.monotonic()
+    assert not dispatcher.submit(7, noop, 'third')
+    assert time.monotonic() - began < 0.1
+    assert shed == [(7, ('third',))]
+
+    release.set()
+    wait_for(lambda: dispatcher.processed == 3)
+    stats = dispatcher.stats()
+    assert (stats['submitted'], stats['processed'], stats['shed']) == (3, 3, 1)
+    assert stats['max_depth'] == [2]
+
+
+def test_a_full_shard_waits_put_timeout_before_shedding(dispatchers):
+    dispatcher = dispatchers(workers=1, queue_size=1, put_timeout=0.2)
+    release = threading.Event()
+    started = threading.Event()
+    dispatcher.submit(1, lambda: (started.set(), release.wait()))
+    assert started.wait(2)
+    dispatcher.submit(1, lambda: None)
+
+    began = time.monotonic()
+    assert not dispatcher.submit(1, lambda: None)
+    assert time.monotonic() - began >= 0.2
+
+    # Room frees up while the submitter waits: the update is queued, not shed
+    threading.Timer(0.05, release.set).start()
+    assert dispatcher.submit(1, lambda: None)
+    assert dispatcher.shed == 1
+
+
+def test_handler_errors_are_counted_and_the_shard_keeps_running(dispatchers):
+    dispatcher = dispatchers(workers=1)
+    done = threading.Event()
+    dispatcher.submit(1, lambda: 1 / 0)
+    dispatcher.submit(1, done.set)
+
+    assert done.wait(2)
+    wait_for(lambda: dispatcher.processed == 2)
+    assert dispatcher.failed == 1
@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bot.distractors import DistractorEngine, NeighborTable
+
+WORDS = [
+    (1, 'house', 'дом'), (2, 'horse', 'лошадь'), (3, 'mouse', 'мышь'), (4, 'home', 'дом, жилище'),
+    (5, 'cat', 'кошка'), (6, 'car', 'машина'), (7, 'cart', 'тележка'), (8, 'card', 'карта'),
+    (9, 'water', 'вода'), (10, 'waiter', 'официант'), (11, 'winter', 'зима'), (12, 'window', 'окно'),
+]
+
+
+def test_neighbors_look_alike_and_exclude_synonyms():
+    table = NeighborTable(neighbors=3)
+    table.build(WORDS)
+    assert set(table.neighbors(1)) <= {2, 3, 12, 10, 9, 11}
+    assert table.neighbors(1)[0] in (2, 3)
+    # 'home' shares the translation 'дом' with 'house': it would be a second right answer
+    assert 4 not in table.neighbors(1)
+    assert 1 not in table.neighbors(4)
+
+
+def test_incremental_adds_match_a_full_build():
+    built = NeighborTable(neighbors=4)
+    built.build(WORDS)
+    grown = NeighborTable(neighbors=4)
+    for word in WORDS:
+        grown.add(*word)
+    for word_id, _, _ in WORDS:
+        # Same similarities row by row (ties may list different words)
+        np.testing.assert_allclose(grown._neighbor_sims[grown._rows[word_id]],
+                                   built._neighbor_sims[built._rows[word_id]], rtol=1e-5)
+
+
+def test_remove_recomputes_affected_rows():
+    table = NeighborTable(neighbors=3)
+    table.build(WORDS)
+    table.remove(2)
+    assert 2 not in table
+    assert len(table) == len(WORDS) - 1
+    assert all(2 not in table.neighbors(word_id) for word_id, _, _ in WORDS if word_id != 2)
+    assert len(table.neighbors(1)) == 3
+
+
+def test_buffers_grow_geometrically():
+    table = NeighborTable(neighbors=2)
+    capacities = set()
+    for i in range(1000):
+        table.add(i, f'word{i}', f'слово{i}')
+        capacities.add(len(table._vector_buffer))
+    assert len(table) == 1000
+    assert len(capacities) <= 8  # 16, 32, ... 1024
+    assert table._vectors.shape[0] == 1000
+
+
+def test_pick_returns_translations_of_neighbors():
+    table = NeighborTable(neighbors=3)
+    table.build(WORDS)
+    picked = table.pick(5, 2, rng=random.Random(1))
+    translations = {t for _, _, t in WORDS}
+    assert len(picked) == 2 and set(picked) <= translations and 'кошка' not in picked
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_tables_are_built_in_the_background(monkeypatch):
+    engine = DistractorEngine()
+    building = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def build(user_id):
+        builds.append(user_id)
+        if user_id == 1:
+            building.set()
+            release.wait(5)
+        table = NeighborTable(engine.neighbors)
+        table.build(WORDS)
+        engine._tables.set(user_id, table)
+        return table
+
+    monkeypatch.setattr(engine, '_build', build)
+    # A quiz never waits for a build: random distractors until the table is ready
+    assert engine.pick(1, 1) == []
+    assert building.wait(5)
+    assert engine.table(1) is None and builds == [1]
+
+    # A slow build does not hold up other users' tables
+    assert engine.table(2) is None
+    assert wait_for(lambda: engine.table(2) is not None)
+
+    release.set()
+    assert wait_for(lambda: engine.table(1) is not None)
+    assert len(engine.pick(1, 1)) == 3
+    assert builds == [1, 2] and engine._building == set()
+
+
+def test_vocabularies_over_the_cap_get_no_table(make_user):
+    small, large = make_user(words=4), make_user(words=12)
+    engine = DistractorEngine(max_words=5)
+
+    assert engine.table(small) is None and engine.table(large) is None
+    assert wait_for(lambda: engine.table(small) is not None and not engine._building)
+    assert len(engine.table(small)) == 4
+    assert engine.table(large) is None and engine._oversized.get(large)
+    assert engine._building == set()
+
+
+def test_poll_options_are_distinct(fake_bot, monkeypatch):
+    from bot.quiz import QuizManager
+    from bot.quiz_state import QuizState
+    from bot.scheduler import Scheduler
+    scheduler = Scheduler(workers=1)
+    quiz = QuizManager(fake_bot, scheduler=scheduler)
+    try:
+        ids, english, translations = zip(*WORDS)
+        quiz.active_quizzes[5] = QuizState(5, 3, 7, 'all', 1, ids, english, translations)
+        # Look-alike picks can share a translation with each other or with the answer
+        monkeypatch.setattr(quiz.distractors, 'pick', lambda *args: ['дом', 'дом', 'лошадь'])
+        for _ in range(len(WORDS)):
+            quiz.active_quizzes[5].current_question = 0
+            quiz._send_poll_question(5)
+    finally:
+        scheduler.shutdown()
+
+    polls = [kwargs['options'] for name, args, kwargs in fake_bot.calls if name == 'send_poll']
+    assert len(polls) == len(WORDS)
+    assert all(len(options) == 4 == len(set(options)) for options in polls)
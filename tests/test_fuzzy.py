@@ -0,0 +1,92 @@
+import pytest
+
+from utils.fuzzy import SymSpellIndex, edit_distance
+from utils.translator import Translator
+from utils.backends import InMemoryBackend
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('house', 'house', 0),
+    ('house', 'hose', 1),
+    ('house', 'huose', 1),   # adjacent swap is one edit
+    ('house', 'horse', 1),
+    ('beautiful', 'beatiful', 1),
+    ('kitten', 'sitting', 3),
+])
+def test_edit_distance(a, b, expected):
+    assert edit_distance(a, b, 3) == expected
+
+
+def test_edit_distance_stops_past_the_limit():
+    assert edit_distance('abcdef', 'uvwxyz', 2) == 3
+    assert edit_distance('a', 'abcd', 1) == 2
+
+
+def test_symspell_finds_close_words_closest_first():
+    index = SymSpellIndex(max_distance=2)
+    index.build(['house', 'horse', 'mouse', 'beautiful', 'because'])
+    assert index.lookup('house') == [('house', 0)]
+    assert index.lookup('huose') == [('house', 1), ('horse', 2), ('mouse', 2)]
+    assert index.lookup('beatiful')[0] == ('beautiful', 1)
+    assert index.lookup('hous', limit=2) == [('house', 1), ('horse', 2)]
+    assert index.lookup('qqqqqq') == []
+
+
+def test_symspell_respects_a_smaller_distance():
+    index = SymSpellIndex(max_distance=2)
+    index.build(['house'])
+    assert index.lookup('hxusx', max_distance=1) == []
+    assert index.lookup('hxusx') == [('house', 2)]
+
+
+def test_symspell_matches_past_the_prefix():
+    index = SymSpellIndex(max_distance=2, prefix_length=4)
+    index.build(['understand'])
+    assert index.lookup('understnad') == [('understand', 1)]
+
+
+def test_short_words_only_get_one_edit_suggestions(dictionary_path):
+    translator = Translator(offline=True)
+    # Two edits away from a headword: real words such as these must not be "corrected"
+    assert translator.suggest('milk') == []
+    assert translator.suggest('chair') == []
+    assert translator.suggest('bird') == []
+    assert translator.suggest('hose') == ['house']
+    assert translator.suggest('beatifull') == ['beautiful']
+
+
+def suggestion_call(data, chat_id=1001):
+    from types import SimpleNamespace
+    return SimpleNamespace(id='cb', data=data, from_user=SimpleNamespace(id=chat_id),
+                           message=SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=7))
+
+
+def test_typo_gets_local_suggestions_without_a_remote_call(dictionary_path, fake_bot, make_message):
+    from bot.handlers import BotHandlers
+    backend = InMemoryBackend({'fish': 'рыба', 'zebra': 'зебра'})
+    translator = Translator(offline=False, persistent_cache=False, backends=[backend])
+    handlers = BotHandlers(fake_bot, translator)
+
+    handlers.handle_text_message(make_message('fish'))   # one edit from 'wish'
+    assert 'Did you mean' in fake_bot.texts()[0]
+    assert backend.calls == 0
+
+    # Nothing close in the dictionary: the remote backend answers
+    handlers.handle_text_message(make_message('zebra'))
+    assert 'зебра' in fake_bot.texts()[1]
+    assert backend.calls == 1
+
+
+def test_translate_anyway_asks_the_remote_backend_again(dictionary_path, fake_bot):
+    from bot.handlers import BotHandlers
+    backend = InMemoryBackend({})
+    translator = Translator(offline=False, persistent_cache=False, backends=[backend])
+    handlers = BotHandlers(fake_bot, translator)
+    assert translator.translate('fish') is None  # the miss is remembered
+
+    backend.translations['fish'] = 'рыба'
+    handlers._handle_suggestion(suggestion_call('translate:fish'), 'translate:fish')
+
+    edits = [args[0] for name, args, kwargs in fake_bot.calls if name == 'edit_message_text']
+    assert 'рыба' in edits[0]
+    assert backend.calls == 2
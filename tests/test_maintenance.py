@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import text
+
+from database import maintenance
+from database.maintenance import SchemaError, ensure_indexes, find_duplicate_words, merge_duplicate_words
+
+
+@pytest.fixture
+def without_unique_index(app_context):
+    """Drop the unique word index (as in a database from before it existed); restored afterwards"""
+    from app import db
+    db.session.execute(text(f"DROP INDEX {maintenance.UNIQUE_WORDS_INDEX}"))
+    db.session.commit()
+    yield db
+    db.session.rollback()
+    # Leave no duplicates behind for other tests, then put the index back
+    merge_duplicate_words(db)
+    ensure_indexes(db)
+
+
+def add_words(db, user_id, *words):
+    ids = []
+    for word in words:
+        ids.append(db.session.execute(
+            text("INSERT INTO words (user_id, english_word, translation) VALUES (:u, :w, 'перевод')"),
+            {'u': user_id, 'w': word}).lastrowid)
+    db.session.commit()
+    return ids
+
+
+def test_startup_fails_instead_of_deleting_duplicates(make_user, without_unique_index):
+    db = without_unique_index
+    user_id = make_user()
+    ids = add_words(db, user_id, 'Cat', 'cat', 'dog')
+
+    with pytest.raises(SchemaError, match='duplicate-words'):
+        ensure_indexes(db)
+
+    assert find_duplicate_words(db) == [(user_id, 'cat', ids[:2])]
+    assert db.session.execute(text("SELECT COUNT(*) FROM words WHERE user_id = :u"), {'u': user_id}).scalar() == 3
+
+
+def test_merge_keeps_the_oldest_word_and_its_history(make_user, without_unique_index):
+    db = without_unique_index
+    user_id = make_user()
+    keep, duplicate = add_words(db, user_id, 'House', 'house')
+    db.session.execute(text("INSERT INTO word_reviews (word_id, user_id, easiness, interval, repetitions, due_at) "
+                            "VALUES (:w, :u, 2.5, 6, 2, '2024-01-01')"), {'w': duplicate, 'u': user_id})
+    db.session.commit()
+
+    assert merge_duplicate_words(db) == 1
+    ensure_indexes(db)
+
+    words = db.session.execute(text("SELECT id FROM words WHERE user_id = :u"), {'u': user_id}).scalars().all()
+    assert words == [keep]
+    review = db.session.execute(text("SELECT word_id, interval FROM word_reviews WHERE user_id = :u"),
+                                {'u': user_id}).one()
+    assert tuple(review) == (keep, 6)
+    assert maintenance.UNIQUE_WORDS_INDEX in maintenance._existing_index_names(db)
+    with pytest.raises(Exception):
+        add_words(db, user_id, 'HOUSE')
@@ -0,0 +1,45 @@
+import pytest
+
+from utils.morphology import english_lemmas, lemma_candidates, russian_lemmas
+
+
+@pytest.mark.parametrize('form, lemma', [
+    ('cats', 'cat'),
+    ('cities', 'city'),
+    ('wolves', 'wolf'),
+    ('boxes', 'box'),
+    ('running', 'run'),
+    ('making', 'make'),
+    ('stopped', 'stop'),
+    ('studied', 'study'),
+    ('bigger', 'big'),
+    ('happiest', 'happy'),
+    ('happily', 'happy'),
+    ('ran', 'run'),
+    ('children', 'child'),
+    ('left', 'leave'),
+])
+def test_english_lemmas(form, lemma):
+    assert lemma in english_lemmas(form)
+
+
+def test_english_lemmas_exclude_the_word_itself():
+    assert 'glass' not in english_lemmas('glass')
+    assert english_lemmas('glass') == ()
+    assert 'friend' not in english_lemmas('friendly')
+
+
+@pytest.mark.parametrize('form, lemma', [
+    ('кошки', 'кошка'),
+    ('книгами', 'книга'),
+    ('красивого', 'красивый'),
+    ('читает', 'читать'),
+    ('ёлки', 'елка'),
+])
+def test_russian_lemmas(form, lemma):
+    assert lemma in russian_lemmas(form)
+
+
+def test_lemma_candidates_by_language():
+    assert lemma_candidates('cats', 'en') == english_lemmas('cats')
+    assert lemma_candidates('кошки', 'ru') == russian_lemmas('кошки')
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from bot.outbound import BACKGROUND, INTERACTIVE, OutboundBot, OutboundQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingBot:
+    """Records sends; answers 429 to the first `limited` of them"""
+
+    def __init__(self, limited=0, retry_after=5):
+        self.sent = []
+        self.limited = limited
+        self.retry_after = retry_after
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def _send(self, method, chat_id, text):
+        self.gate.wait()
+        with self._lock:
+            if self.limited:
+                self.limited -= 1
+                raise ApiTelegramException(method, None, {
+                    'error_code': 429, 'description': 'Too Many Requests',
+                    'parameters': {'retry_after': self.retry_after}})
+            self.sent.append((chat_id, text))
+        return text
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._send('sendMessage', chat_id, text)
+
+    def send_poll(self, chat_id, question, options, **kwargs):
+        return self._send('sendPoll', chat_id, question)
+
+
+def advance(queue, clock, seconds):
+    """Move the fake clock forward and wake the sender thread"""
+    clock.now += seconds
+    with queue._condition:
+        queue._condition.notify()
+
+
+def settle(queue, clock, steps=10):
+    """Let a few milliseconds pass: enough for the global bucket, not for a chat's next token"""
+    for _ in range(steps):
+        advance(queue, clock, 0.001)
+        time.sleep(0.005)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+@pytest.fixture
+def queues():
+    created = []
+
+    def make(bot, **kwargs):
+        kwargs.setdefault('global_rate', 1000)
+        kwargs.setdefault('chat_rate', 1)
+        kwargs.setdefault('chat_burst', 3)
+        queue = OutboundQueue(bot, workers=kwargs.pop('workers', 4), **kwargs)
+        created.append(queue)
+        return queue
+    yield make
+    for queue in created:
+        queue.bot.gate.set()
+        queue.shutdown()
+
+
+def test_a_chat_gets_its_burst_then_its_rate(queues):
+    clock, bot = FakeClock(), RecordingBot()
+    queue = queues(bot, clock=clock)
+    futures = [queue.submit('send_message', 1, (1, f'm{n}')) for n in range(5)]
+
+    settle(queue, clock)
+    assert len(bot.sent) == 3
+
+    advance(queue, clock, 1)
+    assert wait_for(lambda: len(bot.sent) == 4)
+    settle(queue, clock)
+    assert len(bot.sent) == 4
+    advance(queue, clock, 1)
+    assert [f.result(1) for f in futures] == ['m0', 'm1', 'm2', 'm3', 'm4']
+    assert bot.sent == [(1, f'm{n}') for n in range(5)]
+
+
+def test_the_global_bucket_spaces_out_sends_to_different_chats(queues):
+    clock, bot = FakeClock(), RecordingBot()
+    queue = queues(bot, clock=clock, global_rate=2)
+    for chat_id in range(1, 5):
+        queue.submit('send_message', chat_id, (chat_id, 'hi'))
+
+    # No burst on the global bucket: one send, then one every half second
+    assert wait_for(lambda: len(bot.sent) == 1)
+    time.sleep(0.05)
+    assert len(bot.sent) == 1
+    for sent in (2, 3, 4):
+        advance(queue, clock, 0.5)
+        assert wait_for(lambda: len(bot.sent) == sent)
+
+
+def test_a_429_is_retried_after_retry_after(queues):
+    clock, bot = FakeClock(), RecordingBot(limited=1, retry_after=5)
+    queue = queues(bot, clock=clock)
+    first = queue.submit('send_message', 1, (1, 'first'))
+    second = queue.submit('send_message', 1, (1, 'second'))
+
+    assert wait_for(lambda: queue.rate_limited == 1)
+    advance(queue, clock, 4)
+    time.sleep(0.05)
+    assert bot.sent == []
+
+    advance(queue, clock, 1)
+    assert first.result(1) == 'first'
+    settle(queue, clock)
+    assert second.result(1) == 'second'
+    assert bot.sent == [(1, 'first'), (1, 'second')]  # the retried call keeps its place
+
+
+def test_a_call_fails_once_its_retries_are_used_up(queues):
+    clock, bot = FakeClock(), RecordingBot(limited=10, retry_after=1)
+    queue = queues(bot, clock=clock, max_retries=2)
+    future = queue.submit('send_message', 1, (1, 'hi'))
+
+    for attempt in (1, 2):
+        assert wait_for(lambda: queue.rate_limited == attempt)
+        advance(queue, clock, 1)
+    with pytest.raises(ApiTelegramException):
+        future.result(1)
+    assert queue.failed == 1
+
+
+def test_interactive_calls_go_before_background_calls(queues):
+    clock, bot = FakeClock(), RecordingBot()
+    queue = queues(bot, clock=clock, global_rate=1)
+    queue.submit('send_message', 1, (1, 'first'))
+    assert wait_for(lambda: len(bot.sent) == 1)
+
+    queue.submit('send_message', 2, (2, 'broadcast'), priority=BACKGROUND)
+    queue.submit('send_message', 3, (3, 'reply'), priority=INTERACTIVE)
+    advance(queue, clock, 1)
+    assert wait_for(lambda: len(bot.sent) == 2)
+    advance(queue, clock, 1)
+    assert wait_for(lambda: len(bot.sent) == 3)
+    assert [text for _, text in bot.sent] == ['first', 'reply', 'broadcast']
+
+
+def test_sends_do_not_wait_for_telegram(queues):
+    bot = RecordingBot()
+    bot.gate.clear()
+    outbound_bot = OutboundBot(bot, queues(bot))
+
+    future = outbound_bot.send_message(1, 'hi')
+    assert not future.done()
+
+    bot.gate.set()
+    assert future.result(1) == 'hi'
+
+
+def test_a_call_whose_caller_timed_out_is_not_sent(queues):
+    bot = RecordingBot()
+    bot.gate.clear()
+    queue = queues(bot, workers=1)
+    blocker = queue.submit('send_message', 1, (1, 'blocker'))
+    outbound_bot = OutboundBot(bot, queue, timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        outbound_bot.send_poll(2, 'question?', ['a', 'b'])
+
+    bot.gate.set()
+    blocker.result(1)
+    assert wait_for(lambda: queue.cancelled == 1)
+    assert bot.sent == [(1, 'blocker')]
+    assert queue.depth() == 0
@@ -0,0 +1,111 @@
+import json
+import random
+
+import pytest
+
+from bot.quiz_state import DatabaseQuizStore, FileQuizStore, QuizState
+
+
+def make_state(size=50, chat_id=42, session_id=7):
+    return QuizState(chat_id, 3, session_id, 'all', 20, range(1, size + 1),
+                     [f'word{i}' for i in range(size)], [f'слово{i}' for i in range(size)])
+
+
+def play(state, questions, rng):
+    asked = []
+    for _ in range(questions):
+        state.correct_position = state.next_word(rng)
+        state.correct_index = 0
+        state.current_question += 1
+        state.record_review(5)
+        state.score += 1
+        asked.append(state.correct_position)
+    return asked
+
+
+def test_next_word_deals_every_word_once_per_round():
+    state = make_state(size=10)
+    rng = random.Random(1)
+    assert sorted(play(state, 10, rng)) == list(range(10))
+    assert sorted(play(state, 10, rng)) == list(range(10))
+
+
+def test_distractors_are_distinct_and_exclude_the_answer():
+    state = make_state(size=5)
+    rng = random.Random(2)
+    for position in range(5):
+        picked = state.distractors(position, 3, rng)
+        assert len(set(picked)) == 3 and position not in picked
+    assert len(make_state(size=3).distractors(0, 3, rng)) == 2
+
+
+def test_progress_checkpoint_does_not_grow_with_the_vocabulary():
+    small, large = make_state(size=20), make_state(size=20000)
+    rng = random.Random(3)
+    play(small, 10, rng)
+    play(large, 10, rng)
+    small_size = len(json.dumps(small.progress_dict()))
+    large_size = len(json.dumps(large.progress_dict()))
+    assert large_size < small_size + 100
+    assert 'word_ids' not in large.progress_dict()
+
+
+def test_checkpoint_round_trip_continues_without_repeats():
+    state = make_state(size=12)
+    rng = random.Random(4)
+    asked = play(state, 5, rng)
+    state.poll_id = 'poll-1'
+
+    restored = QuizState.from_checkpoint(json.loads(json.dumps(state.deck_dict())),
+                                         json.loads(json.dumps(state.progress_dict())))
+
+    assert (restored.current_question, restored.score, restored.poll_id) == (5, 5, 'poll-1')
+    assert restored.reviews() == state.reviews()
+    assert restored.english == state.english
+    rest = play(restored, 7, rng)
+    assert sorted(asked + rest) == list(range(12))
+
+
+def test_progress_of_another_session_is_rejected():
+    state = make_state(session_id=1)
+    progress = state.progress_dict()
+    progress['session_id'] = 2
+    with pytest.raises(ValueError):
+        QuizState.from_checkpoint(state.deck_dict(), progress)
+
+
+def test_file_store(tmp_path):
+    store = FileQuizStore(str(tmp_path))
+    state = make_state()
+    store.start(state)
+    deck_written = (tmp_path / '42.deck.json').stat().st_mtime_ns
+    play(state, 3, random.Random(5))
+    store.save(state)
+
+    assert (tmp_path / '42.deck.json').stat().st_mtime_ns == deck_written
+    [restored] = store.load_all()
+    assert restored.current_question == 3 and restored.dealt == 3
+
+    store.delete(42)
+    assert store.load_all() == []
+
+
+def test_database_store():
+    from app import app
+    with app.app_context():
+        store = DatabaseQuizStore()
+        state = make_state(chat_id=4242, session_id=11)
+        store.start(state)
+        play(state, 4, random.Random(6))
+        store.save(state)
+
+        [restored] = [s for s in store.load_all() if s.chat_id == 4242]
+        assert (restored.session_id, restored.current_question, restored.score) == (11, 4, 4)
+
+        # A new quiz in the chat replaces the deck
+        store.start(make_state(chat_id=4242, session_id=12))
+        [restored] = [s for s in store.load_all() if s.chat_id == 4242]
+        assert (restored.session_id, restored.current_question) == (12, 0)
+
+        store.delete(4242)
+        assert [s for s in store.load_all() if s.chat_id == 4242] == []
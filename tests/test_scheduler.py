@@ -0,0 +1,101 @@
+import threading
+import time
+
+from bot.scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def advance(scheduler, clock, seconds):
+    """Move the fake clock forward and wake the timer thread"""
+    clock.now += seconds
+    with scheduler._condition:
+        scheduler._condition.notify()
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_tasks_fire_in_due_order_once_their_time_comes():
+    clock = FakeClock()
+    scheduler = Scheduler(workers=1, clock=clock)
+    fired = []
+    try:
+        scheduler.schedule(20, fired.append, 'b')
+        scheduler.schedule(10, fired.append, 'a')
+        scheduler.schedule(30, fired.append, 'c')
+
+        advance(scheduler, clock, 5)
+        time.sleep(0.05)
+        assert fired == []
+
+        advance(scheduler, clock, 20)
+        assert wait_for(lambda: fired == ['a', 'b'])
+        assert scheduler.pending() == 1
+
+        advance(scheduler, clock, 10)
+        assert wait_for(lambda: fired == ['a', 'b', 'c'])
+        assert scheduler.fired == 3
+    finally:
+        scheduler.shutdown()
+
+
+def test_cancel_by_key():
+    clock = FakeClock()
+    scheduler = Scheduler(workers=1, clock=clock)
+    fired = []
+    try:
+        scheduler.schedule(1, fired.append, 'chat1-q1', key=1)
+        scheduler.schedule(2, fired.append, 'chat1-q2', key=1)
+        scheduler.schedule(1, fired.append, 'chat2-q1', key=2)
+        assert scheduler.pending(1) == 2
+
+        assert scheduler.cancel(1) == 2
+        assert scheduler.pending(1) == 0
+        advance(scheduler, clock, 5)
+        assert wait_for(lambda: fired == ['chat2-q1'])
+        time.sleep(0.05)
+        assert fired == ['chat2-q1']
+        assert scheduler.cancel(1) == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_a_slow_task_does_not_delay_other_timers():
+    clock = FakeClock()
+    scheduler = Scheduler(workers=2, clock=clock)
+    release = threading.Event()
+    fired = []
+    try:
+        scheduler.schedule(1, release.wait, 5)
+        scheduler.schedule(2, fired.append, 'fast')
+        advance(scheduler, clock, 3)
+        assert wait_for(lambda: fired == ['fast'])
+    finally:
+        release.set()
+        scheduler.shutdown()
+
+
+def test_a_failing_task_is_logged_not_fatal():
+    clock = FakeClock()
+    scheduler = Scheduler(workers=1, clock=clock)
+    fired = []
+    try:
+        scheduler.schedule(1, lambda: 1 / 0)
+        scheduler.schedule(2, fired.append, 'after')
+        advance(scheduler, clock, 3)
+        assert wait_for(lambda: fired == ['after'])
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,47 @@
+from utils.search_index import NGramIndex
+
+
+def make_index():
+    index = NGramIndex(n=3)
+    index.build([(0, 'cat'), (1, 'category'), (2, 'dog'), (3, 'concatenate'), (4, 'scatter')])
+    return index
+
+
+def test_short_queries_read_one_posting_list():
+    index = make_index()
+    assert index.search('cat') == ([0, 1, 3, 4], 4)
+    assert index.search('o') == ([1, 2, 3], 3)
+    assert index.search('xyz') == ([], 0)
+
+
+def test_long_queries_are_verified():
+    index = make_index()
+    assert index.search('categ') == ([1], 1)
+    assert index.search('catt') == ([4], 1)
+    assert index.search('cate') == ([1, 3], 2)
+    assert index.search('tacat') == ([], 0)
+
+
+def test_pages_keep_the_total():
+    index = make_index()
+    assert index.search('cat', offset=1, limit=2) == ([1, 3], 4)
+    assert index.search('', limit=2) == ([0, 1], 5)
+
+
+def test_replace_and_remove():
+    index = make_index()
+    index.add(2, 'hotdog')
+    assert index.search('hot') == ([2], 1)
+    index.add(0, 'bird')
+    assert index.search('cat') == ([1, 3, 4], 3)
+    index.remove(1)
+    assert index.search('categ') == ([], 0)
+    assert len(index) == 4
+
+
+def test_ids_added_out_of_order_stay_sorted():
+    index = NGramIndex(n=2)
+    index.add(5, 'ab')
+    index.add(1, 'ab')
+    index.add(3, 'abc')
+    assert index.search('ab') == ([1, 3, 5], 3)
@@ -0,0 +1,94 @@
+import threading
+
+from utils.backends import InMemoryBackend
+from utils.lexicon import Lexicon
+from utils.translator import Translator
+
+
+def test_json_dictionary_builds_its_search_indexes_on_first_use(dictionary_path):
+    lexicon = Lexicon.load(str(dictionary_path))
+    assert lexicon.word_index is None and lexicon.fuzzy_index is None
+
+    assert [entry['word'] for entry in lexicon.search_words('ca')] == ['cat', 'car']
+    assert lexicon.suggest('dgo') == ['dog']
+    lexicon.add_word('cab', 'такси')
+    assert [entry['word'] for entry in lexicon.search_words('ca')] == ['cat', 'car', 'cab']
+
+
+def test_add_word_during_reload_survives_the_swap(dictionary_path, monkeypatch):
+    translator = Translator(offline=True)
+    translator.get_words_by_pattern('ca')  # the reload rebuilds indexes that are in use
+    loading = threading.Event()
+    release = threading.Event()
+    build = Lexicon._ensure_search_indexes
+
+    def slow_build(lexicon):
+        # Runs while the reload builds the new snapshot, before the swap
+        loading.set()
+        release.wait(5)
+        build(lexicon)
+
+    monkeypatch.setattr(Lexicon, '_ensure_search_indexes', slow_build)
+    reload = threading.Thread(target=translator.reload_dictionary)
+    reload.start()
+    assert loading.wait(5)
+
+    adder = threading.Thread(target=translator.add_word, args=('bird', 'птица'))
+    adder.start()
+    adder.join(2)
+    assert not adder.is_alive()  # indexing the new snapshot does not hold up add_word
+    release.set()
+    reload.join(5)
+    adder.join(5)
+
+    assert translator.translate('bird') == 'птица'
+    assert translator.translate('cat') == 'кот'
+    assert [entry['word'] for entry in translator.get_words_by_pattern('bir')] == ['bird']
+
+
+def test_inflected_form_uses_its_lemma_when_no_source_knows_it(dictionary_path):
+    translator = Translator(offline=True)
+    assert translator.translate('running') == 'бежать'
+    assert translator.translate('houses') == 'дом'
+    assert translator.get_cache_stats()['resolution']['lemma_hits'] == 2
+
+
+def test_inflected_forms_are_resolved_locally_before_going_remote(dictionary_path):
+    backend = InMemoryBackend({'cats': 'кошки', 'trees': 'деревья'})
+    translator = Translator(offline=False, persistent_cache=False, backends=[backend])
+
+    assert translator.translate('cats') == 'кот'
+    assert translator.translate('running') == 'бежать'
+    assert backend.calls == 0
+    # Neither the form nor its lemma is local: only now the remote backend is asked
+    assert translator.translate('trees') == 'деревья'
+    assert backend.calls == 1
+
+
+def test_local_only_pass_uses_lemmas_and_leaves_the_rest_to_remote(dictionary_path):
+    backend = InMemoryBackend({'trees': 'деревья'})
+    translator = Translator(offline=False, persistent_cache=False, backends=[backend])
+
+    assert translator.translate('houses', allow_remote=False) == 'дом'
+    assert translator.translate('trees', allow_remote=False) is None
+    assert translator.translate_many(['trees', 'cat']) == [('trees', 'деревья'), ('cat', 'кот')]
+
+
+def test_translate_many_keeps_input_order_and_fans_out_only_misses(dictionary_path):
+    backend = InMemoryBackend({'tree': 'дерево', 'milk': 'молоко'})
+    translator = Translator(offline=False, persistent_cache=False, backends=[backend])
+
+    pairs = translator.translate_many(['Tree', 'cat', 'milk', 'tree', 'qwerty'])
+
+    assert pairs == [('tree', 'дерево'), ('cat', 'кот'), ('milk', 'молоко'), ('qwerty', None)]
+    assert backend.calls == 3  # one call per distinct miss; 'cat' never left the dictionary
+
+
+def test_concurrent_lookups_of_one_word_share_a_remote_call(dictionary_path):
+    backend = InMemoryBackend({'oak': 'дуб'}, delay=0.1)
+    translator = Translator(offline=False, persistent_cache=False, backends=[backend])
+
+    futures = [translator._batch_executor.submit(translator.translate, 'oak') for _ in range(4)]
+
+    assert [f.result() for f in futures] == ['дуб'] * 4
+    assert backend.calls == 1
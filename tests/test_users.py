@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from database import upsert
+
+
+@contextmanager
+def statements():
+    """Collect the SQL statements run on the app's engine"""
+    from app import db
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement.split()[0].upper())
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield seen
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def handlers(fake_bot, dictionary_path):
+    from bot.handlers import BotHandlers
+    from utils.translator import Translator
+    return BotHandlers(fake_bot, Translator(offline=True))
+
+
+def telegram_user(user_id, username='tester'):
+    return SimpleNamespace(id=user_id, username=username, first_name='Test')
+
+
+def test_known_user_is_read_not_inserted(app_context, handlers):
+    created = handlers.get_or_create_user(telegram_user(5001))
+
+    handlers.user_cache.clear()
+    with statements() as seen:
+        identity = handlers.get_or_create_user(telegram_user(5001))
+
+    assert identity == created
+    assert 'INSERT' not in seen
+    assert 'DELETE' not in seen
+
+
+def test_a_blocked_user_writing_again_is_unblocked(app_context, handlers):
+    from app import db
+    from models import BlockedUser
+    created = handlers.get_or_create_user(telegram_user(5003))
+    db.session.add(BlockedUser(user_id=created.id, reason='bot was blocked by the user'))
+    db.session.commit()
+
+    handlers.user_cache.clear()
+    with statements() as seen:
+        handlers.get_or_create_user(telegram_user(5003))
+
+    assert seen.count('DELETE') == 1
+    assert db.session.query(BlockedUser).filter_by(user_id=created.id).count() == 0
+
+
+def test_new_user_is_created_once_and_cached(app_context, handlers):
+    with statements() as seen:
+        identity = handlers.get_or_create_user(telegram_user(5002, 'newbie'))
+    assert seen.count('INSERT') == 1
+    assert identity.username == 'newbie'
+
+    with statements() as seen:
+        assert handlers.get_or_create_user(telegram_user(5002)) == identity
+    assert seen == []
+
+
+def test_insert_ignore_falls_back_to_a_savepoint_on_other_dialects(app_context, monkeypatch):
+    from app import db
+    from models import User
+    monkeypatch.setattr(upsert, 'IGNORE_DIALECTS', ())
+    values = {'telegram_id': 'fallback-user', 'username': 'first'}
+
+    user_id = upsert.insert_ignore(db.session, User.__table__, values)
+    assert user_id is not None
+    assert upsert.insert_ignore(db.session, User.__table__, {**values, 'username': 'second'}) is None
+    db.session.commit()
+
+    assert User.query.filter_by(telegram_id='fallback-user').one().username == 'first'
+
+
+def test_words_shows_the_total_on_the_first_page(app_context, handlers, fake_bot, make_message):
+    from app import db
+    from models import Word
+    message = make_message('/words', chat_id=5005)
+    user = handlers.get_or_create_user(message.from_user)
+    db.session.add_all(Word(user_id=user.id, english_word=f'word{i}', translation=f'слово{i}') for i in range(60))
+    db.session.commit()
+
+    handlers.handle_words(message)
+
+    text = fake_bot.texts()[-1]
+    assert 'всего: 60 слов, стр. 1' in text
+    assert text.count('•') == 50
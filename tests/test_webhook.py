@@ -0,0 +1,97 @@
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import delete, update
+
+from bot import webhook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def no_lease(app_context):
+    from app import db
+    from models import BotLease
+    db.session.execute(delete(BotLease))
+    db.session.commit()
+    yield
+    db.session.execute(delete(BotLease))
+    db.session.commit()
+
+
+@pytest.fixture
+def client():
+    app = Flask('webhook_test')
+    app.add_url_rule('/hook', 'receive_update', webhook.receive_update, methods=['POST'])
+    return app.test_client()
+
+
+def test_requests_are_rejected_without_a_configured_secret(client, monkeypatch):
+    monkeypatch.delenv('WEBHOOK_SECRET', raising=False)
+    assert client.post('/hook', json={'update_id': 1}).status_code == 403
+    assert client.post('/hook', json={'update_id': 1}, headers={webhook.SECRET_HEADER: ''}).status_code == 403
+
+
+def test_requests_need_the_matching_secret(client, monkeypatch):
+    monkeypatch.setenv('WEBHOOK_SECRET', 's3cret')
+    assert client.post('/hook', json={'update_id': 1}).status_code == 403
+    assert client.post('/hook', json={'update_id': 1}, headers={webhook.SECRET_HEADER: 'wrong'}).status_code == 403
+    assert client.post('/hook', json={}, headers={webhook.SECRET_HEADER: 's3cret'}).status_code == 400
+
+
+def test_webhook_mode_does_not_start_without_a_secret(monkeypatch, no_lease):
+    monkeypatch.delenv('WEBHOOK_SECRET', raising=False)
+    with pytest.raises(webhook.WebhookError):
+        webhook.init_webhook(Flask('webhook_test'))
+
+
+def test_webhook_mode_does_not_start_while_another_process_holds_the_lease(monkeypatch, no_lease):
+    monkeypatch.setenv('WEBHOOK_SECRET', 's3cret')
+    # The parent process (pytest's runner or shell) is alive on this host
+    assert webhook.acquire_lease(f'{socket.gethostname()}:{webhook.os.getppid()}')
+    with pytest.raises(webhook.WebhookError):
+        webhook.init_webhook(Flask('webhook_test'))
+
+
+def test_one_holder_at_a_time(no_lease):
+    assert webhook.acquire_lease('host-a:1')
+    assert webhook.acquire_lease('host-a:1')  # the holder renews it
+    assert not webhook.acquire_lease('host-b:1')
+    assert webhook.renew_lease('host-a:1')
+    assert not webhook.renew_lease('host-b:1')
+
+    webhook.release_lease('host-a:1')
+    assert webhook.acquire_lease('host-b:1')
+
+
+def test_a_stale_lease_is_taken_over(no_lease):
+    from app import db
+    from models import BotLease
+    assert webhook.acquire_lease('host-a:1', lease=60)
+    db.session.execute(update(BotLease).values(updated_at=datetime.utcnow() - timedelta(seconds=61)))
+    db.session.commit()
+
+    assert webhook.acquire_lease('host-b:1', lease=60)
+    assert not webhook.renew_lease('host-a:1')
+
+
+def test_a_lease_of_a_dead_process_on_this_host_is_taken_over(no_lease):
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+    assert webhook.acquire_lease(f'{socket.gethostname()}:{finished.pid}')
+
+    assert webhook.acquire_lease(webhook.process_holder())
+
+
+def test_importing_the_app_does_not_start_webhook_mode(tmp_path):
+    env = dict(os.environ, BOT_MODE='webhook', DATABASE_URL=f"sqlite:///{tmp_path / 'import.db'}")
+    env.pop('WEBHOOK_SECRET', None)  # init_webhook would refuse to start without it
+    script = ("import app; from models import BotLease; "
+              "app.app.app_context().push(); assert BotLease.query.count() == 0")
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, timeout=60)
+    assert result.returncode == 0, result.stderr.decode()
@@ -0,0 +1,256 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Sequence
+
+from utils.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class BackendUnavailable(Exception):
+    """Raised when no backend answered (errors, timeouts or open circuit breakers)"""
+
+
+class TranslationBackend:
+    """Interface for remote translation providers"""
+
+    name = 'backend'
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Translate text, returning None when the provider has no answer"""
+        raise NotImplementedError
+
+
+class GoogleBackend(TranslationBackend):
+    """Google Translate via deep_translator, one client per direction and thread
+
+    GoogleTranslator.translate() writes the text into the instance's request
+    parameters before sending them, so a client must not be shared between
+    the pool and hedge threads.
+    """
+
+    name = 'google'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _get_translator(self, source_lang: str, target_lang: str):
+        """Get this thread's GoogleTranslator for the given direction"""
+        translators = getattr(self._local, 'translators', None)
+        if translators is None:
+            translators = self._local.translators = {}
+        key = (source_lang, target_lang)
+        translator = translators.get(key)
+        if translator is None:
+            from deep_translator import GoogleTranslator
+            translator = translators[key] = GoogleTranslator(source=source_lang, target=target_lang)
+        return translator
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        return self._get_translator(source_lang, target_lang).translate(text)
+
+
+class InMemoryBackend(TranslationBackend):
+    """Local stand-in backend for tests and benchmarks"""
+
+    def __init__(self, translations: Optional[Dict[str, str]] = None, delay: float = 0.0,
+                 fail: bool = False, name: str = 'memory'):
+        self.translations = dict(translations or {})
+        self.delay = delay
+        self.fail = fail
+        self.name = name
+        self.calls = 0
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} backend unavailable")
+        return self.translations.get(text.lower().strip())
+
+
+class CircuitBreaker:
+    """Opens when the error rate over the last `window` calls exceeds `error_threshold`"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str = 'backend', window: int = 20, min_calls: int = 5,
+                 error_threshold: float = 0.5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Return whether a call may go through right now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record(self, success: bool):
+        """Record the outcome of a call"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"Circuit breaker for '{self.name}' closed")
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            if len(self._outcomes) >= self.min_calls:
+                errors = self._outcomes.count(False)
+                if errors / len(self._outcomes) > self.error_threshold and self.state == self.CLOSED:
+                    self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = self._clock()
+        logger.warning(f"Circuit breaker for '{self.name}' opened for {self.reset_timeout:.0f}s")
+
+
+class ResilientBackend:
+    """Runs backends on a bounded thread pool with deadlines, hedging and circuit breakers
+
+    The first backend is the primary. If it has not answered after `hedge_delay`
+    seconds a hedged request is sent to the next backend (or the primary again
+    when there is only one) and whichever answers first wins.
+    """
+
+    def __init__(self, backends: Sequence[TranslationBackend], timeout: float = 3.0,
+                 hedge_delay: Optional[float] = 0.8, max_workers: int = 8,
+                 breaker_factory=CircuitBreaker):
+        if not backends:
+            raise ValueError("At least one translation backend is required")
+        self.backends: List[TranslationBackend] = list(backends)
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translate')
+        self.breakers = {b.name: breaker_factory(b.name) for b in self.backends}
+        self.histograms = {b.name: LatencyHistogram() for b in self.backends}
+        self.counters = {b.name: {'calls': 0, 'errors': 0, 'timeouts': 0, 'hedges': 0}
+                         for b in self.backends}
+
+    def _call(self, backend: TranslationBackend, text: str, source_lang: str, target_lang: str,
+              deadline: float):
+        """Call one backend, recording latency and outcome (late answers count as failures)"""
+        started = time.perf_counter()
+        try:
+            result = backend.translate(text, source_lang, target_lang)
+        except Exception:
+            self.counters[backend.name]['errors'] += 1
+            self.breakers[backend.name].record(False)
+            raise
+        finally:
+            self.histograms[backend.name].observe(time.perf_counter() - started)
+        self.breakers[backend.name].record(time.monotonic() <= deadline)
+        return result
+
+    def _submit_next(self, candidates: List[TranslationBackend], text: str, source_lang: str,
+                     target_lang: str, deadline: float):
+        """Submit the call to the first candidate whose circuit breaker allows it"""
+        while candidates:
+            backend = candidates.pop(0)
+            if not self.breakers[backend.name].allow():
+                continue
+            self.counters[backend.name]['calls'] += 1
+            future = self._executor.submit(self._call, backend, text, source_lang, target_lang, deadline)
+            future.backend = backend
+            return future
+        return None
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Translate text within the deadline
+
+        Returns None when a backend answered without a translation and raises
+        BackendUnavailable when none of them answered at all.
+        """
+        deadline = time.monotonic() + self.timeout
+        candidates = list(self.backends)
+
+        primary = self._submit_next(candidates, text, source_lang, target_lang, deadline)
+        if primary is None:
+            raise BackendUnavailable(f"All translation backends are open, skipping remote lookup for '{text}'")
+        pending = {primary}
+        hedged = self.hedge_delay is None
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not pending:
+                # Everything sent so far failed: fail over to the next backend
+                future = self._submit_next(candidates, text, source_lang, target_lang, deadline)
+                if future is None:
+                    break
+                pending.add(future)
+                continue
+
+            wait_for = remaining if hedged else min(remaining, self.hedge_delay)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                logger.warning(f"Translation backend '{future.backend.name}' failed for '{text}': {future.exception()}")
+
+            if not done and not hedged:
+                hedged = True
+                # Hedge on the next backend, or on the primary again if it is the only one
+                hedge_candidates = candidates if candidates else [primary.backend]
+                hedge = self._submit_next(hedge_candidates, text, source_lang, target_lang, deadline)
+                if hedge is not None:
+                    self.counters[hedge.backend.name]['hedges'] += 1
+                    pending.add(hedge)
+
+        for future in pending:
+            if not future.cancel():
+                self.counters[future.backend.name]['timeouts'] += 1
+        if pending:
+            raise BackendUnavailable(f"Translation of '{text}' timed out after {self.timeout:.1f}s")
+        raise BackendUnavailable(f"All translation backends failed for '{text}'")
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Get per-backend counters, breaker state and latency histogram"""
+        return {
+            name: {
+                **self.counters[name],
+                'breaker': self.breakers[name].state,
+                'rejected': self.breakers[name].rejected,
+                'latency': self.histograms[name].snapshot(),
+            }
+            for name in self.counters
+        }
+
+    def shutdown(self):
+        """Stop the worker pool without waiting for stuck calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,157 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe bounded LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = 3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store value under key, evicting the least recently used entries if full"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key from the cache and return its value"""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class PersistentTranslationCache:
+    """Shared translation cache stored in the `translation_cache` table"""
+
+    def __init__(self, ttl_days: Optional[int] = 30):
+        self.ttl_days = ttl_days
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, word: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Get a stored translation, ignoring entries older than ttl_days"""
+        from app import app
+        from models import TranslationCache
+        try:
+            with app.app_context():
+                query = TranslationCache.query.filter_by(
+                    word=word,
+                    source_lang=source_lang,
+                    target_lang=target_lang
+                )
+                if self.ttl_days:
+                    cutoff = datetime.utcnow() - timedelta(days=self.ttl_days)
+                    query = query.filter(TranslationCache.created_at >= cutoff)
+                entry = query.first()
+                translation = entry.translation if entry else None
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Translation cache lookup failed for '{word}': {e}")
+            return None
+
+        if translation is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return translation
+
+    def set(self, word: str, source_lang: str, target_lang: str, translation: str):
+        """Store or refresh a translation"""
+        from app import app, db
+        from models import TranslationCache
+        try:
+            with app.app_context():
+                entry = TranslationCache.query.filter_by(
+                    word=word,
+                    source_lang=source_lang,
+                    target_lang=target_lang
+                ).first()
+                if entry:
+                    entry.translation = translation
+                    entry.created_at = datetime.utcnow()
+                else:
+                    db.session.add(TranslationCache(
+                        word=word,
+                        source_lang=source_lang,
+                        target_lang=target_lang,
+                        translation=translation
+                    ))
+                db.session.commit()
+        except Exception as e:
+            # Most likely another worker stored the same key concurrently;
+            # the session is rolled back when the app context is torn down
+            self.errors += 1
+            logger.warning(f"Translation cache store failed for '{word}': {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss/error counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+        }
@@ -0,0 +1,234 @@
+"""
+Compact, memory-mapped dictionary format
+
+A compiled dictionary holds two sorted string tables: English headword ->
+translation and normalized Russian translation -> English headwords. Both are
+read straight from a read-only mmap, so lookups do not build Python objects
+for the whole dictionary and the pages are shared between processes (e.g.
+gunicorn workers) that open the same file.
+
+File layout (little endian):
+
+    header:  magic (8 bytes) | table count (u32) | table offsets (u64 each)
+    table:   entry count N (u32)
+             key offsets   (N + 1) x u32, relative to the key blob
+             value offsets (N + 1) x u32, relative to the value blob
+             key blob   (UTF-8 keys, sorted by their encoded bytes)
+             value blob (UTF-8 values)
+
+Usage:
+    python -m utils.compact_dict utils/dict.json utils/dict.vbdict
+"""
+import os
+import sys
+import json
+import tempfile
+import bisect
+import mmap
+import struct
+import logging
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VBDICT01'
+_HEADER = struct.Struct('<8sI')
+_OFFSET = struct.Struct('<Q')
+_COUNT = struct.Struct('<I')
+
+
+def _normalize_russian(text: str) -> str:
+    # Mirrors utils.lexicon.normalize_russian (utils.lexicon imports this module)
+    return text.strip().lower().replace('ё', 'е')
+
+
+def _split_translation(translation) -> List[str]:
+    variants = translation if isinstance(translation, list) else translation.split(',')
+    return [v.strip() for v in variants if v.strip()]
+
+
+def _encode_table(items: Iterable[Tuple[str, str]]) -> bytes:
+    """Serialize (key, value) pairs into one sorted table"""
+    encoded = sorted((k.encode('utf-8'), v.encode('utf-8')) for k, v in items)
+    count = len(encoded)
+    key_offsets = [0]
+    value_offsets = [0]
+    for key, value in encoded:
+        key_offsets.append(key_offsets[-1] + len(key))
+        value_offsets.append(value_offsets[-1] + len(value))
+    if key_offsets[-1] >= 2 ** 32 or value_offsets[-1] >= 2 ** 32:
+        raise ValueError("Dictionary too large for the compact format (4 GiB per blob)")
+
+    parts = [
+        _COUNT.pack(count),
+        struct.pack(f'<{count + 1}I', *key_offsets),
+        struct.pack(f'<{count + 1}I', *value_offsets),
+        b''.join(key for key, _ in encoded),
+        b''.join(value for _, value in encoded),
+    ]
+    data = b''.join(parts)
+    # Keep the next table 8-byte aligned
+    return data + b'\0' * (-len(data) % 8)
+
+
+def compile_dictionary(dictionary: Dict[str, object], output_path: str) -> int:
+    """Write a compiled dictionary file; returns the number of headwords"""
+    forward = {}
+    reverse: Dict[str, List[str]] = {}
+    for word, translation in dictionary.items():
+        word = word.lower().strip()
+        variants = _split_translation(translation)
+        forward[word] = ", ".join(variants)
+        for variant in variants:
+            words = reverse.setdefault(_normalize_russian(variant), [])
+            if word not in words:
+                words.append(word)
+
+    tables = [
+        _encode_table(forward.items()),
+        _encode_table((key, ", ".join(words)) for key, words in reverse.items()),
+    ]
+    header_size = _HEADER.size + _OFFSET.size * len(tables)
+    header_size += -header_size % 8
+
+    offsets = []
+    position = header_size
+    for table in tables:
+        offsets.append(position)
+        position += len(table)
+
+    # Processes may have the old file mmapped (and the reload watcher reads it):
+    # never truncate it in place, write a new file and rename it over the old one
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(output_path), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            header = _HEADER.pack(MAGIC, len(tables)) + b''.join(_OFFSET.pack(o) for o in offsets)
+            f.write(header + b'\0' * (header_size - len(header)))
+            for table in tables:
+                f.write(table)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(forward)
+
+
+def compile_json(json_path: str, output_path: str) -> int:
+    """Compile a dict.json style file"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return compile_dictionary(json.load(f), output_path)
+
+
+def is_compact_dictionary(path: str) -> bool:
+    """Check whether path is a compiled dictionary (by its magic bytes)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class _SortedTable(Mapping):
+    """Read-only str -> str mapping over one table of the mmap"""
+
+    def __init__(self, buffer: memoryview, offset: int, split_values: bool = False):
+        self._buffer = buffer
+        (count,) = _COUNT.unpack_from(buffer, offset)
+        self._count = count
+        position = offset + _COUNT.size
+        table_bytes = (count + 1) * 4
+        self._key_offsets = buffer[position:position + table_bytes].cast('I')
+        position += table_bytes
+        self._value_offsets = buffer[position:position + table_bytes].cast('I')
+        position += table_bytes
+        self._keys_start = position
+        self._values_start = position + self._key_offsets[count]
+        self._split_values = split_values
+
+    def _key_bytes(self, index: int) -> bytes:
+        start = self._keys_start + self._key_offsets[index]
+        end = self._keys_start + self._key_offsets[index + 1]
+        return self._buffer[start:end].tobytes()
+
+    def _value(self, index: int):
+        start = self._values_start + self._value_offsets[index]
+        end = self._values_start + self._value_offsets[index + 1]
+        value = str(self._buffer[start:end], 'utf-8')
+        return value.split(", ") if self._split_values else value
+
+    def _find(self, key: str) -> int:
+        target = key.encode('utf-8')
+        lo = bisect.bisect_left(range(self._count), target, key=self._key_bytes)
+        if lo < self._count and self._key_bytes(lo) == target:
+            return lo
+        return -1
+
+    def __getitem__(self, key: str):
+        index = self._find(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._value(index)
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self._key_bytes(index).decode('utf-8')
+
+    def items(self):
+        for index in range(self._count):
+            yield self._key_bytes(index).decode('utf-8'), self._value(index)
+
+
+class CompactDictionary(_SortedTable):
+    """Memory-mapped compiled dictionary: English headword -> translation
+
+    `reverse` maps a normalized Russian translation to its English headwords.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, table_count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled dictionary")
+        offsets = [_OFFSET.unpack_from(buffer, _HEADER.size + i * _OFFSET.size)[0]
+                   for i in range(table_count)]
+        super().__init__(buffer, offsets[0])
+        self.reverse = _SortedTable(buffer, offsets[1], split_values=True)
+
+    def close(self):
+        """Release the mapping (lookups fail afterwards)"""
+        try:
+            self._key_offsets.release()
+            self._value_offsets.release()
+            self.reverse._key_offsets.release()
+            self.reverse._value_offsets.release()
+            self._buffer.release()
+            self._mmap.close()
+        finally:
+            self._file.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m utils.compact_dict <dict.json> <output.vbdict>")
+        return 1
+    count = compile_json(argv[0], argv[1])
+    print(f"Compiled {count} words into {argv[1]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
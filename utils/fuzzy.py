@@ -0,0 +1,106 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance (adjacent swaps count as one edit)
+
+    Returns max_distance + 1 as soon as the distance is known to exceed it.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymSpellIndex:
+    """Typo-tolerant lookup using the symmetric delete algorithm (SymSpell)
+
+    Every word is stored under all strings reachable by deleting up to
+    `max_distance` characters from its first `prefix_length` characters.
+    A query generates the same deletes, so candidates are found with a few
+    dict lookups and only those are verified with a real edit distance.
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._deletes: Dict[str, List[str]] = {}
+        self._words: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _edits(self, word: str) -> Set[str]:
+        word = word[:self.prefix_length]
+        edits = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            next_frontier = set()
+            for candidate in frontier:
+                if len(candidate) <= 1:
+                    continue
+                for i in range(len(candidate)):
+                    next_frontier.add(candidate[:i] + candidate[i + 1:])
+            next_frontier -= edits
+            edits |= next_frontier
+            frontier = next_frontier
+        return edits
+
+    def add(self, word: str):
+        """Index a headword"""
+        with self._lock:
+            if word in self._words:
+                return
+            self._words.add(word)
+            for edit in self._edits(word):
+                self._deletes.setdefault(edit, []).append(word)
+
+    def build(self, words: Iterable[str]):
+        """Index many headwords"""
+        for word in words:
+            self.add(word)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._words
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def lookup(self, query: str, limit: int = 5, max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Get up to `limit` (word, distance) suggestions, closest first"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if query in self._words:
+            return [(query, 0)]
+
+        seen = set()
+        suggestions = []
+        for edit in self._edits(query):
+            for candidate in self._deletes.get(edit, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(query, candidate, max_distance)
+                if distance <= max_distance:
+                    suggestions.append((candidate, distance))
+
+        # Prefer closer words, then words of similar length, then alphabetical
+        suggestions.sort(key=lambda item: (item[1], abs(len(item[0]) - len(query)), item[0]))
+        return suggestions[:limit]
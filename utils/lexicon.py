@@ -0,0 +1,269 @@
+import json
+import os
+import logging
+import threading
+from collections import ChainMap
+from typing import Callable, Dict, List, Optional
+
+from utils.search_index import NGramIndex
+from utils.compact_dict import CompactDictionary, is_compact_dictionary
+from utils.fuzzy import SymSpellIndex
+
+logger = logging.getLogger(__name__)
+
+SHORT_WORD_LENGTH = 5  # words this short only get suggestions one edit away
+
+
+def normalize_russian(text: str) -> str:
+    """Нормализует русское слово для поиска: нижний регистр, ё → е"""
+    return text.strip().lower().replace('ё', 'е')
+
+
+class Lexicon:
+    """Snapshot of every local dictionary lookup structure
+
+    The Translator holds one Lexicon and replaces it wholesale on reload, so
+    readers always see a consistent set of structures without taking a lock.
+    """
+
+    def __init__(self, dictionary, compact_dictionary: Optional[CompactDictionary] = None,
+                 source_path: Optional[str] = None):
+        self.dictionary = dictionary
+        self.compact_dictionary = compact_dictionary
+        self.source_path = source_path
+        self._index_lock = threading.Lock()
+        self.word_index = None
+        self.translation_index = None
+        self.fuzzy_index = None
+        self._headwords: List[str] = []
+        self._word_ids: Dict[str, int] = {}
+
+        # The search and fuzzy indexes are built on first use (or by a reload, before the swap)
+        if compact_dictionary is not None:
+            # Lookups read straight from the mapped file
+            self.display_translations = ChainMap({}, compact_dictionary)
+            self.reverse_dictionary = ChainMap({}, compact_dictionary.reverse)
+            return
+
+        self.display_translations = {}
+        self.reverse_dictionary = {}
+        for word, translation in dictionary.items():
+            self._index_word(word, translation)
+        logger.info(f"Indexed {len(self.display_translations)} words "
+                    f"({len(self.reverse_dictionary)} Russian lookup entries)")
+
+    @classmethod
+    def load(cls, dict_path: str, strict: bool = False) -> 'Lexicon':
+        """Load dictionary from a JSON file or a compiled (memory-mapped) dictionary
+
+        Errors fall back to an empty dictionary unless strict is set, in which
+        case they are raised (used by reloads so a bad file keeps the old data).
+        """
+        try:
+            if not os.path.exists(dict_path):
+                logger.warning("Dictionary file not found, using empty dictionary")
+                return cls({}, source_path=dict_path)
+            if is_compact_dictionary(dict_path):
+                compact = CompactDictionary(dict_path)
+                logger.info(f"Mapped {len(compact)} words from compiled dictionary {dict_path}")
+                # Words added at runtime go into the front map
+                return cls(ChainMap({}, compact), compact_dictionary=compact, source_path=dict_path)
+            with open(dict_path, 'r', encoding='utf-8') as f:
+                dictionary = json.load(f)
+            logger.info(f"Loaded {len(dictionary)} words from dictionary")
+            return cls(dictionary, source_path=dict_path)
+        except Exception as e:
+            if strict:
+                raise
+            logger.error(f"Error loading dictionary: {e}")
+            return cls({}, source_path=dict_path)
+
+    def _build_search_indexes(self):
+        """Build the substring indexes over headwords and translations"""
+        headwords = []
+        word_ids = {}
+        word_index = NGramIndex()
+        translation_index = NGramIndex()
+        for word in self.display_translations:
+            doc_id = len(headwords)
+            headwords.append(word)
+            word_ids[word] = doc_id
+            word_index.add(doc_id, word)
+            translation_index.add(doc_id, normalize_russian(self.display_translations[word]))
+        self._headwords = headwords
+        self._word_ids = word_ids
+        self.translation_index = translation_index
+        self.word_index = word_index
+
+    def _ensure_search_indexes(self):
+        """Build the search indexes if they have not been built yet"""
+        if self.word_index is None:
+            with self._index_lock:
+                if self.word_index is None:
+                    self._build_search_indexes()
+
+    def _build_fuzzy_index(self):
+        """Build the typo-tolerant index over headwords"""
+        fuzzy_index = SymSpellIndex()
+        fuzzy_index.build(self.words())
+        self.fuzzy_index = fuzzy_index
+
+    def _ensure_fuzzy_index(self):
+        """Build the fuzzy index if it has not been built yet"""
+        if self.fuzzy_index is None:
+            with self._index_lock:
+                if self.fuzzy_index is None:
+                    self._build_fuzzy_index()
+
+    def _index_word(self, word: str, translation):
+        """Add (or re-add) one dictionary entry to every lookup structure"""
+        # An index being built reads the translations: add the word before or after it, not during
+        with self._index_lock:
+            self._index_entry(word, translation)
+
+    def _index_entry(self, word: str, translation):
+        old_variants = self._dictionary_variants(word)
+        if old_variants:
+            self._unindex_reverse(word, old_variants)
+
+        variants = [v.strip() for v in (translation if isinstance(translation, list) else translation.split(','))]
+        variants = [v for v in variants if v]
+        display = ", ".join(variants)
+        self.display_translations[word] = display
+
+        for variant in variants:
+            key = normalize_russian(variant)
+            # Copy before changing: the list may come from a compiled dictionary
+            words = list(self.reverse_dictionary.get(key, ()))
+            if word not in words:
+                words.append(word)
+                self.reverse_dictionary[key] = words
+
+        if self.word_index is not None:
+            doc_id = self._word_ids.get(word)
+            if doc_id is None:
+                doc_id = len(self._headwords)
+                self._headwords.append(word)
+                self._word_ids[word] = doc_id
+                self.word_index.add(doc_id, word)
+            self.translation_index.add(doc_id, normalize_russian(display))
+
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add(word)
+
+    def _dictionary_variants(self, word: str) -> List[str]:
+        """Get the individual translations of a dictionary word"""
+        display = self.display_translations.get(word)
+        return display.split(", ") if display else []
+
+    def _unindex_reverse(self, word: str, variants: List[str]):
+        """Remove a word from the reverse lookup entries of its old translations"""
+        for variant in variants:
+            key = normalize_russian(variant)
+            words = list(self.reverse_dictionary.get(key, ()))
+            if word in words:
+                words.remove(word)
+                self.reverse_dictionary[key] = words
+
+    def lookup(self, word: str) -> Optional[str]:
+        """Get the display translation of an English headword"""
+        return self.display_translations.get(word)
+
+    def reverse_lookup(self, word: str) -> Optional[str]:
+        """Get the English headwords for a Russian word, comma separated"""
+        words = self.reverse_dictionary.get(normalize_russian(word))
+        return ", ".join(words) if words else None
+
+    def add_word(self, word: str, translation):
+        """Add or replace an entry in this snapshot"""
+        self._index_word(word, translation)
+        self.dictionary[word] = translation
+
+    def suggest(self, word: str, limit: int = 5) -> List[str]:
+        """Get headwords within a small edit distance of a (misspelled) word"""
+        self._ensure_fuzzy_index()
+        # One edit turns most short words into other real words (tree → free)
+        max_distance = 1 if len(word) <= SHORT_WORD_LENGTH else None
+        return [candidate for candidate, _ in self.fuzzy_index.lookup(word, limit, max_distance)]
+
+    def search_words(self, pattern: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Get headwords containing pattern"""
+        self._ensure_search_indexes()
+        ids, _ = self.word_index.search(pattern.lower().strip(), offset, limit)
+        return [self._entry(doc_id) for doc_id in ids]
+
+    def search_translations(self, text: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Get headwords whose translation contains text"""
+        self._ensure_search_indexes()
+        ids, _ = self.translation_index.search(normalize_russian(text), offset, limit)
+        return [self._entry(doc_id) for doc_id in ids]
+
+    def _entry(self, doc_id: int) -> Dict[str, str]:
+        word = self._headwords[doc_id]
+        return {
+            'word': word,
+            'translation': self.display_translations[word]
+        }
+
+    def words(self):
+        """Iterate over all headwords"""
+        if self.compact_dictionary is not None:
+            yield from self.compact_dictionary
+            for word in self.dictionary.maps[0]:
+                if word not in self.compact_dictionary:
+                    yield word
+        else:
+            yield from self.dictionary
+
+    def __len__(self) -> int:
+        if self.compact_dictionary is not None:
+            added = sum(1 for word in self.dictionary.maps[0] if word not in self.compact_dictionary)
+            return len(self.compact_dictionary) + added
+        return len(self.dictionary)
+
+
+class DictionaryWatcher:
+    """Poll a dictionary file and call on_change when it is modified
+
+    on_change should return True once the change has been applied; otherwise
+    (e.g. the file was caught half-written) it is retried on the next poll.
+    """
+
+    def __init__(self, path: str, interval: float, on_change: Callable[[], bool]):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self._signature = self._stat()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='DictionaryWatcher', daemon=True)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Watching {self.path} for changes every {self.interval:.0f}s")
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last successful reload"""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        if self.on_change():
+            self._signature = signature
+            return True
+        return False
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Dictionary watcher error: {e}")
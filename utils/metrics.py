@@ -0,0 +1,60 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+DEFAULT_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket latency histogram"""
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._counts = [0] * (len(self.buckets_ms) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        """Record one duration given in seconds"""
+        ms = seconds * 1000.0
+        index = bisect.bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Approximate the p-th percentile (0-100) as a bucket upper bound in ms"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = self.count * p / 100.0
+            seen = 0
+            for index, bucket_count in enumerate(self._counts):
+                seen += bucket_count
+                if seen >= rank and bucket_count:
+                    if index < len(self.buckets_ms):
+                        return float(self.buckets_ms[index])
+                    return self.max_ms
+            return self.max_ms
+
+    def snapshot(self) -> Dict[str, object]:
+        """Get counts per bucket plus summary statistics"""
+        with self._lock:
+            labels: List[str] = [f"<={b}ms" for b in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+            buckets = dict(zip(labels, self._counts))
+            count, total_ms, max_ms = self.count, self.total_ms, self.max_ms
+        return {
+            'count': count,
+            'avg_ms': total_ms / count if count else 0.0,
+            'max_ms': max_ms,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': buckets,
+        }
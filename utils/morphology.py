@@ -0,0 +1,136 @@
+"""
+Lightweight rule-based normalization of inflected word forms
+
+English words are reduced to lemma candidates with suffix rules plus a table
+of common irregular forms; Russian words get their ending stripped and are
+re-completed with the usual dictionary-form endings. Both return candidate
+lists (most likely first) that are checked against the dictionary, so a
+wrong guess simply misses. Results are memoized.
+"""
+from functools import lru_cache
+from typing import List, Tuple
+
+IRREGULAR_ENGLISH = {
+    'am': 'be', 'is': 'be', 'are': 'be', 'was': 'be', 'were': 'be', 'been': 'be',
+    'has': 'have', 'had': 'have', 'does': 'do', 'did': 'do', 'done': 'do',
+    'went': 'go', 'gone': 'go', 'ran': 'run', 'made': 'make', 'said': 'say',
+    'took': 'take', 'taken': 'take', 'came': 'come', 'saw': 'see', 'seen': 'see',
+    'knew': 'know', 'known': 'know', 'got': 'get', 'gotten': 'get', 'gave': 'give',
+    'given': 'give', 'found': 'find', 'thought': 'think', 'told': 'tell',
+    'became': 'become', 'left': 'leave', 'felt': 'feel', 'brought': 'bring',
+    'began': 'begin', 'begun': 'begin', 'kept': 'keep', 'held': 'hold',
+    'wrote': 'write', 'written': 'write', 'stood': 'stand', 'heard': 'hear',
+    'meant': 'mean', 'met': 'meet', 'paid': 'pay', 'sat': 'sit', 'spoke': 'speak',
+    'spoken': 'speak', 'led': 'lead', 'grew': 'grow', 'grown': 'grow', 'lost': 'lose',
+    'fell': 'fall', 'fallen': 'fall', 'sent': 'send', 'built': 'build',
+    'understood': 'understand', 'drew': 'draw', 'drawn': 'draw', 'broke': 'break',
+    'broken': 'break', 'spent': 'spend', 'rose': 'rise', 'risen': 'rise',
+    'drove': 'drive', 'driven': 'drive', 'bought': 'buy', 'wore': 'wear', 'worn': 'wear',
+    'chose': 'choose', 'chosen': 'choose', 'ate': 'eat', 'eaten': 'eat', 'sold': 'sell',
+    'taught': 'teach', 'caught': 'catch', 'fought': 'fight', 'slept': 'sleep',
+    'won': 'win', 'flew': 'fly', 'flown': 'fly', 'swam': 'swim', 'sang': 'sing',
+    'sung': 'sing', 'forgot': 'forget', 'forgotten': 'forget', 'lent': 'lend',
+    'children': 'child', 'men': 'man', 'women': 'woman', 'people': 'person',
+    'feet': 'foot', 'teeth': 'tooth', 'mice': 'mouse', 'geese': 'goose',
+    'better': 'good', 'best': 'good', 'worse': 'bad', 'worst': 'bad',
+}
+
+_VOWELS = set('aeiou')
+
+# Longest endings first; the stem must keep at least two letters
+_RUSSIAN_ENDINGS = (
+    'иями', 'ями', 'ами', 'ией', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ешь', 'ете', 'ишь', 'ите', 'ует', 'уют', 'ают', 'яют', 'ала', 'яла', 'ила',
+    'ать', 'ять', 'ить', 'еть', 'уть',
+    'ой', 'ей', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ов', 'ев', 'ут', 'ют', 'ат', 'ят',
+    'ет', 'ит', 'ла', 'ло', 'ли',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'л',
+)
+_RUSSIAN_DICTIONARY_ENDINGS = ('', 'а', 'я', 'о', 'е', 'ь', 'ый', 'ий', 'ой', 'ать', 'ять', 'ить', 'еть', 'ть')
+
+
+def _undouble(stem: str) -> List[str]:
+    """running -> runn -> run, stopped -> stopp -> stop"""
+    if len(stem) >= 3 and stem[-1] == stem[-2] and stem[-1] not in _VOWELS:
+        return [stem[:-1], stem]
+    return [stem]
+
+
+@lru_cache(maxsize=65536)
+def english_lemmas(word: str) -> Tuple[str, ...]:
+    """Get lemma candidates for an English word form (not including the word)"""
+    candidates = []
+    irregular = IRREGULAR_ENGLISH.get(word)
+    if irregular:
+        candidates.append(irregular)
+
+    if word.endswith('ies') and len(word) > 4:
+        candidates.append(word[:-3] + 'y')
+    if word.endswith('ves') and len(word) > 4:
+        candidates += [word[:-3] + 'f', word[:-3] + 'fe']
+    if word.endswith(('ses', 'xes', 'zes', 'ches', 'shes', 'oes')):
+        candidates.append(word[:-2])
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        candidates.append(word[:-1])
+
+    if word.endswith('ied') and len(word) > 4:
+        candidates.append(word[:-3] + 'y')
+    if word.endswith('ed') and len(word) > 4:
+        candidates += _undouble(word[:-2]) + [word[:-1]]
+
+    if word.endswith('ying') and len(word) > 5:
+        candidates.append(word[:-4] + 'ie')
+    if word.endswith('ing') and len(word) > 5:
+        stem = word[:-3]
+        candidates += _undouble(stem) + [stem + 'e']
+
+    if word.endswith('ier') and len(word) > 4:
+        candidates.append(word[:-3] + 'y')
+    if word.endswith('iest') and len(word) > 5:
+        candidates.append(word[:-4] + 'y')
+    if word.endswith('est') and len(word) > 5:
+        candidates += _undouble(word[:-3]) + [word[:-2]]
+    if word.endswith('er') and len(word) > 4:
+        candidates += _undouble(word[:-2]) + [word[:-1]]
+
+    # Only -ily: a generic -ly rule maps adjectives like "friendly" to the wrong noun
+    if word.endswith('ily') and len(word) > 4:
+        candidates.append(word[:-3] + 'y')
+
+    return _unique(word, candidates)
+
+
+@lru_cache(maxsize=65536)
+def russian_lemmas(word: str) -> Tuple[str, ...]:
+    """Get dictionary-form candidates for a Russian word form (not including the word)"""
+    word = word.replace('ё', 'е')
+    candidates = []
+    matched = 0
+    for ending in _RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 2:
+            stem = word[:-len(ending)]
+            candidates += [stem + e for e in _RUSSIAN_DICTIONARY_ENDINGS]
+            matched += 1
+            if matched == 2:
+                break
+    if not matched:
+        candidates += [word + e for e in _RUSSIAN_DICTIONARY_ENDINGS[1:]]
+    return _unique(word, candidates)
+
+
+def lemma_candidates(word: str, language: str) -> Tuple[str, ...]:
+    """Get lemma candidates for a lowercase word in 'en' or 'ru'"""
+    if language == 'ru':
+        return russian_lemmas(word)
+    return english_lemmas(word)
+
+
+def _unique(word: str, candidates: List[str]) -> Tuple[str, ...]:
+    seen = {word}
+    result = []
+    for candidate in candidates:
+        if len(candidate) >= 2 and candidate not in seen:
+            seen.add(candidate)
+            result.append(candidate)
+    return tuple(result)
@@ -0,0 +1,88 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class NGramIndex:
+    """Substring index over short strings using character n-gram posting lists
+
+    Every document is indexed by all its substrings of length 1..n, so a query
+    of length <= n is answered by slicing a single posting list and a longer
+    query by verifying the candidates of its rarest n-gram. Posting lists are
+    kept sorted by document id, so results come back in ascending id order.
+    """
+
+    def __init__(self, n: int = 3):
+        self.n = n
+        self._postings: Dict[str, List[int]] = {}
+        self._texts: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _grams(self, text: str) -> set:
+        grams = set()
+        for size in range(1, self.n + 1):
+            for i in range(len(text) - size + 1):
+                grams.add(text[i:i + size])
+        return grams
+
+    def add(self, doc_id: int, text: str):
+        """Index text under doc_id, replacing any previous text for it"""
+        with self._lock:
+            if doc_id in self._texts:
+                self._remove(doc_id)
+            self._texts[doc_id] = text
+            for gram in self._grams(text):
+                posting = self._postings.setdefault(gram, [])
+                if not posting or posting[-1] < doc_id:
+                    posting.append(doc_id)
+                else:
+                    bisect.insort(posting, doc_id)
+
+    def remove(self, doc_id: int):
+        """Drop doc_id from the index"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int):
+        text = self._texts.pop(doc_id, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            i = bisect.bisect_left(posting, doc_id)
+            if i < len(posting) and posting[i] == doc_id:
+                del posting[i]
+            if not posting:
+                del self._postings[gram]
+
+    def search(self, query: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[int], int]:
+        """Find documents containing query; returns (page of ids, total matches)"""
+        if not query:
+            ids = sorted(self._texts)
+        elif len(query) <= self.n:
+            ids = self._postings.get(query, [])
+        else:
+            grams = {query[i:i + self.n] for i in range(len(query) - self.n + 1)}
+            rarest = None
+            for gram in grams:
+                posting = self._postings.get(gram)
+                if not posting:
+                    return [], 0
+                if rarest is None or len(posting) < len(rarest):
+                    rarest = posting
+            texts = self._texts
+            ids = [doc_id for doc_id in rarest if query in texts[doc_id]]
+
+        total = len(ids)
+        end = None if limit is None else offset + limit
+        return ids[offset:end], total
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def build(self, items: Iterable[Tuple[int, str]]):
+        """Bulk-index (doc_id, text) pairs"""
+        for doc_id, text in items:
+            self.add(doc_id, text)
@@ -1,10 +1,17 @@
-import json
 import os
+import time
 import random
 import logging
-from typing import Dict, Optional, List
-from deep_translator import GoogleTranslator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, List, Tuple
 
+from utils.cache import TTLCache, PersistentTranslationCache
+from utils.backends import TranslationBackend, GoogleBackend, ResilientBackend, BackendUnavailable
+from utils.singleflight import SingleFlight
+from utils.lexicon import Lexicon, DictionaryWatcher
+from utils.metrics import LatencyHistogram
+from utils.morphology import lemma_candidates
 from langdetect import detect  # добавь в начало файла
 import re  # уже может быть подключен — проверь
 
@@ -12,35 +19,145 @@ def is_cyrillic(text: str) -> bool:
     """Определяет, состоит ли строка только из русских букв"""
     return bool(re.fullmatch(r"[А-Яа-яЁё]+", text.strip()))
 
+DEFAULT_RESOLUTION_ORDER = ('local', 'cache', 'remote')
+
 logger = logging.getLogger(__name__)
 
 class Translator:
-    def __init__(self):
-        self.dictionary = {}
+    def __init__(self, cache_size: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 persistent_cache: Optional[bool] = None, resolution_order: Optional[List[str]] = None,
+                 offline: Optional[bool] = None, backends: Optional[List[TranslationBackend]] = None):
+        self.dictionary_path = os.environ.get('DICTIONARY_PATH') or os.path.join(os.path.dirname(__file__), 'dict.json')
+        self._runtime_words = {}
+        self._reload_lock = threading.Lock()   # held for the swap; add_word takes it too
+        self._reloading = threading.Lock()     # one reload at a time
+        self.reload_stats = {'reloads': 0, 'failures': 0, 'last_duration_ms': None,
+                             'last_added': 0, 'last_removed': 0, 'size': 0}
+        self.reload_histogram = LatencyHistogram()
         self.load_dictionary()
-        # Initialize Google Translator for English to Russian
-        try:
-            self.google_translator = GoogleTranslator(source='en', target='ru')
-            logger.info("Google Translator initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize Google Translator: {e}")
-            self.google_translator = None
-    
+        self.reload_stats['size'] = len(self.lexicon)
+
+        # Pick up edits to the dictionary file without restarting the bot
+        reload_interval = float(os.environ.get('DICTIONARY_RELOAD_INTERVAL', 30))
+        self.watcher = None
+        if reload_interval > 0:
+            self.watcher = DictionaryWatcher(self.dictionary_path, reload_interval, self.reload_dictionary)
+            self.watcher.start()
+
+        # In-process LRU in front of the shared (database) cache
+        if cache_size is None:
+            cache_size = int(os.environ.get('TRANSLATION_CACHE_SIZE', 50000))
+        if cache_ttl is None:
+            cache_ttl = float(os.environ.get('TRANSLATION_CACHE_TTL', 24 * 3600))
+        if persistent_cache is None:
+            persistent_cache = os.environ.get('TRANSLATION_PERSISTENT_CACHE', '1') != '0'
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.persistent_cache = PersistentTranslationCache() if persistent_cache else None
+
+        # Remote backends run on a bounded pool with deadlines, hedging and circuit breakers
+        if backends is None:
+            backends = [GoogleBackend()]
+        self.backend = ResilientBackend(
+            backends,
+            timeout=float(os.environ.get('TRANSLATION_TIMEOUT', 3.0)),
+            hedge_delay=float(os.environ.get('TRANSLATION_HEDGE_DELAY', 0.8)) or None,
+            max_workers=int(os.environ.get('TRANSLATION_WORKERS', 8))
+        )
+        self.remote_calls = 0
+        # Fan-out for batches: each worker waits on the backend pool above
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('TRANSLATION_BATCH_CONCURRENCY', 4)),
+            thread_name_prefix='translate-batch'
+        )
+
+        # Concurrent lookups of the same word share one remote call; misses are remembered briefly
+        self.single_flight = SingleFlight()
+        self.negative_cache = TTLCache(
+            maxsize=cache_size,
+            ttl=float(os.environ.get('TRANSLATION_NEGATIVE_TTL', 300))
+        )
+
+        # Resolution order, e.g. "local,cache,remote"; offline mode never hits the network
+        if resolution_order is None:
+            resolution_order = os.environ.get('TRANSLATION_ORDER', ','.join(DEFAULT_RESOLUTION_ORDER)).split(',')
+        if offline is None:
+            offline = os.environ.get('TRANSLATION_OFFLINE', '0') == '1'
+        self._resolvers = {
+            'local': self._lookup_local,
+            'cache': self._lookup_cache,
+            'remote': self._lookup_remote,
+        }
+        self.offline = offline
+        self.resolution_order = []
+        for step in resolution_order:
+            step = step.strip().lower()
+            if step not in self._resolvers:
+                raise ValueError(f"Unknown translation source '{step}' (expected one of {', '.join(self._resolvers)})")
+            if offline and step == 'remote':
+                continue
+            self.resolution_order.append(step)
+        logger.info(f"Translation order: {' → '.join(self.resolution_order)}{' (offline)' if offline else ''}")
+
+        self.lemmatize = os.environ.get('TRANSLATION_LEMMATIZE', '1') != '0'
+        self.resolution_stats = {'requests': 0, 'local': 0, 'cache': 0, 'remote': 0,
+                                 'misses': 0, 'lemma_hits': 0}
+
+    @property
+    def dictionary(self):
+        """The raw dictionary mapping of the current snapshot"""
+        return self.lexicon.dictionary
+
     def load_dictionary(self):
-        """Load dictionary from JSON file"""
-        try:
-            dict_path = os.path.join(os.path.dirname(__file__), 'dict.json')
-            if os.path.exists(dict_path):
-                with open(dict_path, 'r', encoding='utf-8') as f:
-                    self.dictionary = json.load(f)
-                logger.info(f"Loaded {len(self.dictionary)} words from dictionary")
-            else:
-                logger.warning("Dictionary file not found, using empty dictionary")
-                self.dictionary = {}
-        except Exception as e:
-            logger.error(f"Error loading dictionary: {e}")
-            self.dictionary = {}
-    def translate(self, word: str) -> Optional[str]:
+        """Load dictionary from a JSON file or a compiled (memory-mapped) dictionary"""
+        self.lexicon = Lexicon.load(self.dictionary_path)
+        for word, translation in self._runtime_words.items():
+            self.lexicon.add_word(word, translation)
+
+    def reload_dictionary(self) -> bool:
+        """Rebuild the lookup structures from the source file and swap them in atomically"""
+        with self._reloading:
+            started = time.perf_counter()
+            old = self.lexicon
+            try:
+                # Loading and indexing run without the reload lock: add_word is not held up
+                new = Lexicon.load(self.dictionary_path, strict=True)
+                # Build now so the first search after the swap does not stall
+                if old.word_index is not None:
+                    new._ensure_search_indexes()
+                if old.fuzzy_index is not None:
+                    new._ensure_fuzzy_index()
+            except Exception as e:
+                self.reload_stats['failures'] += 1
+                logger.error(f"Dictionary reload failed, keeping the current dictionary: {e}")
+                return False
+
+            with self._reload_lock:
+                # Runtime words (including any added while the new snapshot was built) go into
+                # its indexes incrementally, then the snapshot is swapped in
+                for word, translation in self._runtime_words.items():
+                    new.add_word(word, translation)
+                # Single reference assignment: readers see either the old or the new snapshot
+                self.lexicon = new
+            old_words = set(old.words())
+            new_words = set(new.words())
+            added = len(new_words - old_words)
+            removed = len(old_words - new_words)
+            duration_ms = (time.perf_counter() - started) * 1000
+
+        self.reload_stats['reloads'] += 1
+        self.reload_stats['last_duration_ms'] = duration_ms
+        self.reload_stats['last_added'] = added
+        self.reload_stats['last_removed'] = removed
+        self.reload_stats['size'] = len(new_words)
+        self.reload_histogram.observe(duration_ms / 1000)
+        logger.info(f"Reloaded dictionary in {duration_ms:.0f}ms: {len(new_words)} words (+{added} / -{removed})")
+        return True
+
+    def get_reload_stats(self) -> Dict[str, object]:
+        """Get dictionary reload counters and timings"""
+        return {**self.reload_stats, 'latency': self.reload_histogram.snapshot()}
+
+    def translate(self, word: str, allow_remote: bool = True) -> Optional[str]:
         """Translate word in either direction using language detection"""
 
         word_original = word.strip()
@@ -57,67 +174,168 @@ class Translator:
             source_lang = "en"
             target_lang = "ru"
 
-        try:
-            translator = GoogleTranslator(source=source_lang, target=target_lang)
-            translation = translator.translate(word_original)
+        # Local sources first, for the form as typed and then for its lemmas ("running" → "run"),
+        # so an inflected form costs no remote call; only a word missed by both goes remote
+        local_steps = [step for step in self.resolution_order if step != 'remote']
+        for step in local_steps:
+            translation = self._resolvers[step](word, word_original, source_lang, target_lang)
+            if translation:
+                self.resolution_stats['requests'] += 1
+                self.resolution_stats[step] += 1
+                return translation
 
-            if translation and translation.lower() != word.lower():
-                logger.info(f"Translation ({source_lang} → {target_lang}): '{word_original}' -> '{translation}'")
+        if self.lemmatize:
+            for form in lemma_candidates(word, source_lang):
+                for step in local_steps:
+                    translation = self._resolvers[step](form, word_original, source_lang, target_lang)
+                    if translation:
+                        self.resolution_stats['requests'] += 1
+                        self.resolution_stats[step] += 1
+                        self.resolution_stats['lemma_hits'] += 1
+                        return translation
+
+        if allow_remote and 'remote' in self.resolution_order:
+            translation = self._resolvers['remote'](word, word_original, source_lang, target_lang)
+            if translation:
+                self.resolution_stats['requests'] += 1
+                self.resolution_stats['remote'] += 1
                 return translation
-        except Exception as e:
-            logger.warning(f"Google Translate failed for '{word_original}': {e}")
-
-        # fallback: если слово английское — ищем в словаре
-        if source_lang == "en" and word in self.dictionary:
-            translation = self.dictionary[word]
-            if isinstance(translation, list):
-                translation = ", ".join(translation)
-            logger.info(f"Local dictionary: '{word_original}' -> '{translation}'")
+
+        # A local-only pass is usually followed by a full one; count the miss only once
+        if allow_remote or 'remote' not in self.resolution_order:
+            self.resolution_stats['requests'] += 1
+            self.resolution_stats['misses'] += 1
+        return None
+
+    def translate_many(self, words: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """Translate a list of words, returning (word, translation) pairs in input order
+
+        Local and cached answers are resolved inline; only the remaining words go
+        to the remote backend, concurrently and bounded by TRANSLATION_BATCH_CONCURRENCY.
+        """
+        unique_words = list(dict.fromkeys(w.lower().strip() for w in words if w.strip()))
+        results = {word: self.translate(word, allow_remote=False) for word in unique_words}
+
+        missing = [word for word, translation in results.items() if not translation]
+        if missing and 'remote' in self.resolution_order:
+            futures = {word: self._batch_executor.submit(self.translate, word) for word in missing}
+            for word, future in futures.items():
+                try:
+                    results[word] = future.result()
+                except Exception as e:
+                    logger.warning(f"Batch translation failed for '{word}': {e}")
+
+        return [(word, results[word]) for word in unique_words]
+
+    def _lookup_local(self, word: str, word_original: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Look the word up in the bundled dictionary (either direction)"""
+        if source_lang == "en":
+            translation = self.lexicon.lookup(word)
+        else:
+            translation = self.lexicon.reverse_lookup(word)
+        if translation is None:
+            return None
+
+        via = f" (as '{word}')" if word != word_original.lower() else ""
+        logger.info(f"Local dictionary ({source_lang} → {target_lang}): '{word_original}'{via} -> '{translation}'")
+        return translation
+
+    def _lookup_cache(self, word: str, word_original: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Look the word up in the in-process and shared translation caches"""
+        cache_key = (word, source_lang, target_lang)
+        translation = self.cache.get(cache_key)
+        if translation is not None:
+            return translation
+
+        # Only the form as typed goes to the shared store; lemma guesses would cost a query each
+        if self.persistent_cache and word == word_original.lower():
+            translation = self.persistent_cache.get(word, source_lang, target_lang)
+            if translation is not None:
+                self.cache.set(cache_key, translation)
+                return translation
+
+        return None
+
+    def _lookup_remote(self, word: str, word_original: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Translate the word with the remote backend, sharing in-flight calls"""
+        cache_key = (word, source_lang, target_lang)
+        if self.negative_cache.get(cache_key):
+            return None
+
+        try:
+            return self.single_flight.do(cache_key, self._fetch_remote, word, word_original,
+                                         source_lang, target_lang)
+        except BackendUnavailable as e:
+            logger.warning(str(e))
+            return None
+
+    def _fetch_remote(self, word: str, word_original: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Call the remote backend once and remember the result (or the miss)"""
+        cache_key = (word, source_lang, target_lang)
+        self.remote_calls += 1
+        translation = self.backend.translate(word_original, source_lang, target_lang)
+
+        if translation and translation.lower() != word.lower():
+            logger.info(f"Translation ({source_lang} → {target_lang}): '{word_original}' -> '{translation}'")
+            self.cache.set(cache_key, translation)
+            if self.persistent_cache:
+                self.persistent_cache.set(word, source_lang, target_lang, translation)
             return translation
 
+        self.negative_cache.set(cache_key, True)
         return None
 
-    def get_words_by_pattern(self, pattern: str) -> List[Dict[str, str]]:
-        """Get words matching a pattern"""
-        pattern = pattern.lower()
-        matches = []
-        
-        for word, translation in self.dictionary.items():
-            if pattern in word:
-                if isinstance(translation, list):
-                    translation = ", ".join(translation)
-                matches.append({
-                    'word': word,
-                    'translation': translation
-                })
-        
-        return matches
+    def forget_miss(self, word: str):
+        """Drop a remembered remote miss so the next translate() asks the backend again"""
+        word = word.lower().strip()
+        source_lang, target_lang = ('ru', 'en') if is_cyrillic(word) else ('en', 'ru')
+        self.negative_cache.pop((word, source_lang, target_lang))
+
+    def suggest(self, word: str, limit: int = 5) -> List[str]:
+        """Get dictionary words close to a misspelled English word ("did you mean")"""
+        word = word.lower().strip()
+        if len(word) < 2 or not word.isalpha() or is_cyrillic(word):
+            return []
+        suggestions = self.lexicon.suggest(word, limit)
+        return [s for s in suggestions if s != word]
+
+    def get_words_by_pattern(self, pattern: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Get words containing a pattern (paginated with offset/limit)"""
+        return self.lexicon.search_words(pattern, offset, limit)
     
     def add_word(self, word: str, translation: str):
-        """Add a word to the dictionary (runtime only)"""
+        """Add a word to the dictionary (runtime only, kept across reloads)"""
         word = word.lower().strip()
-        self.dictionary[word] = translation
+        # A reload copies _runtime_words into the new snapshot just before the swap: without
+        # the lock a word added between the copy and the swap would be lost
+        with self._reload_lock:
+            self._runtime_words[word] = translation
+            self.lexicon.add_word(word, translation)
     
     def get_dictionary_size(self) -> int:
         """Get the size of the dictionary"""
-        return len(self.dictionary)
+        return len(self.lexicon)
+
+    def get_cache_stats(self) -> Dict[str, object]:
+        """Get translation cache counters (LRU, shared store, misses, coalescing, lemmatization)"""
+        requests = self.resolution_stats['requests']
+        return {
+            'memory': self.cache.stats(),
+            'persistent': self.persistent_cache.stats() if self.persistent_cache else None,
+            'negative': self.negative_cache.stats(),
+            'coalescing': self.single_flight.stats(),
+            'remote_calls': self.remote_calls,
+            'resolution': {
+                **self.resolution_stats,
+                # Share of requests answered only thanks to lemmatization
+                'lemma_hit_rate': self.resolution_stats['lemma_hits'] / requests if requests else 0.0,
+            },
+        }
+
+    def get_backend_stats(self) -> Dict[str, Dict[str, object]]:
+        """Get per-backend call counters, circuit breaker state and latency histograms"""
+        return self.backend.stats()
     
-    def search_translation(self, translation_text: str) -> List[Dict[str, str]]:
-        """Search for words by translation"""
-        translation_text = translation_text.lower()
-        matches = []
-        
-        for word, translation in self.dictionary.items():
-            trans_str = translation
-            if isinstance(translation, list):
-                trans_str = ", ".join(translation).lower()
-            else:
-                trans_str = translation.lower()
-            
-            if translation_text in trans_str:
-                matches.append({
-                    'word': word,
-                    'translation': translation if isinstance(translation, str) else ", ".join(translation)
-                })
-        
-        return matches
+    def search_translation(self, translation_text: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Search for words by translation (paginated with offset/limit)"""
+        return self.lexicon.search_translations(translation_text, offset, limit)